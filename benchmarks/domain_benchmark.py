@@ -0,0 +1,157 @@
+"""
+Compares the batch domain generation of DomainEngine.generate_domain
+against the original row loop on testdata/hospital.csv (or the files given
+on the command line).
+
+The row loop is the reference: a copy of the original
+DomainEngine._domain_cells with one call per cell of reference_domain_cell,
+a copy of the original get_domain_cell that looks up the candidates of
+every correlated attribute in the pruned co-occurrence dictionaries
+instead of going through the candidate tables and the context cache of
+the batch path. Both run on the in-memory engine after error detection,
+with the same random seed, and must produce the same initial domains
+(before the Naive Bayes re-pruning). The data can be replicated --scale
+times (with new _tid_'s) to measure larger inputs.
+
+Usage: python domain_benchmark.py [--scale N] [data.csv constraints.txt]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import holoclean
+from dataset import CellStatus
+from detect import NullDetector, ViolationDetector
+from domain.generator import DOMAIN_COLUMNS
+from utils import NULL_REPR
+
+TESTDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testdata')
+SEED = 45
+
+
+def setup(data, dcs, scale):
+    hc = holoclean.HoloClean(engine='memory', domain_thresh_1=0.0, domain_thresh_2=0.0, weak_label_thresh=0.99,
+                             max_domain=10000, cor_strength=0.6, nb_cor_strength=0.8, threads=1,
+                             verbose=False).session
+    if scale > 1:
+        df = pd.read_csv(data, dtype=str)
+        data = os.path.join(tempfile.mkdtemp(), os.path.basename(data))
+        pd.concat([df] * scale, ignore_index=True).to_csv(data, index=False)
+    hc.load_data('bench', data)
+    hc.load_dcs(dcs)
+    hc.ds.set_constraints(hc.get_dcs())
+    hc.detect_errors([NullDetector(), ViolationDetector()])
+    engine = hc.domain_engine
+    engine.compute_correlations()
+    engine.setup_attributes()
+    return engine
+
+
+def reference_domain_cell(engine, attr, row):
+    """
+    reference_domain_cell returns (initial value, index of the initial
+    value, sorted domain) of the cell of :param attr: in :param row:
+    (EncodedRow) as the original DomainEngine.get_domain_cell did.
+    """
+    domain = set()
+    init_value = row[attr]
+    for cond_attr in engine.get_corr_attributes(attr, engine.cor_strength):
+        if cond_attr == attr or cond_attr == '_tid_':
+            continue
+        if not engine.pair_stats[cond_attr][attr]:
+            logging.warning("domain generation could not find pair_statistics between attributes: {}, {}".format(cond_attr, attr))
+            continue
+        cond_val = row[cond_attr]
+        if cond_val == NULL_REPR or cond_val not in engine.pair_stats[cond_attr][attr]:
+            continue
+        domain.update(engine.pair_stats[cond_attr][attr][cond_val])
+    assert NULL_REPR not in domain
+    if init_value != NULL_REPR:
+        domain.add(init_value)
+    domain_lst = sorted(list(domain))
+    init_value_idx = -1
+    if init_value != NULL_REPR:
+        init_value_idx = domain_lst.index(init_value)
+    return init_value, init_value_idx, domain_lst
+
+
+def row_loop(engine):
+    """
+    row_loop returns the initial domains of every cell of the active
+    attributes as the original DomainEngine._domain_cells did: one
+    reference_domain_cell call per cell, in row order, adding random
+    domains to the cells with a single value. See
+    DomainGenerator.domain_cells for the columns.
+    """
+    encoded = engine.ds.get_encoded_data()
+    generator = engine._generator()
+    cells_domain = []
+    vid = 0
+    for row in encoded.rows():
+        for attr in engine.active_attributes:
+            tid = row['_tid_']
+            init_value, init_value_idx, dom = reference_domain_cell(engine, attr, row)
+            cid = engine.ds.get_cell_id(tid, attr)
+            cell_status = CellStatus.NOT_SET.value
+            if len(dom) <= 1:
+                # A NULL cell without any candidate is ignored.
+                if init_value == NULL_REPR and len(dom) == 0:
+                    continue
+                rand_dom_values = generator.random_domain(attr, init_value)
+                if len(rand_dom_values) == 0:
+                    continue
+                dom.extend(rand_dom_values)
+                cell_status = CellStatus.SINGLE_VALUE.value
+            cells_domain.append({'_tid_': tid,
+                                 'attribute': attr,
+                                 '_cid_': cid,
+                                 '_vid_': vid,
+                                 'domain': '|||'.join(dom),
+                                 'domain_size': len(dom),
+                                 'init_value': init_value,
+                                 'init_index': init_value_idx,
+                                 'weak_label': init_value,
+                                 'weak_label_idx': init_value_idx,
+                                 'fixed': cell_status})
+            vid += 1
+    return pd.DataFrame(data=cells_domain, columns=DOMAIN_COLUMNS)
+
+
+def batch(engine):
+    encoded = engine.ds.get_encoded_data()
+    all_rows = np.arange(len(encoded))
+    return engine._generator().domain_cells({attr: all_rows for attr in engine.active_attributes})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+    files = args.files or [os.path.join(TESTDATA, 'hospital.csv'),
+                           os.path.join(TESTDATA, 'hospital_constraints.txt')]
+    logging.getLogger().setLevel(logging.ERROR)
+    engine = setup(*files, scale=args.scale)
+
+    results = {}
+    for name, func in [('row loop', row_loop), ('batch', batch)]:
+        np.random.seed(SEED)
+        tic = time.time()
+        domain_df = func(engine)
+        results[name] = (time.time() - tic, domain_df)
+        print('{:<10} {:>8.2f} s {:>10d} cells'.format(name, results[name][0], len(domain_df)))
+    pd.testing.assert_frame_equal(results['row loop'][1].reset_index(drop=True), results['batch'][1],
+                                  check_dtype=False)
+    print('identical domains, batch speedup: {:.2f}x'.format(results['row loop'][0] / results['batch'][0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares the Postgres engine against the in-memory engine (--engine memory)
+on testdata/hospital.csv (or the files given on the command line).
+
+Runs the whole pipeline of tests/test_holoclean_repair.py (load, detect,
+domain, featurize/repair, evaluate) once per engine and reports the time of
+every stage and the correct/total repairs, which must be the same for both
+engines. The Postgres connection is configured like HoloClean (DB_USER,
+DB_NAME, ... environment variables); Postgres is skipped if it is not
+reachable.
+
+Usage: python engine_benchmark.py [--engines postgres,memory] [--epochs N]
+           [data.csv constraints.txt clean.csv]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import holoclean
+from detect import NullDetector, ViolationDetector
+from repair.featurize import ConstraintFeaturizer, FreqFeaturizer, InitAttrFeaturizer, OccurAttrFeaturizer
+
+TESTDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testdata')
+STAGES = ['load', 'detect', 'domain', 'repair', 'evaluate']
+
+
+def run(engine, data, dcs, clean, epochs):
+    hc = holoclean.HoloClean(engine=engine, domain_thresh_1=0.0, domain_thresh_2=0.0, weak_label_thresh=0.99,
+                             max_domain=10000, cor_strength=0.6, nb_cor_strength=0.8, epochs=epochs,
+                             weight_decay=0.01, learning_rate=0.001, threads=1, batch_size=1,
+                             timeout=3 * 60000, feature_norm=False, weight_norm=False).session
+    times = {}
+    tic = time.time()
+    hc.load_data('bench', data)
+    hc.load_dcs(dcs)
+    hc.ds.set_constraints(hc.get_dcs())
+    times['load'] = time.time() - tic
+
+    tic = time.time()
+    hc.detect_errors([NullDetector(), ViolationDetector()])
+    times['detect'] = time.time() - tic
+
+    tic = time.time()
+    hc.setup_domain()
+    times['domain'] = time.time() - tic
+
+    tic = time.time()
+    hc.repair_errors([InitAttrFeaturizer(), OccurAttrFeaturizer(), FreqFeaturizer(), ConstraintFeaturizer()])
+    times['repair'] = time.time() - tic
+
+    tic = time.time()
+    report = hc.evaluate(fpath=clean, tid_col='tid', attr_col='attribute', val_col='correct_val')
+    times['evaluate'] = time.time() - tic
+    hc.ds.engine.close()
+    return times, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engines', default='postgres,memory')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+    files = args.files or [os.path.join(TESTDATA, 'hospital.csv'),
+                           os.path.join(TESTDATA, 'hospital_constraints.txt'),
+                           os.path.join(TESTDATA, 'hospital_clean.csv')]
+    logging.getLogger().setLevel(logging.ERROR)
+
+    results = {}
+    for engine in args.engines.split(','):
+        try:
+            results[engine] = run(engine, *files, epochs=args.epochs)
+        except Exception as e:
+            if engine != 'postgres':
+                raise
+            print('skipping postgres: {}'.format(e))
+
+    print('{:<10} '.format('engine') + ' '.join('{:>10}'.format(stage + ' (s)') for stage in STAGES) +
+          ' {:>10} {:>8} {:>8}'.format('total (s)', 'correct', 'repairs'))
+    for engine, (times, report) in results.items():
+        print('{:<10} '.format(engine) + ' '.join('{:>10.2f}'.format(times[stage]) for stage in STAGES) +
+              ' {:>10.2f} {:>8d} {:>8d}'.format(sum(times.values()), int(report.correct_repairs),
+                                               int(report.total_repairs)))
+    if 'postgres' in results and 'memory' in results:
+        print('memory speedup: {:.2f}x'.format(sum(results['postgres'][0].values()) /
+                                               sum(results['memory'][0].values())))
+
+
+if __name__ == '__main__':
+    main()
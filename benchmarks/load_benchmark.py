@@ -0,0 +1,87 @@
+"""
+Compares the load time of the CSV path (Source.FILE) against the Parquet
+(Source.PARQUET) and Arrow IPC (Source.ARROW) paths on the CSV files of
+testdata/ (or the files given on the command line).
+
+Every file is first converted to Parquet and Arrow in a temporary directory
+(not timed). A load is reading the file into a Table plus dictionary-encoding
+it (EncodedTable), i.e. what Dataset.load_data does before writing to
+Postgres. Reports the best of --repeat runs.
+
+Usage: python load_benchmark.py [--repeat N] [file.csv ...]
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    sys.exit('ERROR load_benchmark.py requires pyarrow for the Parquet and Arrow files: pip install pyarrow')
+
+from dataset.encoding import EncodedTable
+from dataset.table import Table, Source
+from utils import NULL_REPR
+
+TESTDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'testdata')
+
+
+def load(fpath, src):
+    df = Table('bench', src, fpath=fpath).df
+    df.insert(0, '_tid_', range(len(df)))
+    for attr in df.columns:
+        if isinstance(df[attr].dtype, pd.CategoricalDtype) and df[attr].isnull().any():
+            df[attr] = df[attr].cat.add_categories([NULL_REPR])
+    df.fillna(NULL_REPR, inplace=True)
+    return EncodedTable.from_df(df, [attr for attr in df.columns if attr != '_tid_'])
+
+
+def best_time(fpath, src, repeat):
+    times = []
+    for _ in range(repeat):
+        tic = time.time()
+        load(fpath, src)
+        times.append(time.time() - tic)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+    files = args.files or sorted(glob.glob(os.path.join(TESTDATA, '*.csv')))
+    # Silence the warnings about dropped null columns.
+    logging.getLogger().setLevel(logging.ERROR)
+
+    tmpdir = tempfile.mkdtemp()
+    print('{:<24} {:>8} {:>10} {:>10} {:>10} {:>9} {:>9}'.format(
+        'file', 'rows', 'csv (s)', 'pq (s)', 'arrow (s)', 'pq x', 'arrow x'))
+    for fpath in files:
+        raw = pd.read_csv(fpath, dtype=str)
+        base = os.path.splitext(os.path.basename(fpath))[0]
+        pq_path = os.path.join(tmpdir, base + '.parquet')
+        arrow_path = os.path.join(tmpdir, base + '.arrow')
+        table = pa.Table.from_pandas(raw, preserve_index=False)
+        pq.write_table(table, pq_path)
+        feather.write_feather(table, arrow_path)
+
+        csv_time = best_time(fpath, Source.FILE, args.repeat)
+        pq_time = best_time(pq_path, Source.PARQUET, args.repeat)
+        arrow_time = best_time(arrow_path, Source.ARROW, args.repeat)
+        print('{:<24} {:>8d} {:>10.4f} {:>10.4f} {:>10.4f} {:>8.2f}x {:>8.2f}x'.format(
+            os.path.basename(fpath), raw.shape[0], csv_time, pq_time, arrow_time,
+            csv_time / pq_time, csv_time / arrow_time))
+
+
+if __name__ == '__main__':
+    main()
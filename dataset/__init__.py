@@ -1,5 +1,7 @@
 from .dataset import Dataset
 from .dataset import AuxTables
 from .dataset import CellStatus
+from .encoding import EncodedTable
+from .stats import PairStats
 
-__all__ = ['Dataset', 'AuxTables', 'CellStatus']
+__all__ = ['Dataset', 'AuxTables', 'CellStatus', 'EncodedTable', 'PairStats']
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+
+import numpy as np
+
+# Bump when the layout of cached entries changes: old entries are then
+# never hit again and age out through eviction.
+CACHE_FORMAT_VERSION = 1
+CACHE_EXT = '.npz'
+
+
+class DiskCache:
+    """
+    DiskCache is a content-addressed cache of numpy arrays on local disk.
+
+    Every entry is a compressed .npz file named after the hash of its key
+    (see make_key), so an entry is only ever hit for the exact data and
+    settings it was computed from. Once the entries exceed max_bytes, the
+    least recently used entries (by file mtime, refreshed on every hit) are
+    evicted.
+    """
+    def __init__(self, cache_dir, max_bytes):
+        """
+        :param cache_dir: (str) directory to store the entries in. Created if
+            it does not exist.
+        :param max_bytes: (int) size cap of all entries in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        make_key returns the hex digest of :param parts: (str/numbers/tuples),
+        prefixed by CACHE_FORMAT_VERSION.
+        """
+        digest = hashlib.sha1()
+        digest.update(repr((CACHE_FORMAT_VERSION,) + parts).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXT)
+
+    def load(self, key):
+        """
+        load returns the arrays stored under :param key: as a dict
+        { name -> numpy.ndarray } or None on a miss.
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+        except (IOError, OSError, ValueError) as e:
+            logging.warning('dropping unreadable cache entry %s: %s', path, e)
+            self.invalidate(key)
+            return None
+        # Mark the entry as recently used for eviction.
+        os.utime(path, None)
+        logging.debug('cache hit for %s', path)
+        return arrays
+
+    def store(self, key, arrays):
+        """
+        store saves :param arrays: (dict { name -> numpy.ndarray }) under
+        :param key: and evicts entries if the cache exceeds its size cap.
+        """
+        path = self._path(key)
+        tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        # np.savez_compressed appends .npz to names without that extension.
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        # Atomic so concurrent sessions never read a partially written entry.
+        os.replace(tmp_path, path)
+        logging.debug('stored cache entry %s (%d bytes)', path, os.path.getsize(path))
+        self.evict()
+
+    def invalidate(self, key=None):
+        """
+        invalidate removes the entry of :param key: or every entry if
+        :param key: is None.
+        """
+        paths = [self._path(key)] if key is not None else [path for path, _, _ in self._entries()]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def evict(self):
+        """
+        evict removes the least recently used entries until the entries fit
+        in self.max_bytes.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            logging.debug('evicting cache entry %s (%d bytes)', path, size)
+            os.remove(path)
+            total -= size
+
+    def size(self):
+        """
+        size returns the total size in bytes of all entries.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_EXT):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+
+# Quoted identifiers and bare words of a SQL query (see QueryResultCache.referenced_tables).
+_identifier_re = re.compile(r'"([^"]+)"|([A-Za-z_][A-Za-z0-9_]*)')
+# String literals and quoted identifiers (kept as is by QueryResultCache.normalize) or whitespace.
+_token_re = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+")
+
+
+class QueryResultCache:
+    """
+    QueryResultCache caches the rows returned by read-only SQL queries in a
+    DiskCache so that unchanged queries over unchanged tables (e.g. reruns
+    and parameter sweeps) are answered without querying Postgres.
+
+    An entry is keyed by the normalized query text and the version of every
+    table the query references. DBengine sets the version of a table
+    whenever it (re-)creates or modifies it: a hash of the loaded rows
+    (bulk_load_df) or of the creating query and the versions of its input
+    tables (create_db_table_from_query), so versions are stable across
+    sessions over the same data. Only queries that reference at least one
+    table with a version are cached: tables created outside DBengine are
+    not tracked.
+    """
+    def __init__(self, cache):
+        """
+        :param cache: (DiskCache) stores the entries.
+        """
+        self.cache = cache
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query):
+        """
+        normalize collapses the whitespace of :param query: outside string
+        literals and quoted identifiers and strips a trailing semicolon.
+        Queries with backslashes (e.g. E'' escapes) are only stripped since
+        their literals cannot be told apart without parsing them.
+        """
+        query = query.strip()
+        if '\\' not in query:
+            query = _token_re.sub(lambda match: ' ' if match.group(0)[0] not in '\'"' else match.group(0), query)
+        return query.strip().rstrip(';').strip()
+
+    def set_version(self, table, version):
+        """
+        set_version sets the version of :param table: to :param version:
+        (str), or to a fresh random version if :param version: is None.
+        """
+        with self._lock:
+            self.versions[table] = version if version is not None else uuid.uuid4().hex
+
+    def derived_version(self, table, *parts):
+        """
+        derived_version returns the version of :param table: after a change
+        described by :param parts: or None if the table has no version.
+        """
+        with self._lock:
+            version = self.versions.get(table)
+        if version is None:
+            return None
+        return DiskCache.make_key('derived', version, *parts)
+
+    def query_version(self, query):
+        """
+        query_version returns the version of a table created from
+        :param query: or None if the query references no versioned table.
+        """
+        key = self.key(query)
+        return None if key is None else DiskCache.make_key('created', key)
+
+    def referenced_tables(self, query):
+        """
+        referenced_tables returns the (sorted) versioned tables referenced
+        in :param query: as quoted identifiers or (case-insensitive) bare
+        words.
+        """
+        with self._lock:
+            versions = dict(self.versions)
+        tables = set()
+        for quoted, bare in _identifier_re.findall(query):
+            if quoted and quoted in versions:
+                tables.add(quoted)
+            elif bare and bare.lower() in versions:
+                tables.add(bare.lower())
+        return sorted((table, versions[table]) for table in tables)
+
+    def key(self, query):
+        """
+        key returns the cache key of :param query: or None if the query is
+        not cacheable (not a SELECT or no versioned table referenced).
+        """
+        query = self.normalize(query)
+        if not re.match(r'(?i)(SELECT|WITH)\b', query):
+            return None
+        tables = self.referenced_tables(query)
+        if not tables:
+            return None
+        return DiskCache.make_key('query', query, tuple(tables))
+
+    def load(self, key):
+        """
+        load returns the cached rows (list of tuples) of :param key: or None
+        on a miss.
+        """
+        arrays = self.cache.load(key)
+        with self._lock:
+            if arrays is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if arrays is None:
+            return None
+        rows = json.loads(arrays['rows'].tobytes().decode('utf-8'))
+        return [tuple(row) for row in rows]
+
+    def store(self, key, rows):
+        """
+        store saves :param rows: (list of tuples) under :param key:. Results
+        with values that are not JSON serializable (e.g. Decimal) are not
+        cached.
+        """
+        try:
+            data = json.dumps(rows).encode('utf-8')
+        except (TypeError, ValueError):
+            logging.debug('not caching query result with non JSON serializable values')
+            return
+        self.cache.store(key, {'rows': np.frombuffer(data, dtype=np.uint8)})
+
+    def stats(self):
+        """
+        stats returns the # of cache hits and misses.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
@@ -3,11 +3,17 @@ import logging
 import os
 import time
 
+import numpy as np
 import pandas as pd
 
+from .cache import DiskCache, QueryResultCache
 from .dbengine import DBengine
-from .table import Table, Source
-from utils import dictify_df, NULL_REPR
+from .encoding import EncodedTable
+from .memengine import MemoryEngine
+from .stats import PairStats, compute_pair_matrices, pair_matrix
+from .table import Table, Source, normalize_df, read_csv_chunks, read_columnar, source_from_path
+from dcparser.evaluator import ConstraintEvaluator
+from utils import NULL_REPR, NULL_CODE
 
 
 class AuxTables(Enum):
@@ -26,6 +32,18 @@ class CellStatus(Enum):
     SINGLE_VALUE   = 2
 
 
+def fill_null_categories(df):
+    """
+    fill_null_categories adds NULL_REPR to the categories of the categorical
+    columns of :param df: that have NULLs so that they can be filled with
+    NULL_REPR.
+    """
+    for attr in df.columns:
+        if isinstance(df[attr].dtype, pd.CategoricalDtype) and NULL_REPR not in df[attr].cat.categories \
+                and df[attr].isnull().any():
+            df[attr] = df[attr].cat.add_categories([NULL_REPR])
+
+
 class Dataset:
     """
     This class keeps all dataframes and tables for a HC session.
@@ -38,31 +56,68 @@ class Dataset:
         self.aux_table = {}
         for tab in AuxTables:
             self.aux_table[tab] = None
-        # start dbengine
-        self.engine = DBengine(
-            env['db_user'],
-            env['db_pwd'],
-            env['db_name'],
-            env['db_host'],
-            pool_size=env['threads'],
-            timeout=env['timeout']
-        )
+        # On-disk cache of statistics and correlations (None if disabled)
+        self.cache = None
+        if env['cache_dir']:
+            self.cache = DiskCache(env['cache_dir'], int(env['cache_size']) * 1024 * 1024)
+        # Cache of query results in self.cache (None if disabled)
+        result_cache = None
+        if env['cache_queries']:
+            if self.cache is None:
+                logging.warning('--cache-queries requires --cache-dir: query results are not cached')
+            else:
+                result_cache = QueryResultCache(self.cache)
+        # start dbengine (or the in-memory engine, see MemoryEngine)
+        if env['engine'] == 'memory':
+            self.engine = MemoryEngine(max_workers=env['threads'])
+        elif env['engine'] == 'postgres':
+            self.engine = DBengine(
+                env['db_user'],
+                env['db_pwd'],
+                env['db_name'],
+                env['db_host'],
+                pool_size=env['threads'],
+                timeout=env['timeout'],
+                unlogged=env['unlogged_tables'],
+                explain=env['explain_queries'],
+                query_cost_budget=env['query_cost_budget'],
+                result_cache=result_cache,
+                range_joins_in_memory=env['range_joins_in_memory']
+            )
+        else:
+            raise ValueError("ERROR unknown engine {}: expected 'postgres' or 'memory'".format(env['engine']))
         # members to convert (tuple_id, attribute) to cell_id
         self.attr_to_idx = {}
         self.attr_count = 0
         # dataset statistics
         self.stats_ready = False
+        # Worker processes used to compute the pair statistics
+        self.processes = env['threads']
         # Total tuples
         self.total_tuples = 0
         # Domain stats for single attributes
         self.single_attr_stats = {}
-        # Domain stats for attribute pairs
-        self.pair_attr_stats = {}
+        # Dictionary-encoded raw data (EncodedTable). Built from the stored
+        # raw table on first use after a streamed load (see get_encoded_data).
+        self.encoded = None
+        # Rows per chunk of a streamed load and its single-attribute
+        # statistics ({ attr -> { value -> count } }, see _stream_csv_to_db).
+        self._stream_chunksize = None
+        self._streamed_single_stats = None
+        # ConstraintEvaluator of the raw data (see get_constraint_evaluator)
+        self._evaluator = None
+        # Domain stats for attribute pairs (PairStats)
+        self.pair_attr_stats = None
+        # Column used as _tid_ (None if _tid_'s are auto-incremented)
+        self.entity_col = None
+        # Row indexes (in self.encoded) of the tuples of the last append_data
+        self.appended_rows = None
 
     # TODO(richardwu): load more than just CSV files
-    def load_data(self, name, fpath, na_values=None, entity_col=None, src_col=None):
+    def load_data(self, name, fpath, na_values=None, entity_col=None, src_col=None, chunksize=None, columns=None):
         """
-        load_data takes a CSV file of the initial data, adds tuple IDs (_tid_)
+        load_data takes a CSV file (or a Parquet/Arrow file, see
+        source_from_path) of the initial data, adds tuple IDs (_tid_)
         to each row to uniquely identify an 'entity', and generates unique
         index numbers for each attribute/column.
 
@@ -78,16 +133,31 @@ class Dataset:
         :param src_col: (str) if not None, for fusion tasks
             specifies the column containing the source for each "mention" of an
             entity.
+        :param chunksize: (int) if not None, stream the CSV file into Postgres
+            in chunks of this many rows instead of reading it into memory at
+            once (see _stream_csv_to_db).
+        :param columns: (list[str]) for Parquet/Arrow files, only load these
+            columns.
         """
-        tic = time.clock()
+        tic = time.time()
+        self.entity_col = entity_col
         try:
             # Do not include TID and source column as trainable attributes
             exclude_attr_cols = ['_tid_']
             if src_col is not None:
                 exclude_attr_cols.append(src_col)
 
+            src = source_from_path(fpath)
+            if chunksize is not None and src == Source.FILE:
+                self._stream_csv_to_db(name, fpath, chunksize, na_values, entity_col, exclude_attr_cols)
+                status = 'DONE Loading {fname}'.format(fname=os.path.basename(fpath))
+                self._index_raw_attrs()
+                toc = time.time()
+                return status, toc - tic
+
             # Load raw CSV file/data into a Postgres table 'name' (param).
-            self.raw_data = Table(name, Source.FILE, na_values=na_values, exclude_attr_cols=exclude_attr_cols, fpath=fpath)
+            self.raw_data = Table(name, src, na_values=na_values, exclude_attr_cols=exclude_attr_cols, fpath=fpath,
+                                  columns=columns)
 
             df = self.raw_data.df
             # Add _tid_ column to dataset that uniquely identifies an entity.
@@ -99,32 +169,181 @@ class Dataset:
             else:
                 # use entity IDs as _tid_'s directly
                 df.rename({entity_col: '_tid_'}, axis='columns', inplace=True)
+                if isinstance(df['_tid_'].dtype, pd.CategoricalDtype):
+                    df['_tid_'] = np.asarray(df['_tid_'], dtype=object)
 
             # Use NULL_REPR to represent NULL values
+            fill_null_categories(df)
             df.fillna(NULL_REPR, inplace=True)
 
+            # Dictionary-encode the attributes: the code matrix is what the
+            # statistics, domain and featurization stages work on.
+            self.encoded = EncodedTable.from_df(df, self.raw_data.get_attributes())
+            self._evaluator = None
+            self._streamed_single_stats = None
+
             logging.info("Loaded %d rows with %d cells", self.raw_data.df.shape[0], self.raw_data.df.shape[0] * self.raw_data.df.shape[1])
 
             # Call to store to database
-            self.raw_data.store_to_db(self.engine.engine)
+            self.raw_data.store_to_db(self.engine)
             status = 'DONE Loading {fname}'.format(fname=os.path.basename(fpath))
-
-            # Generate indexes on attribute columns for faster queries
-            for attr in self.raw_data.get_attributes():
-                # Generate index on attribute
-                self.raw_data.create_db_index(self.engine,[attr])
-
-            # Create attr_to_idx dictionary (assign unique index for each attribute)
-            # and attr_count (total # of attributes)
-            self.attr_to_idx = {attr: idx for idx, attr in enumerate(self.raw_data.get_attributes())}
-            self.attr_count = len(self.attr_to_idx)
+            self._index_raw_attrs()
         except Exception:
             logging.error('loading data for table %s', name)
             raise
-        toc = time.clock()
+        toc = time.time()
         load_time = toc - tic
         return status, load_time
 
+    def _index_raw_attrs(self):
+        # Generate indexes on attribute columns for faster queries
+        attrs = self.raw_data.get_attributes()
+        for attr in attrs:
+            # Generate index on attribute
+            self.raw_data.create_db_index(self.engine,[attr])
+
+        # Create attr_to_idx dictionary (assign unique index for each attribute)
+        # and attr_count (total # of attributes)
+        self.attr_to_idx = {attr: idx for idx, attr in enumerate(attrs)}
+        self.attr_count = len(self.attr_to_idx)
+
+    def _stream_csv_to_db(self, name, fpath, chunksize, na_values, entity_col, exclude_attr_cols):
+        """
+        _stream_csv_to_db reads the CSV file :param fpath: in chunks of
+        :param chunksize: rows, assigns _tid_'s and NULL_REPR per chunk and
+        appends each chunk to the Postgres table :param name:. Only the
+        single-attribute statistics are accumulated as the chunks go by, so
+        peak memory depends on the chunk size and the # of distinct values,
+        not on the file size.
+
+        self.raw_data is a lazy table: the DataFrame is only read back from
+        Postgres if a later stage asks for it, and so is the encoded data
+        (see get_encoded_data).
+        """
+        num_rows = 0
+        attrs = None
+        single_stats = None
+        self.encoded = None
+        self._evaluator = None
+        for chunk in read_csv_chunks(fpath, chunksize, na_values=na_values, exclude_attr_cols=exclude_attr_cols):
+            if entity_col is None:
+                chunk.insert(0, '_tid_', range(num_rows, num_rows + len(chunk)))
+            else:
+                chunk.rename({entity_col: '_tid_'}, axis='columns', inplace=True)
+            chunk.fillna(NULL_REPR, inplace=True)
+
+            if attrs is None:
+                attrs = [attr for attr in chunk.columns if attr not in exclude_attr_cols]
+                single_stats = {attr: {} for attr in attrs}
+            for attr in attrs:
+                stats = single_stats[attr]
+                for val, count in chunk[attr].value_counts().items():
+                    if val != NULL_REPR:
+                        stats[val] = stats.get(val, 0) + int(count)
+
+            if_exists = 'replace' if num_rows == 0 else 'append'
+            Table(name, Source.DF, df=chunk).store_to_db(self.engine, if_exists=if_exists)
+            num_rows += len(chunk)
+            logging.debug('streamed %d rows of %s', num_rows, os.path.basename(fpath))
+        if num_rows == 0:
+            raise Exception('ERROR while loading table. No rows in file {}'.format(fpath))
+
+        # We can only tell which columns are entirely NULL once every chunk
+        # has been read: drop them from the stored table now.
+        null_attrs = [attr for attr in attrs if not single_stats[attr]]
+        for attr in null_attrs:
+            logging.warning("Dropping the following null column from the dataset: '%s'", attr)
+            del single_stats[attr]
+        self.engine.drop_columns(name, null_attrs)
+        self._stream_chunksize = chunksize
+        self._streamed_single_stats = single_stats
+
+        num_cols = len(single_stats) + len(exclude_attr_cols)
+        logging.info("Loaded %d rows with %d cells", num_rows, num_rows * num_cols)
+        self.raw_data = Table(name, Source.DB, exclude_attr_cols=exclude_attr_cols,
+                              db_engine=self.engine, lazy=True, order_by='_tid_')
+
+    def append_data(self, fpath, na_values=None):
+        """
+        append_data appends the rows of the CSV file :param fpath: (with the
+        same columns as the loaded data) to the raw data.
+
+        New tuples get the next auto-incremented _tid_'s (or the values of
+        the entity column the data was loaded with). The rows are appended
+        to the Postgres table and to the encoded data, and the statistics
+        (if already computed) are updated with the counts of the new rows
+        only. The row indexes of the new tuples are kept in
+        self.appended_rows (see DomainEngine.update_domain).
+
+        :param fpath: (str) filepath to CSV file.
+        :param na_values: (str) value that identifies a NULL value
+        """
+        tic = time.time()
+        if self.raw_data is None:
+            raise Exception('ERROR No dataset loaded')
+        try:
+            encoded = self.get_encoded_data()
+            exclude_attr_cols = self.raw_data.exclude_attr_cols
+            src = source_from_path(fpath)
+            if src == Source.FILE:
+                df = pd.read_csv(fpath, dtype=str, na_values=na_values, encoding='utf-8')
+                normalize_df(df, exclude_attr_cols)
+            else:
+                df = read_columnar(fpath, src, na_values=na_values, exclude_attr_cols=exclude_attr_cols)
+            if self.entity_col is None:
+                start = int(encoded.tids.max()) + 1 if len(encoded) else 0
+                df.insert(0, '_tid_', range(start, start + len(df)))
+            else:
+                df.rename({self.entity_col: '_tid_'}, axis='columns', inplace=True)
+                if isinstance(df['_tid_'].dtype, pd.CategoricalDtype):
+                    df['_tid_'] = np.asarray(df['_tid_'], dtype=object)
+
+            columns = ['_tid_'] + [col for col in exclude_attr_cols if col != '_tid_'] + encoded.attrs
+            missing = [col for col in columns if col not in df.columns]
+            if missing:
+                raise Exception('ERROR appended data is missing the columns {}'.format(missing))
+            extra = [col for col in df.columns if col not in columns]
+            if extra:
+                logging.warning("Dropping the following columns of the appended data that are not in the dataset: %s", extra)
+            df = df[columns].copy()
+            fill_null_categories(df)
+            df = df.fillna(NULL_REPR)
+
+            rows = encoded.append(df)
+            self._evaluator = None
+            # The counts of the streamed load do not include the new rows.
+            self._streamed_single_stats = None
+            Table(self.raw_data.name, Source.DF, df=df).store_to_db(self.engine, if_exists='append')
+            if self.raw_data.is_loaded():
+                self.raw_data.df = pd.concat([self.raw_data.df, df[self.raw_data.df.columns]], ignore_index=True)
+            if self.stats_ready:
+                self._update_stats(rows)
+            self.appended_rows = rows
+            logging.info("Appended %d rows with %d cells", df.shape[0], df.shape[0] * df.shape[1])
+            status = 'DONE Appending {fname}'.format(fname=os.path.basename(fpath))
+        except Exception:
+            logging.error('appending data to table %s', self.raw_data.name)
+            raise
+        toc = time.time()
+        return status, toc - tic
+
+    def _update_stats(self, rows):
+        """
+        _update_stats adds the counts of the tuples at row indexes :param rows:
+        of the encoded data to the memoized statistics.
+        """
+        encoded = self.get_encoded_data()
+        codes = encoded.codes[rows]
+        self.total_tuples += len(rows)
+        for idx, attr in enumerate(encoded.attrs):
+            counts = np.bincount(codes[:, idx], minlength=len(encoded.dicts[attr]))
+            counts[NULL_CODE] = 0
+            val_codes = counts.nonzero()[0]
+            stats = self.single_attr_stats[attr]
+            for val, count in zip(encoded.decode(attr, val_codes), counts[val_codes].tolist()):
+                stats[val] = stats.get(val, 0) + count
+        self.pair_attr_stats.update(codes)
+
     def set_constraints(self, constraints):
         self.constraints = constraints
 
@@ -147,7 +366,7 @@ class Dataset:
         try:
             self.aux_table[aux_table] = Table(aux_table.name, Source.DF, df=df)
             if store:
-                self.aux_table[aux_table].store_to_db(self.engine.engine)
+                self.aux_table[aux_table].store_to_db(self.engine)
             if index_attrs:
                 self.aux_table[aux_table].create_df_index(index_attrs)
             if store and index_attrs:
@@ -170,6 +389,55 @@ class Dataset:
             logging.error('generating aux_table %s', aux_table.name)
             raise
 
+    def register_aux_table(self, aux_table, index_attrs=False):
+        """
+        register_aux_table sets :param aux_table: to the table of the same
+        name already created in the engine (e.g. by
+        Engine.create_pos_values). It is only read from the engine if its
+        DataFrame is accessed.
+
+        :param index_attrs: (list[str]) list of attributes to create indexes on.
+        """
+        try:
+            self.aux_table[aux_table] = Table(aux_table.name, Source.DB, db_engine=self.engine, lazy=True)
+            if index_attrs:
+                self.aux_table[aux_table].create_df_index(index_attrs)
+                self.aux_table[aux_table].create_db_index(self.engine, index_attrs)
+        except Exception:
+            logging.error('registering aux_table %s', aux_table.name)
+            raise
+
+    def get_aux_columns(self, aux_table, columns, order_by=None, dtypes=None, tag=None):
+        """
+        get_aux_columns returns the :param columns: of :param aux_table: as a
+        dict { column -> numpy.ndarray } (see Engine.read_columns).
+
+        :param order_by: (str) column to sort the rows by.
+        :param dtypes: (dict { column -> dtype }) dtypes of numeric columns
+            (see DBengine.fetch_columns).
+        :param tag: (str) caller recorded with the query in the query log.
+        """
+        return self.engine.read_columns(aux_table.name, columns, order_by=order_by, dtypes=dtypes, tag=tag)
+
+    def iter_aux_columns(self, aux_table, columns, order_by=None, chunksize=100000, dtypes=None, tag=None):
+        """
+        iter_aux_columns yields the columns of :param aux_table: (see
+        get_aux_columns) in chunks of at most :param chunksize: rows.
+        """
+        for chunk in self.engine.iter_read_columns(aux_table.name, columns, order_by=order_by, chunksize=chunksize,
+                                                   dtypes=dtypes, tag=tag):
+            yield chunk
+
+    def get_aux_df(self, aux_table):
+        """
+        get_aux_df returns the DataFrame of :param aux_table: with its
+        index (if any) as columns.
+        """
+        if self.aux_table[aux_table] is None:
+            raise Exception('ERROR auxiliary table {} has not been generated'.format(aux_table.name))
+        df = self.aux_table[aux_table].df
+        return df.reset_index() if any(df.index.names) else df
+
     def get_raw_data(self):
         """
         get_raw_data returns a pandas.DataFrame containing the raw data as it was initially loaded.
@@ -178,6 +446,30 @@ class Dataset:
             raise Exception('ERROR No dataset loaded')
         return self.raw_data.df
 
+    def get_encoded_data(self):
+        """
+        get_encoded_data returns the dictionary-encoded raw data (EncodedTable).
+        """
+        if self.encoded is None:
+            if self.raw_data is None:
+                raise Exception('ERROR No dataset loaded')
+            # Streamed load: encode the stored raw table chunk by chunk.
+            attrs = self.raw_data.get_attributes()
+            chunks = self.engine.iter_table(self.raw_data.name, columns=['_tid_'] + attrs, order_by='_tid_',
+                                            chunksize=self._stream_chunksize)
+            self.encoded = EncodedTable.from_chunks(chunks, attrs)
+        return self.encoded
+
+    def get_constraint_evaluator(self):
+        """
+        get_constraint_evaluator returns the ConstraintEvaluator of the raw
+        data, shared by the stages that evaluate the denial constraints in
+        memory.
+        """
+        if self._evaluator is None:
+            self._evaluator = ConstraintEvaluator(self.get_raw_data(), encoded=self.get_encoded_data())
+        return self._evaluator
+
     def get_attributes(self):
         """
         get_attributes return the trainable/learnable attributes (i.e. exclude meta
@@ -196,125 +488,222 @@ class Dataset:
         vid = tuple_id*self.attr_count + self.attr_to_idx[attr_name]
         return vid
 
-    def get_statistics(self):
+    def get_statistics(self, pairs=None):
         """
         get_statistics returns:
             1. self.total_tuples (total # of tuples)
             2. self.single_attr_stats ({ attribute -> { value -> count } })
               the frequency (# of entities) of a given attribute-value
-            3. self.pair_attr_stats ({ attr1 -> { attr2 -> {val1 -> {val2 -> count } } } })
-              the statistics for each pair of attributes, attr1 and attr2, where:
-                <attr1>: first attribute
-                <attr2>: second attribute
-                <val1>: all values of <attr1>
-                <val2>: values of <attr2> that appear at least once with <val1>.
-                <count>: frequency (# of entities) where attr1=val1 AND attr2=val2
-
-        NB: neither single_attr_stats nor pair_attr_stats contain frequencies
-            for values that are NULL (NULL_REPR). One would need to explicitly
-            check if the value is NULL before lookup.
-
-            Also, values that only co-occur with NULLs will NOT be in pair_attr_stats.
+            3. self.pair_attr_stats (PairStats)
+              the statistics for each pair of attributes, attr1 and attr2: a
+              sparse count matrix over value codes where entry (val1, val2)
+              is the frequency (# of entities) where attr1=val1 AND attr2=val2.
+              Look counts up with e.g. pair_attr_stats.get(attr1, attr2, val1, val2)
+              or pair_attr_stats.row(attr1, attr2, code1).
+
+        NB: single_attr_stats does not contain frequencies for values that
+            are NULL (NULL_REPR) and pair_attr_stats lookups always return 0
+            for NULL values. One would need to explicitly check if the value
+            is NULL before lookup.
+
+        :param pairs: (list[(attr1, attr2)]) attribute pairs to compute up
+            front when the statistics are not computed yet (see collect_stats).
         """
-        if not self.stats_ready:
+        if not self.stats_ready and not self._load_cached_stats():
             logging.debug('computing frequency and co-occurrence statistics from raw data...')
-            tic = time.clock()
-            self.collect_stats()
-            logging.debug('DONE computing statistics in %.2fs', time.clock() - tic)
+            tic = time.time()
+            self.collect_stats(pairs)
+            logging.debug('DONE computing statistics in %.2fs', time.time() - tic)
+            self._store_cached_stats()
 
         stats = (self.total_tuples, self.single_attr_stats, self.pair_attr_stats)
         self.stats_ready = True
         return stats
 
-    def collect_stats(self):
+    def collect_stats(self, pairs=None):
         """
         collect_stats memoizes:
           1. self.single_attr_stats ({ attribute -> { value -> count } })
             the frequency (# of entities) of a given attribute-value
-          2. self.pair_attr_stats ({ attr1 -> { attr2 -> {val1 -> {val2 -> count } } } })
-            where DataFrame contains 3 columns:
-              <attr1>: all possible values for attr1 ('val1')
-              <attr2>: all values for attr2 that appeared at least once with <val1> ('val2')
-              <count>: frequency (# of entities) where attr1: val1 AND attr2: val2
-            Also known as co-occurrence count.
+          2. self.pair_attr_stats (PairStats)
+            one sparse co-occurrence count matrix per unordered pair of
+            attributes (see get_stats_pair). Also known as co-occurrence count.
+
+        The pair matrices are computed with self.processes (env['threads'])
+        worker processes.
+
+        :param pairs: (list[(attr1, attr2)]) if not None, only the matrices of
+            these pairs are computed up front. Any other pair is computed
+            the first time it is looked up.
         """
         logging.debug("Collecting single/pair-wise statistics...")
-        self.total_tuples = self.get_raw_data().shape[0]
-        # Single attribute-value frequency.
+        self.total_tuples = len(self.get_encoded_data())
+        # Single attribute-value frequency (accumulated already by a
+        # streamed load).
         for attr in self.get_attributes():
-            self.single_attr_stats[attr] = self.get_stats_single(attr)
-        # Compute co-occurrence frequencies.
-        for cond_attr in self.get_attributes():
-            self.pair_attr_stats[cond_attr] = {}
-            for trg_attr in self.get_attributes():
-                if trg_attr != cond_attr:
-                    self.pair_attr_stats[cond_attr][trg_attr] = self.get_stats_pair(cond_attr, trg_attr)
+            if self._streamed_single_stats is not None:
+                self.single_attr_stats[attr] = self._streamed_single_stats[attr]
+            else:
+                self.single_attr_stats[attr] = self.get_stats_single(attr)
+        self._streamed_single_stats = None
+        # Compute co-occurrence frequencies. Only one matrix is computed per
+        # unordered pair: (trg_attr, cond_attr) is served as its transpose.
+        encoded = self.get_encoded_data()
+        self.pair_attr_stats = PairStats(encoded)
+        if pairs is None:
+            attrs = self.get_attributes()
+            pairs = [(cond_attr, trg_attr) for idx, cond_attr in enumerate(attrs) for trg_attr in attrs[idx + 1:]]
+        else:
+            pairs = self._unordered_pairs(pairs)
+        matrices = compute_pair_matrices(encoded, pairs, processes=self.processes)
+        for (cond_attr, trg_attr), matrix in zip(pairs, matrices):
+            self.pair_attr_stats.set_matrix(cond_attr, trg_attr, matrix)
+
+    def _unordered_pairs(self, pairs):
+        """
+        _unordered_pairs returns the distinct unordered pairs of different
+        attributes in :param pairs: ordered by attribute index.
+        """
+        attr_to_idx = self.get_encoded_data().attr_to_idx
+        unordered = set()
+        for attr1, attr2 in pairs:
+            if attr1 != attr2:
+                unordered.add(tuple(sorted((attr1, attr2), key=attr_to_idx.get)))
+        return sorted(unordered, key=lambda pair: (attr_to_idx[pair[0]], attr_to_idx[pair[1]]))
 
     def get_stats_single(self, attr):
         """
         Returns a dictionary where the keys are domain values for :param attr: and
         the values contain the frequency count of that value for this attribute.
         """
+        return self._single_stats_from_counts(attr, self._code_counts(attr))
+
+    def _code_counts(self, attr):
+        encoded = self.get_encoded_data()
+        return np.bincount(encoded.column(attr), minlength=len(encoded.dicts[attr]))
+
+    def _single_stats_from_counts(self, attr, counts):
         # need to decode values into unicode strings since we do lookups via
         # unicode strings from Postgres
-        data_df = self.get_raw_data()
-        return data_df[[attr]].loc[data_df[attr] != NULL_REPR].groupby([attr]).size().to_dict()
+        counts = counts.copy()
+        counts[NULL_CODE] = 0
+        codes = counts.nonzero()[0]
+        return dict(zip(self.get_encoded_data().decode(attr, codes), counts[codes].tolist()))
+
+    def cache_key(self, kind, *settings):
+        """
+        cache_key returns the DiskCache key of the :param kind: of data
+        (e.g. 'stats') computed from the current raw data and :param settings:.
+        """
+        return DiskCache.make_key(kind, self.get_encoded_data().fingerprint(), *settings)
+
+    def invalidate_cache(self):
+        """
+        invalidate_cache removes every entry of the on-disk cache.
+        """
+        if self.cache is not None:
+            self.cache.invalidate()
+
+    def _load_cached_stats(self):
+        """
+        _load_cached_stats loads the statistics of the current raw data from
+        the on-disk cache.
+
+        :return: (bool) True on a cache hit.
+        """
+        if self.cache is None:
+            return False
+        arrays = self.cache.load(self.cache_key('stats'))
+        if arrays is None:
+            return False
+        encoded = self.get_encoded_data()
+        self.total_tuples = int(arrays['total'][0])
+        for idx, attr in enumerate(encoded.attrs):
+            self.single_attr_stats[attr] = self._single_stats_from_counts(attr, arrays['single_{}'.format(idx)])
+        self.pair_attr_stats = PairStats.from_arrays(encoded, arrays)
+        logging.debug('loaded frequency and co-occurrence statistics from cache')
+        return True
+
+    def _store_cached_stats(self):
+        if self.cache is None:
+            return
+        encoded = self.get_encoded_data()
+        arrays = self.pair_attr_stats.to_arrays()
+        arrays['total'] = np.array([self.total_tuples])
+        for idx, attr in enumerate(encoded.attrs):
+            arrays['single_{}'.format(idx)] = self._code_counts(attr)
+        self.cache.store(self.cache_key('stats'), arrays)
 
     def get_stats_pair(self, first_attr, second_attr):
         """
-        Returns a dictionary {first_val -> {second_val -> count } } where:
-            <first_val>: all possible values for first_attr
-            <second_val>: all values for second_attr that appear at least once with <first_val>
-            <count>: frequency (# of entities) where first_attr=<first_val> AND second_attr=<second_val>
-        Filters out NULL values so no entries in the dictionary would have NULLs.
+        Returns a CSR matrix (scipy.sparse) with the codes of first_attr as
+        rows and the codes of second_attr as columns where entry
+        (first_code, second_code) is the frequency (# of entities) where
+        first_attr=<first_code> AND second_attr=<second_code>.
+
+        Row/column NULL_CODE hold the co-occurrences with NULL values; they
+        are ignored by the PairStats lookups.
         """
-        data_df = self.get_raw_data()
-        tmp_df = data_df[[first_attr, second_attr]]\
-            .loc[(data_df[first_attr] != NULL_REPR) & (data_df[second_attr] != NULL_REPR)]\
-            .groupby([first_attr, second_attr])\
-            .size()\
-            .reset_index(name="count")
-        return dictify_df(tmp_df)
+        return pair_matrix(self.get_encoded_data(), first_attr, second_attr)
 
     def get_domain_info(self):
         """
         Returns (number of random variables, count of distinct values across all attributes).
         """
-        query = 'SELECT count(_vid_), max(domain_size) FROM %s'%AuxTables.cell_domain.name
-        res = self.engine.execute_query(query)
-        total_vars = int(res[0][0])
-        classes = int(res[0][1])
-        return total_vars, classes
+        total_vars, classes = self.engine.count_and_max(AuxTables.cell_domain.name, 'domain_size')
+        return total_vars, int(classes)
 
     def get_inferred_values(self):
-        tic = time.clock()
-        # index into domain with inferred_val_idx + 1 since SQL arrays begin at index 1.
-        query = "SELECT t1._tid_, t1.attribute, domain[inferred_val_idx + 1] as rv_value " \
-                "FROM " \
-                "(SELECT _tid_, attribute, " \
-                "_vid_, init_value, string_to_array(regexp_replace(domain, \'[{\"\"}]\', \'\', \'gi\'), \'|||\') as domain " \
-                "FROM %s) as t1, %s as t2 " \
-                "WHERE t1._vid_ = t2._vid_"%(AuxTables.cell_domain.name, AuxTables.inf_values_idx.name)
-        self.generate_aux_table_sql(AuxTables.inf_values_dom, query, index_attrs=['_tid_'])
+        tic = time.time()
+        # inf_values_idx already holds the inferred value of every variable
+        # so we only need to join in the _tid_ and attribute of its cell.
+        self.engine.create_inferred_values(AuxTables.inf_values_dom.name, AuxTables.cell_domain.name,
+                                           AuxTables.inf_values_idx.name)
+        self.register_aux_table(AuxTables.inf_values_dom, index_attrs=['_tid_'])
         self.aux_table[AuxTables.inf_values_dom].create_db_index(self.engine, ['attribute'])
         status = "DONE collecting the inferred values."
-        toc = time.clock()
+        toc = time.time()
         total_time = toc - tic
         return status, total_time
 
     def get_repaired_dataset(self):
-        tic = time.clock()
-        init_records = self.raw_data.df.sort_values(['_tid_']).to_records(index=False)
-        t = self.aux_table[AuxTables.inf_values_dom]
-        repaired_vals = dictify_df(t.df.reset_index())
-        for tid in repaired_vals:
-            for attr in repaired_vals[tid]:
-                init_records[tid][attr] = repaired_vals[tid][attr]
-        repaired_df = pd.DataFrame.from_records(init_records)
+        """
+        get_repaired_dataset scatters the inferred values into the decoded
+        columns of the raw data (one vectorized assignment per attribute)
+        and bulk loads the result as table '<name>_repaired'.
+        """
+        tic = time.time()
+        encoded = self.get_encoded_data()
+        cells = self.aux_table[AuxTables.cell_domain].df.reset_index()[['_vid_', '_tid_', 'attribute']]
+        inferred = self.aux_table[AuxTables.inf_values_idx].df.reset_index()[['_vid_', 'inferred_val']]
+        inferred = inferred.merge(cells, on='_vid_')
+        inferred_rows = encoded.row_idxs(inferred['_tid_'].values)
+        inferred_attrs = inferred['attribute'].values
+        inferred_vals = inferred['inferred_val'].values
+        # Same tuple order as the original raw data sorted by _tid_.
+        order = np.argsort(encoded.tids, kind='mergesort')
+
+        columns = self.raw_data.get_columns()
+        repaired = {}
+        for col in columns:
+            if col == '_tid_':
+                repaired[col] = encoded.tids[order]
+            elif col in encoded.attr_to_idx:
+                # decode returns a new array so we can assign into it.
+                values = encoded.decode(col, encoded.column(col))
+                mask = inferred_attrs == col
+                values[inferred_rows[mask]] = inferred_vals[mask]
+                repaired[col] = values[order]
+            else:
+                # Excluded columns (e.g. the source column) are copied as is.
+                raw = self.raw_data.df
+                repaired[col] = pd.Series(raw[col].values, index=raw['_tid_'].values) \
+                    .reindex(encoded.tids[order]).values
+        repaired_df = pd.DataFrame(repaired, columns=columns)
         name = self.raw_data.name+'_repaired'
         self.repaired_data = Table(name, Source.DF, df=repaired_df)
-        self.repaired_data.store_to_db(self.engine.engine)
+        self.repaired_data.store_to_db(self.engine)
         status = "DONE generating repaired dataset"
-        toc = time.clock()
+        toc = time.time()
         total_time = toc - tic
         return status, total_time
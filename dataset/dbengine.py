@@ -1,87 +1,509 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import csv
 from functools import partial
+import hashlib
+import io
 import logging
-from multiprocessing import Pool
+import os
 from string import Template
+import threading
 import time
 
+import numpy as np
+import pandas as pd
 import psycopg2
 import sqlalchemy as sql
 
+from dcparser.sql import relaxed_queries, violation_query
+from .engine import Engine
+from .memengine import evaluate_relaxed
+from .querylog import QueryLog, estimate_bytes, explain_template
+from .scheduler import QueryScheduler
+from utils import NULL_REPR
+
 index_template = Template('CREATE INDEX $idx_title ON "$table" ($attrs)')
 drop_table_template = Template('DROP TABLE IF EXISTS "$table"')
-create_table_template = Template('CREATE TABLE "$table" AS ($stmt)')
+drop_column_template = Template('ALTER TABLE "$table" DROP COLUMN "$attr"')
+create_table_template = Template('CREATE $unlogged TABLE "$table" AS ($stmt)')
+copy_to_template = Template('COPY ($stmt) TO STDOUT WITH (FORMAT csv, HEADER true, NULL \'$null\')')
+copy_from_template = Template('COPY "$table" ($attrs) FROM STDIN WITH (FORMAT csv, NULL \'$null\')')
+table_exists_template = Template("SELECT to_regclass('\"$table\"') IS NOT NULL")
+set_timeout_template = Template('SET LOCAL statement_timeout TO $timeout')
+order_ops = ('<', '>', '<=', '>=')
+pos_values_template = Template('SELECT _vid_, _cid_, _tid_, attribute, a.rv_val, a.val_id '
+                               'FROM "$cell_domain", '
+                               'unnest(string_to_array(regexp_replace(domain,\'[{\"\"}]\',\'\',\'gi\'),\'|||\')) '
+                               'WITH ORDINALITY a(rv_val,val_id)$where')
+
+errors_template = Template('SELECT count(*) ' \
+                           'FROM  "$init_table" as t1, "$grdt_table" as t2 ' \
+                           'WHERE t1._tid_ = t2._tid_ ' \
+                           '  AND t2._attribute_ = \'$attr\' ' \
+                           '  AND t1."$attr" != t2._value_')
+
+"""
+The 'errors' aliased subquery returns the (_tid_, _attribute_, _value_)
+from the ground truth table for all cells that have an error in the original
+raw data.
+
+The 'repairs' aliased table contains the cells and values we've inferred.
+
+We then count the number of cells that we repaired to the correct ground
+truth value.
+"""
+correct_repairs_template = Template('SELECT COUNT(*) FROM '
+                                    '  (SELECT t2._tid_, t2._attribute_, t2._value_ '
+                                    '     FROM "$init_table" as t1, "$grdt_table" as t2 '
+                                    '    WHERE t1._tid_ = t2._tid_ '
+                                    '      AND t2._attribute_ = \'$attr\' '
+                                    '      AND t1."$attr" != t2._value_ ) as errors, $inf_dom as repairs '
+                                    'WHERE errors._tid_ = repairs._tid_ '
+                                    '  AND errors._attribute_ = repairs.attribute '
+                                    '  AND errors._value_ = repairs.rv_value')
 
+# Marker for NULL values in the CSV stream sent to COPY. An unquoted empty
+# field would otherwise be read back as NULL instead of an empty string.
+COPY_NULL_REPR = '\\N'
 
-class DBengine:
+
+class DBengine(Engine):
     """
     A wrapper class for postgresql engine.
     Maintains connections and executes queries.
     """
-    def __init__(self, user, pwd, db, host='localhost', port=5432, pool_size=20, timeout=60000):
+    def __init__(self, user, pwd, db, host='localhost', port=5432, pool_size=20, timeout=60000,
+                 unlogged=False, copy_chunksize=100000, explain=False, query_cost_budget=None,
+                 result_cache=None, range_joins_in_memory=False):
+        """
+        :param pool_size: (int) max # of queries executed concurrently by
+            :meth:`execute_queries` (and of pooled connections).
+        :param timeout: (int) statement_timeout in ms preset on the pooled
+            connections and used by :meth:`execute_queries_w_backup`.
+        :param unlogged: (bool) create tables as UNLOGGED (no WAL writes). Faster
+            to write but not crash-safe, which is fine for our auxiliary tables.
+        :param copy_chunksize: (int) # of rows serialized per COPY chunk in
+            :meth:`bulk_load_df`.
+        :param explain: (bool) capture the EXPLAIN (ANALYZE, BUFFERS) plans
+            of tagged queries in self.query_log.
+        :param query_cost_budget: (float) max planner cost of a query with a
+            backup before its backup is run up front (see QueryScheduler).
+        :param result_cache: (QueryResultCache) caches the results of
+            SELECT queries by query and table versions. Disabled if None.
+        :param range_joins_in_memory: (bool) count the violations of relaxed
+            constraints with <, >, <=, >= predicates between t1 and t2 in
+            memory (see relaxed_violations) instead of in Postgres.
+        """
+        super(DBengine, self).__init__(max_workers=max(1, pool_size))
         self.timeout = timeout
-        self._pool = Pool(pool_size) if pool_size > 1 else None
+        self.range_joins_in_memory = range_joins_in_memory
+        self.query_cost_budget = query_cost_budget
+        self.unlogged = unlogged
+        self.copy_chunksize = copy_chunksize
+        self.pool_size = max(1, pool_size)
+        # Created on first use (see _apply_func).
+        self._workers = None
         url = 'postgresql+psycopg2://{}:{}@{}:{}/{}?client_encoding=utf8'
         url = url.format(user, pwd, host, port, db)
         self.conn = url
         con = 'dbname={} user={} password={} host={} port={}'
         con = con.format(db, user, pwd, host, port)
         self.conn_args = con
+        self.conn_pool = ConnectionPool(con, self.pool_size, timeout)
+        # Wall time, rows, bytes and timeouts of every query (see QueryLog).
+        self.query_log = QueryLog(explain=explain)
+        self.result_cache = result_cache
         self.engine = sql.create_engine(url, client_encoding='utf8', pool_size=pool_size)
 
-    def execute_queries(self, queries):
+    def execute_queries(self, queries, timeout=0, tag=None):
         """
-        Executes :param queries: in parallel.
+        Executes :param queries: in parallel over pooled connections.
 
         :param queries: (list[str]) list of SQL queries to be executed
+        :param timeout: (int) statement_timeout in ms for every query
+            (0 disables the timeout).
+        :param tag: (str) caller recorded with the queries in self.query_log.
         """
         logging.debug('Preparing to execute %d queries.', len(queries))
-        tic = time.clock()
-        results = self._apply_func(partial(_execute_query, conn_args=self.conn_args), [(idx, q) for idx, q in enumerate(queries)])
-        toc = time.clock()
+        tic = time.time()
+        results = self._apply_func(partial(_execute_query, conn_pool=self.conn_pool, timeout=timeout,
+                                           query_log=self.query_log, tag=tag, result_cache=self.result_cache),
+                                   [(idx, q) for idx, q in enumerate(queries)])
+        toc = time.time()
         logging.debug('Time to execute %d queries: %.2f secs', len(queries), toc-tic)
+        self._log_pool_stats()
         return results
 
-    def execute_queries_w_backup(self, queries):
+    def execute_queries_w_backup(self, queries, timeout=None, tag=None):
         """
         Executes :param queries: that have backups in parallel. Used in featurization.
 
-        :param queries: (list[str]) list of SQL queries to be executed
+        :param queries: (list[(str, str)]) list of (query, backup query).
+            The backup query is executed (without timeout) if the query
+            times out or if the query is None.
+        :param timeout: (int) statement_timeout in ms of the queries.
+            Defaults to self.timeout.
+        :param tag: (str) caller recorded with the queries in self.query_log.
         """
         logging.debug('Preparing to execute %d queries.', len(queries))
-        tic = time.clock()
+        tic = time.time()
         results = self._apply_func(
-            partial(_execute_query_w_backup, conn_args=self.conn_args, timeout=self.timeout),
+            partial(_execute_query_w_backup, conn_pool=self.conn_pool, timeout=timeout,
+                    query_log=self.query_log, tag=tag, result_cache=self.result_cache),
             [(idx, q) for idx, q in enumerate(queries)])
-        toc = time.clock()
+        toc = time.time()
         logging.debug('Time to execute %d queries: %.2f secs', len(queries), toc-tic)
+        self._log_pool_stats()
         return results
 
-    def execute_query(self, query):
+    def iter_queries(self, queries, backup=False, timeout=None, tag=None):
+        """
+        iter_queries executes :param queries: with at most self.pool_size
+        queries in flight and yields (idx, result) as soon as each query
+        completes, i.e. in completion order and not in the order of
+        :param queries:. This lets callers process results while the
+        slower queries are still running.
+
+        :param queries: (list[str]) or, with :param backup:, list of
+            (query, backup query) as in :meth:`execute_queries_w_backup`.
+        :param backup: (bool) run the backup query of a query that times out.
+        :param timeout: (int) statement_timeout in ms. Defaults to no timeout
+            (or self.timeout with :param backup:).
+        :param tag: (str) caller recorded with the queries in self.query_log.
+        """
+        loop = asyncio.new_event_loop()
+        results = self.aexecute_queries(queries, backup=backup, timeout=timeout, tag=tag)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.close()
+            self._log_pool_stats()
+
+    async def aexecute_queries(self, queries, backup=False, timeout=None, tag=None):
+        """
+        aexecute_queries is the asynchronous generator behind
+        :meth:`iter_queries` for callers that run their own event loop.
+        """
+        if backup:
+            func = partial(_execute_query_w_backup, conn_pool=self.conn_pool, timeout=timeout,
+                           query_log=self.query_log, tag=tag, result_cache=self.result_cache)
+        else:
+            func = partial(_execute_query, conn_pool=self.conn_pool, timeout=timeout or 0,
+                           query_log=self.query_log, tag=tag, result_cache=self.result_cache)
+        loop = asyncio.get_event_loop()
+        workers = self._get_workers()
+        semaphore = asyncio.Semaphore(self.pool_size)
+
+        async def run(args):
+            async with semaphore:
+                res = await loop.run_in_executor(workers, func, args)
+            return args[0], res
+
+        tasks = [loop.create_task(run((idx, q))) for idx, q in enumerate(queries)]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            # Only reached early if the caller stops consuming or a query
+            # failed: do not start the queries that are still waiting.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def pool_stats(self):
+        """
+        pool_stats returns the occupancy and wait time statistics of the
+        connection pool (see ConnectionPool.stats).
+        """
+        return self.conn_pool.stats()
+
+    def _log_pool_stats(self):
+        stats = self.conn_pool.stats()
+        logging.debug('Connection pool: %d/%d connections open, max %d in use, %d acquisitions, '
+                      'total wait %.2f secs, max wait %.2f secs',
+                      stats['open'], stats['max_size'], stats['max_in_use'], stats['acquisitions'],
+                      stats['total_wait'], stats['max_wait'])
+
+    def close(self):
+        """
+        close shuts down the worker threads and closes all pooled connections.
+        """
+        self.shutdown_task_executor()
+        if self._workers is not None:
+            self._workers.shutdown()
+            self._workers = None
+        self.conn_pool.close()
+        self.engine.dispose()
+
+    def execute_query(self, query, tag=None):
         """
         Executes a single :param query: using current connection.
 
         :param query: (str) SQL query to be executed
+        :param tag: (str) caller recorded with the query in self.query_log.
         """
-        tic = time.clock()
+        key = _cache_key(self.result_cache, query)
+        if key is not None:
+            result = self.result_cache.load(key)
+            if result is not None:
+                return result
+        tic = time.time()
         conn = self.engine.connect()
-        result = conn.execute(query).fetchall()
-        conn.close()
-        toc = time.clock()
+        try:
+            result = conn.execute(query).fetchall()
+            toc = time.time()
+            plan = None
+            if self.query_log.explain and tag is not None:
+                plan = '\n'.join(row[0] for row in conn.execute(explain_template.format(query)).fetchall())
+        finally:
+            conn.close()
+        self.query_log.record(query, toc - tic, rows=len(result), nbytes=estimate_bytes(result), tag=tag, plan=plan)
         logging.debug('Time to execute query: %.2f secs', toc-tic)
+        if key is not None:
+            self.result_cache.store(key, [tuple(row) for row in result])
         return result
 
+    def execute_update(self, stmt):
+        """
+        Executes a single :param stmt: that does not return rows (e.g. DDL).
+
+        :param stmt: (str) SQL statement to be executed
+        :return: (int) # of rows affected (-1 if unknown).
+        """
+        tic = time.time()
+        conn = self.engine.connect()
+        rowcount = conn.execute(stmt).rowcount
+        conn.close()
+        toc = time.time()
+        logging.debug('Time to execute statement: %.2f secs', toc-tic)
+        if self.result_cache is not None:
+            # We do not know how the statement changed the tables it
+            # references: never hit their cached results again.
+            for table, _ in self.result_cache.referenced_tables(stmt):
+                self.result_cache.set_version(table, None)
+        return rowcount
+
+    def drop_columns(self, table, attrs):
+        """
+        drop_columns drops the columns :param attrs: of :param table:.
+        """
+        version = None
+        if self.result_cache is not None:
+            version = self.result_cache.derived_version(table, 'drop_columns', tuple(attrs))
+        for attr in attrs:
+            self.execute_update(drop_column_template.substitute(table=table, attr=attr))
+        if self.result_cache is not None:
+            self.result_cache.set_version(table, version)
+
     def create_db_table_from_query(self, name, query):
-        tic = time.clock()
+        """
+        create_db_table_from_query (re-)creates the table :param name: from
+        the result of :param query:.
+
+        :return: (int) # of rows in the created table.
+        """
+        tic = time.time()
         drop = drop_table_template.substitute(table=name)
-        create = create_table_template.substitute(table=name, stmt=query)
+        create = create_table_template.substitute(unlogged=self._unlogged_kw(), table=name, stmt=query)
         conn = self.engine.connect()
         conn.execute(drop)
-        conn.execute(create)
+        row_count = conn.execute(create).rowcount
         conn.close()
-        toc = time.clock()
-        logging.debug('Time to create table: %.2f secs', toc-tic)
+        toc = time.time()
+        self.query_log.record(create, toc - tic, rows=row_count)
+        if self.result_cache is not None:
+            # Same query over the same versions of its tables: same table.
+            self.result_cache.set_version(name, self.result_cache.query_version(query))
+        logging.debug('Time to create table with %d rows: %.2f secs', row_count, toc-tic)
+        return row_count
+
+    def iter_query(self, query, chunksize):
+        """
+        iter_query yields the result of :param query: as DataFrames of at
+        most :param chunksize: rows. Rows are streamed with a server-side
+        cursor so the result is never held in memory at once.
+        """
+        conn = self.engine.connect().execution_options(stream_results=True)
+        try:
+            for chunk in pd.read_sql_query(query, conn, chunksize=chunksize):
+                yield chunk
+        finally:
+            conn.close()
+
+    def fetch_columns(self, query, dtypes=None, tag=None):
+        """
+        fetch_columns returns the result of :param query: as a dict
+        { column -> numpy.ndarray }. The result is transferred with
+        COPY (query) TO STDOUT and parsed column-wise so rows never become
+        Python tuples (see iter_columns).
+
+        :param dtypes: (dict { column -> dtype }) dtypes of numeric columns.
+            All other columns are returned as object arrays of strings with
+            NULLs as NaN.
+        :param tag: (str) caller recorded with the query in self.query_log.
+        """
+        dtypes = dtypes or {}
+        tic = time.time()
+        chunks = {}
+        for chunk in self.iter_columns(query, chunksize=self.copy_chunksize, dtypes=dtypes, tag=tag):
+            for name, col in chunk.items():
+                chunks.setdefault(name, []).append(col)
+        columns = {name: np.concatenate(cols) for name, cols in chunks.items()}
+        logging.debug('Time to fetch %d rows: %.2f secs',
+                      len(next(iter(columns.values()))) if columns else 0, time.time() - tic)
+        return columns
+
+    def iter_columns(self, query, chunksize=100000, dtypes=None, tag=None):
+        """
+        iter_columns yields the result of :param query: as dicts
+        { column -> numpy.ndarray } of at most :param chunksize: rows.
+
+        The result is streamed with COPY (query) TO STDOUT from a background
+        thread into a pipe and parsed with pandas one chunk at a time, so
+        neither the rows (as Python tuples) nor the whole CSV output are
+        held in memory at once.
+
+        :param dtypes: (dict { column -> dtype }) dtypes of numeric columns.
+            All other columns are returned as object arrays of strings with
+            NULLs as NaN.
+        :param tag: (str) caller recorded with the query in self.query_log.
+            The recorded wall time excludes the time the caller spends on
+            the chunks.
+        """
+        dtypes = dtypes or {}
+        read_fd, write_fd = os.pipe()
+        reader = os.fdopen(read_fd, 'rb')
+        writer = _CountingWriter(os.fdopen(write_fd, 'wb'))
+        conn = self.engine.raw_connection()
+        errors = []
+
+        def copy():
+            try:
+                cur = conn.cursor()
+                cur.copy_expert(copy_to_template.substitute(stmt=query, null=COPY_NULL_REPR), writer)
+                conn.commit()
+            except Exception as e:
+                errors.append(e)
+            try:
+                # Flushes the rest of the output (fails if the reader is gone).
+                writer.close()
+            except OSError as e:
+                errors.append(e)
+
+        fetch_time, total_rows = 0.0, 0
+        thread = threading.Thread(target=copy, daemon=True)
+        tic = time.time()
+        thread.start()
+        try:
+            header = reader.readline()
+            if not header:
+                raise Exception("ERROR no result for query {}".format(query))
+            names = next(csv.reader([header.decode('utf-8')]))
+            chunks = pd.read_csv(reader, header=None, names=names, chunksize=chunksize, encoding='utf-8',
+                                 dtype={name: dtypes.get(name, object) for name in names},
+                                 keep_default_na=False, na_values=[COPY_NULL_REPR])
+            for df in chunks:
+                if df.empty:
+                    continue
+                fetch_time += time.time() - tic
+                total_rows += df.shape[0]
+                yield {name: np.asarray(df[name].values, dtype=dtypes.get(name, object)) for name in names}
+                tic = time.time()
+            fetch_time += time.time() - tic
+        except Exception:
+            thread.join()
+            # Parsing fails on a missing or truncated output: report the
+            # error of the COPY instead.
+            if errors:
+                raise errors[0]
+            raise
+        finally:
+            # Closing the pipe early (the caller stopped consuming) makes
+            # the COPY fail: do not return that connection to the pool.
+            reader.close()
+            thread.join()
+            if errors:
+                conn.invalidate()
+            conn.close()
+        if errors:
+            raise errors[0]
+        self.query_log.record(query, fetch_time, rows=total_rows, nbytes=writer.nbytes, tag=tag)
+
+    def bulk_load_df(self, name, df, if_exists='replace', unlogged=None):
+        """
+        bulk_load_df streams :param df: into the Postgres table :param name:
+        with COPY FROM STDIN instead of row-wise INSERTs. The frame is
+        serialized as CSV in chunks of self.copy_chunksize rows so we never
+        hold more than one chunk of text in memory.
+
+        Indexes are not created here: callers create them after the load
+        (see Table.create_db_index) which is much cheaper than maintaining
+        them during the COPY.
+
+        :param name: (str) name of table
+        :param df: (pandas.DataFrame) data to store
+        :param if_exists: (str) 'replace' drops and re-creates the table,
+            'append' adds rows to the table (creating it if necessary).
+        :param unlogged: (bool) create the table UNLOGGED. Defaults to self.unlogged.
+        """
+        if if_exists not in ('replace', 'append'):
+            raise ValueError("bulk_load_df only supports if_exists='replace' or 'append', got {}".format(if_exists))
+        if unlogged is None:
+            unlogged = self.unlogged
+        # Hash of the loaded rows: the version of the table in self.result_cache.
+        digest = hashlib.sha1(repr(list(df.columns)).encode('utf-8'))
+        tic = time.time()
+        conn = self.engine.raw_connection()
+        try:
+            cur = conn.cursor()
+            create = if_exists == 'replace'
+            if not create:
+                cur.execute(table_exists_template.substitute(table=name))
+                create = not cur.fetchone()[0]
+            if create:
+                cur.execute(drop_table_template.substitute(table=name))
+                cur.execute(self._create_table_stmt(name, df, unlogged))
+            elif self.result_cache is not None:
+                # Appending to a table without a version: start from a new one.
+                if self.result_cache.derived_version(name, 'append') is None:
+                    self.result_cache.set_version(name, None)
+                digest.update(self.result_cache.derived_version(name, 'append').encode('utf-8'))
+            copy = copy_from_template.substitute(table=name,
+                                                 attrs=','.join('"{}"'.format(attr) for attr in df.columns),
+                                                 null=COPY_NULL_REPR)
+            for start in range(0, df.shape[0], self.copy_chunksize):
+                buf = io.StringIO()
+                _to_copy_frame(df.iloc[start:start + self.copy_chunksize]).to_csv(
+                    buf, header=False, index=False, na_rep=COPY_NULL_REPR)
+                if self.result_cache is not None:
+                    digest.update(buf.getvalue().encode('utf-8'))
+                buf.seek(0)
+                cur.copy_expert(copy, buf)
+            conn.commit()
+        finally:
+            conn.close()
+        toc = time.time()
+        logging.debug('Time to bulk load %d rows into table %s: %.2f secs', df.shape[0], name, toc - tic)
+        if self.result_cache is not None:
+            self.result_cache.set_version(name, digest.hexdigest())
         return True
 
+    def _create_table_stmt(self, name, df, unlogged):
+        # Let pandas map the dtypes to Postgres types so the schema matches
+        # what DataFrame.to_sql would have created.
+        stmt = pd.io.sql.get_schema(df, name, con=self.engine)
+        if unlogged:
+            stmt = stmt.replace('CREATE TABLE', 'CREATE UNLOGGED TABLE', 1)
+        return stmt
+
+    def _unlogged_kw(self):
+        return 'UNLOGGED' if self.unlogged else ''
+
     def create_db_index(self, name, table, attr_list):
         """
         create_db_index creates a (multi-column) index on the columns/attributes
@@ -95,49 +517,469 @@ class DBengine:
         # We need to quote each attribute since Postgres auto-downcases unquoted column references
         quoted_attrs = map(lambda attr: '"{}"'.format(attr), attr_list)
         stmt = index_template.substitute(idx_title=name, table=table, attrs=','.join(quoted_attrs))
-        tic = time.clock()
+        tic = time.time()
         conn = self.engine.connect()
         result = conn.execute(stmt)
         conn.close()
-        toc = time.clock()
+        toc = time.time()
         logging.debug('Time to create index: %.2f secs', toc-tic)
         return result
 
+    def read_table(self, name, schema_name=None, order_by=None):
+        tic = time.time()
+        if order_by is None:
+            df = pd.read_sql_table(name, self.conn, schema=schema_name)
+        else:
+            query = 'SELECT * FROM {} ORDER BY "{}"'.format(_qualified_name(name, schema_name), order_by)
+            df = pd.read_sql_query(query, self.conn)
+        logging.debug('Time to read table %s from Postgres: %.2f secs', name, time.time() - tic)
+        return df
+
+    def iter_table(self, name, columns=None, order_by=None, chunksize=100000, schema_name=None):
+        attrs = '*' if columns is None else ', '.join('"{}"'.format(col) for col in columns)
+        query = 'SELECT {} FROM {}'.format(attrs, _qualified_name(name, schema_name))
+        if order_by is not None:
+            query += ' ORDER BY "{}"'.format(order_by)
+        for chunk in self.iter_query(query, chunksize):
+            yield chunk
+
+    def count_rows(self, name, schema_name=None):
+        query = 'SELECT count(*) FROM {}'.format(_qualified_name(name, schema_name))
+        return int(self.execute_query(query)[0][0])
+
+    def column_names(self, name, schema_name=None):
+        query = 'SELECT * FROM {} LIMIT 0'.format(_qualified_name(name, schema_name))
+        return list(pd.read_sql_query(query, self.conn).columns)
+
+    def read_columns(self, table, columns, order_by=None, dtypes=None, tag=None):
+        return self.fetch_columns(_columns_query(table, columns, order_by), dtypes=dtypes, tag=tag)
+
+    def iter_read_columns(self, table, columns, order_by=None, chunksize=100000, dtypes=None, tag=None):
+        for chunk in self.iter_columns(_columns_query(table, columns, order_by), chunksize=chunksize,
+                                       dtypes=dtypes, tag=tag):
+            yield chunk
+
+    def select_rows(self, table, columns, where, dtypes=None, tag=None):
+        query = 'SELECT {} FROM "{}" WHERE {}'.format(', '.join(columns), table, _any_conditions(where))
+        return self.fetch_columns(query, dtypes=dtypes, tag=tag)
+
+    def delete_rows(self, table, where):
+        self.execute_update('DELETE FROM "{}" WHERE {}'.format(table, _any_conditions(where)))
+
+    def distinct_values(self, table, column):
+        query = 'SELECT DISTINCT {} FROM {}'.format(column, table)
+        return [row[0] for row in self.execute_query(query)]
+
+    def count_and_max(self, table, column):
+        res = self.execute_query('SELECT count(*), max({}) FROM {}'.format(column, table))
+        return int(res[0][0]), res[0][1]
+
+    def create_pos_values(self, name, cell_domain, vids=None):
+        if vids is None:
+            return self.create_db_table_from_query(name, pos_values_template.substitute(cell_domain=cell_domain,
+                                                                                        where=''))
+        query = pos_values_template.substitute(cell_domain=cell_domain,
+                                               where=' WHERE {}'.format(_any_conditions({'_vid_': vids})))
+        return self.execute_update('INSERT INTO "{}" {}'.format(name, query))
+
+    def create_inferred_values(self, name, cell_domain, inf_values_idx):
+        query = "SELECT t1._tid_, t1.attribute, t2.inferred_val as rv_value " \
+                "FROM %s as t1, %s as t2 " \
+                "WHERE t1._vid_ = t2._vid_" % (cell_domain, inf_values_idx)
+        return self.create_db_table_from_query(name, query)
+
+    def weak_label_columns(self, cell_domain, dk_cells, not_set):
+        query = """
+        SELECT _vid_, weak_label_idx, fixed, (t2._cid_ IS NULL)::int AS clean
+        FROM {cell_domain} AS t1 LEFT JOIN {dk_cells} AS t2 ON t1._cid_ = t2._cid_
+        WHERE weak_label != '{null_repr}' AND (t2._cid_ is NULL OR t1.fixed != {cell_status})
+        """.format(cell_domain=cell_domain,
+                dk_cells=dk_cells,
+                null_repr=NULL_REPR,
+                cell_status=not_set)
+        return self.fetch_columns(query, dtypes={'_vid_': np.int64, 'weak_label_idx': np.int64,
+                                                 'fixed': np.int64, 'clean': np.int64},
+                                  tag='FeaturizedDataset')
+
+    def violations(self, dataset, constraints, tag=None):
+        queries = [violation_query(dataset.raw_data.name, c) for c in constraints]
+        # Yield the violations of each query as soon as it completes.
+        for idx, res in self.iter_queries(queries, tag=tag):
+            yield idx, np.array([row[0] for row in res], dtype=np.int64)
+
+    def relaxed_violations(self, dataset, pos_values, relaxations, tag=None):
+        """
+        relaxed_violations runs the relaxed queries (see
+        dcparser.sql.relaxed_queries) with the preset timeout: queries that
+        time out are replaced by their 0-1 backup query. The queries are
+        planned by a QueryScheduler (longest first, backups of queries
+        predicted to time out run up front).
+        """
+        # With range_joins_in_memory, relaxed constraints whose predicates
+        # between t1 and t2 are comparisons (e.g. only <, >) are counted in
+        # memory with the sort-based range join: Postgres runs them as
+        # nested loop joins. These are compared in code point order instead
+        # of the database collation and without the timeout.
+        range_joins = []
+        if self.range_joins_in_memory and any(_order_join(*relaxation) for relaxation in relaxations):
+            evaluator = dataset.get_constraint_evaluator()
+            range_joins = [idx for idx, (c, pred_idx, join_rel, rv_attr, op, rv_val) in enumerate(relaxations)
+                           if _order_join(c, pred_idx, join_rel, rv_attr, op, rv_val)
+                           and evaluator.relaxed_range_join(c, pred_idx, join_rel, rv_val)]
+        if range_joins:
+            pos_values_df = self.read_table(pos_values)
+            for idx in range_joins:
+                yield idx, evaluate_relaxed(evaluator, pos_values_df, relaxations[idx], self.query_log, tag)
+        in_sql = sorted(set(range(len(relaxations))) - set(range_joins))
+        queries = [relaxed_queries(dataset.raw_data.name, pos_values, *relaxations[idx]) for idx in in_sql]
+        scheduler = QueryScheduler(self, dataset.cache, dataset.get_encoded_data().fingerprint())
+        order, scheduled = scheduler.plan(queries)
+        for pos, violations in self.iter_queries(scheduled, backup=True, tag=tag):
+            yield in_sql[order[pos]], violations
+        scheduler.record(queries)
+
+    def count_repairs(self, cell_domain, inf_values_dom):
+        query = "SELECT count(*) FROM " \
+                "  (SELECT _vid_ " \
+                "     FROM {} as t1, {} as t2 " \
+                "    WHERE t1._tid_ = t2._tid_ " \
+                "      AND t1.attribute = t2.attribute " \
+                "      AND t1.init_value != t2.rv_value) AS t".format(cell_domain, inf_values_dom)
+        res = self.execute_query(query, tag='EvalEngine')
+        return float(res[0][0])
+
+    def count_repairs_grdt(self, cell_domain, inf_values_dom, clean):
+        query = """
+        SELECT
+            (t1.init_value = t3._value_) AS is_correct,
+            count(*)
+        FROM   {} as t1, {} as t2, {} as t3
+        WHERE  t1._tid_ = t2._tid_
+          AND  t1.attribute = t2.attribute
+          AND  t1.init_value != t2.rv_value
+          AND  t1._tid_ = t3._tid_
+          AND  t1.attribute = t3._attribute_
+        GROUP BY is_correct
+          """.format(cell_domain, inf_values_dom, clean)
+        res = self.execute_query(query, tag='EvalEngine')
+        # Since we do a GROUP BY we need to check which row of the result
+        # corresponds to the correct/incorrect counts.
+        counts = {bool(is_correct): float(count) for is_correct, count in res}
+        return counts.get(True, 0.0), counts.get(False, 0.0)
+
+    def count_errors(self, raw, clean, attrs):
+        queries = [errors_template.substitute(init_table=raw, grdt_table=clean, attr=attr) for attr in attrs]
+        return sum(float(res[0][0]) for _, res in self.iter_queries(queries, tag='EvalEngine'))
+
+    def count_detected_errors(self, cell_domain, clean, dk_cells):
+        query = "SELECT count(*) FROM " \
+                "  (SELECT _vid_ " \
+                "   FROM   %s as t1, %s as t2, %s as t3 " \
+                "   WHERE  t1._tid_ = t2._tid_ AND t1._cid_ = t3._cid_ " \
+                "     AND  t1.attribute = t2._attribute_ " \
+                "     AND  t1.init_value != t2._value_) AS t" \
+                % (cell_domain, clean, dk_cells)
+        res = self.execute_query(query, tag='EvalEngine')
+        return float(res[0][0])
+
+    def count_correct_repairs(self, raw, clean, inf_values_dom, attrs):
+        queries = [correct_repairs_template.substitute(init_table=raw, grdt_table=clean, attr=attr,
+                                                       inf_dom=inf_values_dom)
+                   for attr in attrs]
+        return sum(float(res[0][0]) for _, res in self.iter_queries(queries, tag='EvalEngine'))
+
+    def weak_label_stats(self, cell_domain, clean, dk_cells, inf_values_dom):
+        query = """
+        select
+            (t3._tid_ is NULL) as clean,
+            (t1.fixed) as status,
+            (t4._tid_ is NOT NULL) as inferred,
+            (t1.init_value = t2._value_) as init_eq_grdth,
+            (t1.init_value = t4.rv_value) as init_eq_infer,
+            (t1.weak_label = t1.init_value) as wl_eq_init,
+            (t1.weak_label = t2._value_) as wl_eq_grdth,
+            (t1.weak_label = t4.rv_value) as wl_eq_infer,
+            (t2._value_ = t4.rv_value) as infer_eq_grdth,
+            count(*) as count
+        from
+            {cell_domain} as t1,
+            {clean_data} as t2
+            left join {dk_cells} as t3 on t2._tid_ = t3._tid_ and t2._attribute_ = t3.attribute
+            left join {inf_values_dom} as t4 on t2._tid_ = t4._tid_ and t2._attribute_ = t4.attribute where t1._tid_ = t2._tid_ and t1.attribute = t2._attribute_
+        group by
+            clean,
+            status,
+            inferred,
+            init_eq_grdth,
+            init_eq_infer,
+            wl_eq_init,
+            wl_eq_grdth,
+            wl_eq_infer,
+            infer_eq_grdth
+        """.format(cell_domain=cell_domain,
+                clean_data=clean,
+                dk_cells=dk_cells,
+                inf_values_dom=inf_values_dom)
+        return self.execute_query(query, tag='EvalEngine')
+
     def _apply_func(self, func, collection):
-        if self._pool is None:
+        if self.pool_size <= 1 or len(collection) <= 1:
             return list(map(func, collection))
-        return self._pool.map(func, collection)
+        return list(self._get_workers().map(func, collection))
+
+    def _get_workers(self):
+        if self._workers is None:
+            # Threads suffice since the work is waiting on Postgres.
+            self._workers = ThreadPoolExecutor(self.pool_size)
+        return self._workers
+
+
+class ConnectionPool:
+    """
+    ConnectionPool is a thread-safe pool of long-lived psycopg2 connections.
+
+    Connections are opened on demand up to max_size with statement_timeout
+    preset to the default timeout. acquire blocks while all connections are
+    in use; the time spent waiting and the occupancy are reported by stats.
+    A released or discarded connection wakes up one waiting thread, which
+    then reuses it or opens a replacement.
+    """
+    def __init__(self, conn_args, max_size, timeout):
+        """
+        :param conn_args: (str) libpq connection string.
+        :param max_size: (int) max # of open connections.
+        :param timeout: (int) default statement_timeout in ms.
+        """
+        self.conn_args = conn_args
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._cond = threading.Condition()
+        self._open = 0
+        self._in_use = 0
+        self._max_in_use = 0
+        self._acquisitions = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _connect(self):
+        return psycopg2.connect(self.conn_args, options='-c statement_timeout={}'.format(self.timeout))
+
+    def acquire(self):
+        """
+        acquire returns an idle connection, opening a new one if fewer than
+        max_size are open and otherwise waiting for one to be released.
+        """
+        tic = time.time()
+        with self._cond:
+            while not self._idle and self._open >= self.max_size:
+                self._cond.wait()
+            # Reuse the most recently released connection.
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._open += 1
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+        wait = time.time() - tic
+        with self._cond:
+            self._in_use += 1
+            self._max_in_use = max(self._max_in_use, self._in_use)
+            self._acquisitions += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        release returns :param conn: to the pool. With :param discard: (e.g.
+        after a connection error) the connection is closed instead and a
+        waiting thread may open a replacement.
+        """
+        discard = discard or conn.closed
+        if discard and not conn.closed:
+            conn.close()
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._open -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def stats(self):
+        """
+        stats returns a dict with the # of open/in use connections, the max
+        # in use at once, the # of acquisitions and the total/max time in
+        seconds spent waiting for a connection.
+        """
+        with self._cond:
+            return {'max_size': self.max_size,
+                    'open': self._open,
+                    'in_use': self._in_use,
+                    'max_in_use': self._max_in_use,
+                    'acquisitions': self._acquisitions,
+                    'total_wait': self._total_wait,
+                    'max_wait': self._max_wait}
+
+    def close(self):
+        """
+        close closes the idle connections.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+
+class _CountingWriter:
+    """
+    _CountingWriter writes COPY output to :param raw: (a binary file) and
+    counts the bytes written.
+    """
+    def __init__(self, raw):
+        self.raw = raw
+        self.nbytes = 0
+
+    def write(self, data):
+        self.nbytes += len(data)
+        return self.raw.write(data)
+
+    def close(self):
+        self.raw.close()
+
+
+def _order_join(c, pred_idx, join_rel, rv_attr, op, rv_val):
+    """
+    _order_join returns whether the relaxed constraint (see
+    Engine.relaxed_violations) compares t1 and t2 with an order predicate
+    (<, >, <=, >=), either in its fixed predicates or in the relaxed one.
+    """
+    preds = c.predicates[:pred_idx] + c.predicates[(pred_idx+1):]
+    if any(pred.operation in order_ops and 't1' in pred.cnf_form and 't2' in pred.cnf_form for pred in preds):
+        return True
+    return op in order_ops and not isinstance(rv_val, str) and rv_val[0] != join_rel
+
+
+def _qualified_name(name, schema_name):
+    if schema_name is None:
+        return '"{}"'.format(name)
+    return '"{}"."{}"'.format(schema_name, name)
+
+
+def _any_conditions(where):
+    """
+    _any_conditions returns the SQL condition that every column of
+    :param where: (dict { column -> integer values }) has one of its values.
+    """
+    conditions = []
+    for column, values in where.items():
+        if len(values) == 0:
+            return 'FALSE'
+        conditions.append('"{}" IN ({})'.format(column, ', '.join(str(int(val)) for val in values)))
+    return ' AND '.join(conditions)
+
+
+def _columns_query(table, columns, order_by):
+    query = 'SELECT {} FROM {}'.format(', '.join(columns), table)
+    if order_by is not None:
+        query += ' ORDER BY {}'.format(order_by)
+    return query
+
+
+def _to_copy_frame(df):
+    """
+    _to_copy_frame converts list-valued (object) columns to Postgres array
+    literals e.g. ['0.1', 'a,b'] -> '{"0.1","a,b"}', the same arrays psycopg2
+    sends for lists when inserting through DataFrame.to_sql. A column is
+    list-valued if its first non-null value is a list or tuple.
+    """
+    list_cols = []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        first = df[col].first_valid_index()
+        if first is not None and isinstance(df[col].loc[first], (list, tuple)):
+            list_cols.append(col)
+    if not list_cols:
+        return df
+    df = df.copy()
+    for col in list_cols:
+        df[col] = df[col].map(lambda vals: _array_literal(vals) if isinstance(vals, (list, tuple)) else vals)
+    return df
+
+
+def _array_literal(vals):
+    """
+    _array_literal returns the Postgres array literal of :param vals: with
+    every element quoted and its backslashes and double quotes escaped, so
+    that commas, braces, whitespaces or the string 'NULL' are kept as is.
+    None elements are NULL.
+    """
+    elements = []
+    for val in vals:
+        if val is None:
+            elements.append('NULL')
+        else:
+            elements.append('"' + str(val).replace('\\', '\\\\').replace('"', '\\"') + '"')
+    return '{' + ','.join(elements) + '}'
 
 
-def _execute_query(args, conn_args):
+def _cache_key(result_cache, query):
+    return None if result_cache is None or not query else result_cache.key(query)
+
+
+def _execute_query(args, conn_pool, timeout=None, query_log=None, tag=None, result_cache=None):
     query_id = args[0]
     query = args[1]
+    key = _cache_key(result_cache, query)
+    if key is not None:
+        res = result_cache.load(key)
+        if res is not None:
+            logging.debug("Query with id %s answered from the result cache", query_id)
+            return res
     logging.debug("Starting to execute query %s with id %s", query, query_id)
-    tic = time.clock()
-    con = psycopg2.connect(conn_args)
-    cur = con.cursor()
-    cur.execute(query)
-    res = cur.fetchall()
-    con.close()
-    toc = time.clock()
+    tic = time.time()
+    res = _run_pooled(conn_pool, query, timeout, query_log=query_log, tag=tag)
+    toc = time.time()
     logging.debug('Time to execute query with id %d: %.2f secs', query_id, (toc - tic))
+    if key is not None:
+        result_cache.store(key, res)
     return res
 
 
-def _execute_query_w_backup(args, conn_args, timeout):
+def _execute_query_w_backup(args, conn_pool, timeout=None, query_log=None, tag=None, result_cache=None):
     query_id = args[0]
     query = args[1][0]
     query_backup = args[1][1]
+    # The query and its backup return the same rows.
+    key = _cache_key(result_cache, query or query_backup)
+    if key is not None:
+        res = result_cache.load(key)
+        if res is not None:
+            logging.debug("Query with id %s answered from the result cache", query_id)
+            return res
     logging.debug("Starting to execute query %s with id %s", query, query_id)
-    tic = time.clock()
-    con = psycopg2.connect(conn_args)
-    cur = con.cursor()
-    cur.execute("SET statement_timeout to %d;"%timeout)
+    tic = time.time()
     try:
-        cur.execute(query)
-        res = cur.fetchall()
+        if not query:
+            # The backup query was selected up front (see QueryScheduler).
+            logging.debug("Starting to execute backup query %s with id %s", query_backup, query_id)
+            res = _run_pooled(conn_pool, query_backup, 0, query_log=query_log, tag=tag, fallback=True)
+            if key is not None:
+                result_cache.store(key, res)
+            return res
+        res = _run_pooled(conn_pool, query, timeout, query_log=query_log, tag=tag)
     except psycopg2.extensions.QueryCanceledError as e:
-        logging.debug("Failed to execute query %s with id %s. Timeout reached.", query, query_id)
+        logging.warning("Query with id %s timed out after %.2f secs%s", query_id, time.time() - tic,
+                        ', running its backup query' if query_backup else '')
 
         # No backup query, simply return empty result
         if not query_backup:
@@ -145,12 +987,74 @@ def _execute_query_w_backup(args, conn_args, timeout):
             return []
 
         logging.debug("Starting to execute backup query %s with id %s", query_backup, query_id)
-        con.close()
-        con = psycopg2.connect(conn_args)
-        cur = con.cursor()
-        cur.execute(query_backup)
-        res = cur.fetchall()
-        con.close()
-    toc = time.clock()
+        res = _run_pooled(conn_pool, query_backup, 0, query_log=query_log, tag=tag, fallback=True)
+    toc = time.time()
     logging.debug('Time to execute query with id %d: %.2f secs', query_id, toc - tic)
+    if key is not None:
+        result_cache.store(key, res)
+    return res
+
+
+def _run_pooled(conn_pool, query, timeout=None, query_log=None, tag=None, fallback=False):
+    """
+    _run_pooled executes :param query: on a connection of :param conn_pool:
+    and returns all rows.
+
+    :param timeout: (int) statement_timeout in ms for this query only
+        (0 disables it). None keeps the timeout preset on the connection.
+    :param query_log: (QueryLog) records the query (with :param tag: and
+        :param fallback:, see QueryLog.record) if not None.
+    """
+    conn = conn_pool.acquire()
+    discard = False
+    tic = time.time()
+    try:
+        res = _fetch_all(conn, query, timeout, conn_pool.timeout)
+        wall_time = time.time() - tic
+        if query_log is not None:
+            plan = None
+            if query_log.explain and tag is not None:
+                plan = _explain(conn, query, timeout, conn_pool.timeout)
+            query_log.record(query, wall_time, rows=len(res), nbytes=estimate_bytes(res), tag=tag,
+                             fallback=fallback, plan=plan)
+        return res
+    except psycopg2.extensions.QueryCanceledError:
+        conn.rollback()
+        if query_log is not None:
+            query_log.record(query, time.time() - tic, tag=tag, timed_out=True, fallback=fallback)
+        raise
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # The connection may be broken: do not hand it out again.
+        discard = True
+        raise
+    except psycopg2.Error:
+        # e.g. a ProgrammingError of a bad query: the connection is fine
+        # once the failed transaction is rolled back.
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            discard = True
+        raise
+    finally:
+        conn_pool.release(conn, discard=discard)
+
+
+def _fetch_all(conn, query, timeout, default_timeout):
+    cur = conn.cursor()
+    if timeout is not None and timeout != default_timeout:
+        # SET LOCAL only lasts until the end of the transaction.
+        cur.execute(set_timeout_template.substitute(timeout=int(timeout)))
+    cur.execute(query)
+    res = cur.fetchall()
+    cur.close()
+    conn.commit()
     return res
+
+
+def _explain(conn, query, timeout, default_timeout):
+    try:
+        rows = _fetch_all(conn, explain_template.format(query), timeout, default_timeout)
+    except psycopg2.extensions.QueryCanceledError:
+        conn.rollback()
+        return None
+    return '\n'.join(row[0] for row in rows)
@@ -0,0 +1,289 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from utils import NULL_REPR, NULL_CODE
+
+
+class AttrDictionary:
+    """
+    AttrDictionary maps the values of a single attribute to integer codes.
+
+    Code NULL_CODE (0) is always NULL_REPR. Values of the initial data are
+    assigned codes 1..k in sorted order; values added later (e.g. appended
+    rows) are given the next free codes.
+    """
+    def __init__(self):
+        self.values = [NULL_REPR]
+        self.code_of = {NULL_REPR: NULL_CODE}
+        # Cached numpy copy of self.values for vectorized decoding.
+        self._values_arr = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self.code_of
+
+    def add(self, values):
+        """
+        add assigns codes to the values in :param values: that do not have
+        one yet (in the order given).
+        """
+        for val in values:
+            if val not in self.code_of:
+                self.code_of[val] = len(self.values)
+                self.values.append(val)
+                self._values_arr = None
+
+    def encode(self, values):
+        """
+        encode returns the int32 codes of :param values: (array-like of
+        strings), adding values that do not have a code yet.
+        """
+        labels, uniques = pd.factorize(np.asarray(values, dtype=object))
+        new_vals = [val for val in uniques if val not in self.code_of]
+        if len(self.values) == 1:
+            # First batch of values: assign codes in sorted order.
+            new_vals = sorted(new_vals)
+        self.add(new_vals)
+        lut = np.array([self.code_of[val] for val in uniques], dtype=np.int32)
+        return lut[labels]
+
+    def code(self, value, default=None):
+        """
+        code returns the code of :param value: or :param default: if the
+        value is not in the dictionary.
+        """
+        return self.code_of.get(value, default)
+
+    def decode(self, codes):
+        """
+        decode returns a numpy array (dtype object) with the values of
+        :param codes:.
+        """
+        if self._values_arr is None:
+            self._values_arr = np.array(self.values, dtype=object)
+        return self._values_arr[codes]
+
+
+class EncodedRow:
+    """
+    EncodedRow is a read-only view of a single tuple of an EncodedTable
+    that decodes values on access: row[attr] returns the (string) value.
+    """
+    __slots__ = ('_table', '_row_idx')
+
+    def __init__(self, table, row_idx):
+        self._table = table
+        self._row_idx = row_idx
+
+    def __getitem__(self, attr):
+        if attr == '_tid_':
+            return self._table.tids[self._row_idx]
+        attr_idx = self._table.attr_to_idx[attr]
+        return self._table.dicts[attr].values[self._table.codes[self._row_idx, attr_idx]]
+
+    def code(self, attr):
+        return self._table.codes[self._row_idx, self._table.attr_to_idx[attr]]
+
+
+class EncodedTable:
+    """
+    EncodedTable is the dictionary-encoded representation of the raw data:
+    an int32 matrix of codes with one row per tuple and one column per
+    attribute, together with one AttrDictionary per attribute.
+
+    It is the representation shared by statistics, domain generation,
+    estimators and featurizers instead of each building its own copy of
+    the raw DataFrame.
+    """
+    def __init__(self, attrs):
+        """
+        :param attrs: (list[str]) attributes (columns) to encode.
+        """
+        self.attrs = list(attrs)
+        self.attr_to_idx = {attr: idx for idx, attr in enumerate(self.attrs)}
+        self.dicts = {attr: AttrDictionary() for attr in self.attrs}
+        self.codes = np.zeros((0, len(self.attrs)), dtype=np.int32)
+        self.tids = np.zeros(0, dtype=np.int64)
+        self._tid_to_row = None
+        self._fingerprint = None
+        # attr -> (indptr, rows, # of rows indexed): the rows of code c are
+        # rows[indptr[c]:indptr[c + 1]] (see rows_with).
+        self._postings = {}
+
+    @classmethod
+    def from_df(cls, df, attrs):
+        """
+        from_df encodes the attributes :param attrs: of :param df: (which
+        must contain a _tid_ column and use NULL_REPR for NULLs).
+        """
+        table = cls(attrs)
+        table.append(df)
+        return table
+
+    @classmethod
+    def from_chunks(cls, chunks, attrs):
+        """
+        from_chunks encodes the attributes :param attrs: of the DataFrames
+        :param chunks: (see from_df) one at a time and concatenates their
+        codes once at the end.
+        """
+        table = cls(attrs)
+        codes, tids = [], []
+        for chunk in chunks:
+            codes.append(table._encode(chunk))
+            tids.append(chunk['_tid_'].values)
+        if codes:
+            table.codes = np.concatenate(codes)
+            table.tids = np.concatenate(tids)
+        return table
+
+    def append(self, df):
+        """
+        append encodes the rows of :param df: and appends them to the table.
+
+        :return: (numpy.ndarray) row indexes of the appended rows.
+        """
+        start = self.codes.shape[0]
+        codes = self._encode(df)
+        self.codes = np.concatenate([self.codes, codes]) if start else codes
+        tids = df['_tid_'].values
+        self.tids = np.concatenate([self.tids, tids]) if start else tids
+        self._tid_to_row = None
+        self._fingerprint = None
+        return np.arange(start, self.codes.shape[0])
+
+    def _encode(self, df):
+        """
+        _encode returns the code matrix of the rows of :param df:, adding
+        their new values to the dictionaries.
+        """
+        codes = np.empty((df.shape[0], len(self.attrs)), dtype=np.int32)
+        for idx, attr in enumerate(self.attrs):
+            col = df[attr]
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                # Already dictionary-encoded (e.g. read from Parquet/Arrow):
+                # only encode the categories and map the per-row codes.
+                lut = self.dicts[attr].encode(col.cat.categories.values)
+                codes[:, idx] = lut[col.cat.codes.values]
+            else:
+                codes[:, idx] = self.dicts[attr].encode(col.values)
+        return codes
+
+    def drop(self, attrs):
+        """
+        drop removes the attributes :param attrs: from the table.
+        """
+        keep = [idx for idx, attr in enumerate(self.attrs) if attr not in attrs]
+        self.codes = np.ascontiguousarray(self.codes[:, keep])
+        for attr in attrs:
+            del self.dicts[attr]
+            self._postings.pop(attr, None)
+        self.attrs = [self.attrs[idx] for idx in keep]
+        self.attr_to_idx = {attr: idx for idx, attr in enumerate(self.attrs)}
+        self._fingerprint = None
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.tids.nbytes
+
+    def fingerprint(self):
+        """
+        fingerprint returns a hash (hex digest) of the attributes, values and
+        tuples of the table: two tables have the same fingerprint iff they
+        encode the same data with the same codes.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            for attr in self.attrs:
+                digest.update(repr(attr).encode('utf-8'))
+                digest.update('\x00'.join(self.dicts[attr].values).encode('utf-8'))
+            digest.update(np.ascontiguousarray(self.codes).tobytes())
+            digest.update(np.asarray(self.tids).astype(np.int64).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def column(self, attr):
+        """
+        column returns the codes of :param attr: for every tuple.
+        """
+        return self.codes[:, self.attr_to_idx[attr]]
+
+    def rows_with(self, attr, codes):
+        """
+        rows_with returns the sorted row indexes of the tuples whose value of
+        :param attr: is one of the :param codes:.
+
+        The rows are looked up in an index of the rows of every code, built
+        on first use, so the cost depends on the # of matching rows plus the
+        rows appended since the index was built (which are scanned). The
+        index is rebuilt once those outnumber the indexed rows.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        column = self.column(attr)
+        postings = self._postings.get(attr)
+        if postings is None or len(self) - postings[2] > postings[2]:
+            counts = np.bincount(column, minlength=len(self.dicts[attr]))
+            postings = (np.concatenate([[0], np.cumsum(counts)]), np.argsort(column, kind='stable'), len(self))
+            self._postings[attr] = postings
+        indptr, rows, indexed = postings
+        known = codes[codes < len(indptr) - 1]
+        starts, lengths = indptr[known], indptr[known + 1] - indptr[known]
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        appended = indexed + np.flatnonzero(np.isin(column[indexed:], codes))
+        return np.unique(np.concatenate([rows[offsets], appended]))
+
+    def row_idx(self, tid):
+        """
+        row_idx returns the row index of the tuple with _tid_ :param tid:.
+        """
+        if self._tid_to_row is None:
+            if np.issubdtype(self.tids.dtype, np.integer) \
+                    and np.array_equal(self.tids, np.arange(len(self.tids))):
+                # _tid_'s are auto-incremented: tid == row index.
+                self._tid_to_row = False
+            else:
+                self._tid_to_row = {tid: idx for idx, tid in enumerate(self.tids)}
+        if self._tid_to_row is False:
+            return int(tid)
+        return self._tid_to_row[tid]
+
+    def row_idxs(self, tids):
+        """
+        row_idxs returns the row indexes of the tuples with _tid_'s
+        :param tids: (array-like).
+        """
+        if len(self.tids):
+            self.row_idx(self.tids[0])
+        if self._tid_to_row is False:
+            return np.asarray(tids).astype(np.int64)
+        return np.array([self._tid_to_row[tid] for tid in tids], dtype=np.int64)
+
+    def row(self, tid):
+        """
+        row returns an EncodedRow view of the tuple with _tid_ :param tid:.
+        """
+        return EncodedRow(self, self.row_idx(tid))
+
+    def rows(self):
+        """
+        rows iterates over EncodedRow views of all tuples in order.
+        """
+        for idx in range(len(self)):
+            yield EncodedRow(self, idx)
+
+    def encode(self, attr, value):
+        """
+        encode returns the code of :param value: for :param attr: or None if
+        the value never appears in :param attr:.
+        """
+        return self.dicts[attr].code(value)
+
+    def decode(self, attr, codes):
+        return self.dicts[attr].decode(codes)
@@ -0,0 +1,247 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Engine:
+    """
+    Engine is the interface of the execution engines that hold the raw data
+    and the auxiliary tables: DBengine (Postgres) and MemoryEngine (pandas
+    DataFrames). Dataset and the pipeline stages only use the operations
+    below, so a new operation is implemented once per engine instead of
+    every stage branching on the engine.
+
+    Tables are referred to by name. Every engine also has a query_log
+    (QueryLog) with the wall time of its operations.
+    """
+    def __init__(self, max_workers=None):
+        """
+        :param max_workers: (int) # of threads of task_executor (None for
+            the ThreadPoolExecutor default).
+        """
+        self.max_workers = max_workers
+        # Created on first use (see task_executor).
+        self._task_executor = None
+
+    def task_executor(self):
+        """
+        task_executor returns the ThreadPoolExecutor shared by the stages to
+        run their own tasks concurrently (e.g. the error detectors). It is
+        not used to run queries, so its tasks may wait on queries.
+        """
+        if self._task_executor is None:
+            self._task_executor = ThreadPoolExecutor(self.max_workers)
+        return self._task_executor
+
+    def shutdown_task_executor(self):
+        if self._task_executor is not None:
+            self._task_executor.shutdown()
+            self._task_executor = None
+
+    # Tables.
+
+    def bulk_load_df(self, name, df, if_exists='replace'):
+        """
+        bulk_load_df stores :param df: as the table :param name:.
+
+        :param if_exists: (str) 'replace' replaces the table, 'append' adds
+            the rows of :param df: to the table (creating it if necessary).
+        """
+        raise NotImplementedError
+
+    def drop_columns(self, table, attrs):
+        """
+        drop_columns drops the columns :param attrs: of :param table:.
+        """
+        raise NotImplementedError
+
+    def create_db_index(self, name, table, attr_list):
+        """
+        create_db_index creates the index :param name: on the columns
+        :param attr_list: of :param table:.
+        """
+        raise NotImplementedError
+
+    def create_db_table_from_query(self, name, query):
+        """
+        create_db_table_from_query creates the table :param name: with the
+        result of the SQL :param query: and returns its # of rows.
+        """
+        raise NotImplementedError
+
+    def read_table(self, name, schema_name=None, order_by=None):
+        """
+        read_table returns the table :param name: as a DataFrame, with the
+        rows ordered by the column :param order_by: (if not None).
+        """
+        raise NotImplementedError
+
+    def iter_table(self, name, columns=None, order_by=None, chunksize=100000, schema_name=None):
+        """
+        iter_table yields the rows (of the :param columns:, all if None) of
+        the table :param name: as DataFrames of at most :param chunksize:
+        rows.
+        """
+        raise NotImplementedError
+
+    def count_rows(self, name, schema_name=None):
+        raise NotImplementedError
+
+    def column_names(self, name, schema_name=None):
+        raise NotImplementedError
+
+    def read_columns(self, table, columns, order_by=None, dtypes=None, tag=None):
+        """
+        read_columns returns the :param columns: of :param table: as a dict
+        { column -> numpy.ndarray }.
+
+        :param order_by: (str) column to sort the rows by.
+        :param dtypes: (dict { column -> dtype }) dtypes of numeric columns,
+            other columns are object arrays.
+        :param tag: (str) caller recorded in the query log.
+        """
+        raise NotImplementedError
+
+    def iter_read_columns(self, table, columns, order_by=None, chunksize=100000, dtypes=None, tag=None):
+        """
+        iter_read_columns yields the columns of :param table: (see
+        read_columns) in chunks of at most :param chunksize: rows.
+        """
+        raise NotImplementedError
+
+    def select_rows(self, table, columns, where, dtypes=None, tag=None):
+        """
+        select_rows returns the :param columns: (see read_columns) of the
+        rows of :param table: where every (integer) column of :param where:
+        (dict { column -> values }) has one of its values.
+        """
+        raise NotImplementedError
+
+    def delete_rows(self, table, where):
+        """
+        delete_rows deletes the rows of :param table: selected by
+        :param where: (see select_rows).
+        """
+        raise NotImplementedError
+
+    # Aggregates of the auxiliary tables.
+
+    def distinct_values(self, table, column):
+        """
+        distinct_values returns the list of distinct values of :param column:
+        of :param table:.
+        """
+        raise NotImplementedError
+
+    def count_and_max(self, table, column):
+        """
+        count_and_max returns the # of rows of :param table: and the max of
+        its :param column:.
+        """
+        raise NotImplementedError
+
+    # Domain and inference tables.
+
+    def create_pos_values(self, name, cell_domain, vids=None):
+        """
+        create_pos_values creates the table :param name: ('pos_values') with
+        one row (_vid_, _cid_, _tid_, attribute, rv_val, val_id) per value
+        rv_val of the ||| separated domain of every cell of the table
+        :param cell_domain:, val_id being its 1-based position in the domain.
+        With :param vids: (int array) the rows of the cells with these
+        _vid_'s only are appended to the existing table :param name:
+        instead. It returns the # of rows created/appended.
+        """
+        raise NotImplementedError
+
+    def create_inferred_values(self, name, cell_domain, inf_values_idx):
+        """
+        create_inferred_values creates the table :param name:
+        ('inf_values_dom') of the (_tid_, attribute, rv_value) of the
+        inferred value (in :param inf_values_idx:) of every cell of
+        :param cell_domain: and returns its # of rows.
+        """
+        raise NotImplementedError
+
+    def weak_label_columns(self, cell_domain, dk_cells, not_set):
+        """
+        weak_label_columns returns the columns _vid_, weak_label_idx, fixed
+        and clean (1 for cells not in :param dk_cells:) of the cells of
+        :param cell_domain: to train on: cells with a weak label that are
+        clean or whose status (fixed) is not :param not_set:.
+        """
+        raise NotImplementedError
+
+    # Denial constraints.
+
+    def violations(self, dataset, constraints, tag=None):
+        """
+        violations yields (index in :param constraints:, int64 array of the
+        _tid_'s of the tuples t1 that violate the constraint) over the raw
+        data of :param dataset: (Dataset), in any order.
+        """
+        raise NotImplementedError
+
+    def relaxed_violations(self, dataset, pos_values, relaxations, tag=None):
+        """
+        relaxed_violations yields (index in :param relaxations:, rows of
+        (_vid_, val_id, # of violations)) of every relaxed constraint (see
+        ConstraintFeaturizer.generate_relaxed_predicates) over the raw data
+        of :param dataset: and the domain values in the table
+        :param pos_values:, in any order. Engines with a timeout may return
+        a 0-1 violation indicator instead of the # of violations.
+        """
+        raise NotImplementedError
+
+    # Evaluation against the ground truth table (_tid_, _attribute_, _value_).
+
+    def count_repairs(self, cell_domain, inf_values_dom):
+        """
+        count_repairs returns the # of cells whose inferred value is not
+        their initial value.
+        """
+        raise NotImplementedError
+
+    def count_repairs_grdt(self, cell_domain, inf_values_dom, clean):
+        """
+        count_repairs_grdt returns the # of repairs (see count_repairs) of
+        cells in the ground truth :param clean: whose initial value is
+        correct and incorrect.
+
+        :return: (# correct, # incorrect)
+        """
+        raise NotImplementedError
+
+    def count_errors(self, raw, clean, attrs):
+        """
+        count_errors returns the # of cells of the attributes :param attrs:
+        of :param raw: whose value differs from the ground truth.
+        """
+        raise NotImplementedError
+
+    def count_detected_errors(self, cell_domain, clean, dk_cells):
+        """
+        count_detected_errors returns the # of cells in :param dk_cells:
+        whose initial value differs from the ground truth.
+        """
+        raise NotImplementedError
+
+    def count_correct_repairs(self, raw, clean, inf_values_dom, attrs):
+        """
+        count_correct_repairs returns the # of cells with a wrong value in
+        :param raw: whose inferred value is the ground truth.
+        """
+        raise NotImplementedError
+
+    def weak_label_stats(self, cell_domain, clean, dk_cells, inf_values_dom):
+        """
+        weak_label_stats returns the rows (clean, status, inferred,
+        init = grdth, init = inferred, w. label = init, w. label = grdth,
+        w. label = inferred, infer = grdth, count) of the # of cells in the
+        ground truth for every combination of these flags.
+        """
+        raise NotImplementedError
+
+    def pool_stats(self):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
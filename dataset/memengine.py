@@ -0,0 +1,270 @@
+import itertools
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from .engine import Engine
+from .querylog import QueryLog
+from utils import NULL_REPR
+
+
+def evaluate_relaxed(evaluator, pos_values, relaxation, query_log, tag=None):
+    """
+    evaluate_relaxed returns the rows (_vid_, val_id, violations) of the
+    relaxed constraint :param relaxation: (see
+    ConstraintFeaturizer.generate_relaxed_predicates) computed with
+    :param evaluator: (ConstraintEvaluator) over the DataFrame
+    :param pos_values: and records it in :param query_log:.
+    """
+    c, pred_idx, join_rel, rv_attr, op, rv_val = relaxation
+    tic = time.time()
+    vids, val_ids, violations = evaluator.relaxed_violations(c, pred_idx, join_rel, rv_attr, op, rv_val, pos_values)
+    query_log.record('{} relaxed on {}'.format(c.cnf_form, c.predicates[pred_idx].cnf_form),
+                     time.time() - tic, rows=len(vids), tag=tag)
+    return np.column_stack([vids, val_ids, violations])
+
+
+class MemoryEngine(Engine):
+    """
+    An in-process replacement of DBengine that keeps every table as a
+    pandas DataFrame instead of a Postgres table.
+
+    It implements the operations of Engine with pandas/NumPy (and
+    ConstraintEvaluator for the denial constraints) but cannot run SQL
+    queries. There is no timeout so the violations of the relaxed
+    constraints are always counted (no 0-1 fallback).
+
+    The operations are recorded in self.query_log so the query report
+    covers both engines.
+    """
+
+    def __init__(self, max_workers=None):
+        super(MemoryEngine, self).__init__(max_workers=max_workers)
+        self.tables = {}
+        self.query_log = QueryLog(explain=False)
+
+    def bulk_load_df(self, name, df, if_exists='replace', unlogged=None):
+        if if_exists not in ('replace', 'append'):
+            raise ValueError("bulk_load_df only supports if_exists='replace' or 'append', got {}".format(if_exists))
+        # A shallow copy so that setting an index on the caller's frame
+        # (see Table.create_df_index) does not change the stored table.
+        df = df.copy(deep=False)
+        if if_exists == 'append' and name in self.tables:
+            df = pd.concat([self.tables[name], df[self.tables[name].columns]], ignore_index=True)
+        self.tables[name] = df
+        logging.debug('Stored %d rows in in-memory table %s', df.shape[0], name)
+        return True
+
+    def get_table(self, name):
+        """
+        get_table returns the DataFrame of the table :param name:.
+        """
+        if name not in self.tables:
+            raise Exception("ERROR table {} does not exist in the in-memory engine.".format(name))
+        return self.tables[name]
+
+    def drop_columns(self, table, attrs):
+        if attrs:
+            self.tables[table] = self.tables[table].drop(columns=attrs)
+
+    def create_db_index(self, name, table, attr_list):
+        """
+        create_db_index is a no-op: lookups on in-memory tables are hash
+        joins that do not need an index.
+        """
+        return None
+
+    def create_db_table_from_query(self, name, query):
+        raise Exception("ERROR the in-memory engine cannot run SQL queries: cannot create table {}.".format(name))
+
+    def read_table(self, name, schema_name=None, order_by=None):
+        df = self.get_table(name)
+        if order_by is not None:
+            df = df.sort_values(order_by, kind='mergesort')
+        return df.copy(deep=False)
+
+    def iter_table(self, name, columns=None, order_by=None, chunksize=100000, schema_name=None):
+        df = self.read_table(name, order_by=order_by)
+        if columns is not None:
+            df = df[columns]
+        for start in range(0, df.shape[0], chunksize):
+            yield df.iloc[start:start + chunksize]
+
+    def count_rows(self, name, schema_name=None):
+        return int(self.get_table(name).shape[0])
+
+    def column_names(self, name, schema_name=None):
+        return list(self.get_table(name).columns)
+
+    def read_columns(self, table, columns, order_by=None, dtypes=None, tag=None):
+        return _df_columns(self.read_table(table, order_by=order_by)[columns], dtypes)
+
+    def iter_read_columns(self, table, columns, order_by=None, chunksize=100000, dtypes=None, tag=None):
+        for chunk in self.iter_table(table, columns=columns, order_by=order_by, chunksize=chunksize):
+            yield _df_columns(chunk, dtypes)
+
+    def select_rows(self, table, columns, where, dtypes=None, tag=None):
+        df = self.get_table(table)
+        return _df_columns(df.loc[_where_mask(df, where), columns], dtypes)
+
+    def delete_rows(self, table, where):
+        df = self.get_table(table)
+        self.tables[table] = df[~_where_mask(df, where)].reset_index(drop=True)
+
+    def distinct_values(self, table, column):
+        return list(self.get_table(table)[column].unique())
+
+    def count_and_max(self, table, column):
+        values = self.get_table(table)[column]
+        return int(values.shape[0]), values.max()
+
+    def create_pos_values(self, name, cell_domain, vids=None):
+        """
+        create_pos_values splits the domains with pandas instead of
+        unnesting them in Postgres.
+        """
+        domain = self.get_table(cell_domain)[['_vid_', '_cid_', '_tid_', 'attribute', 'domain']]
+        if vids is not None:
+            domain = domain[_where_mask(domain, {'_vid_': vids})]
+        values = [dom.split('|||') for dom in domain['domain'].str.replace('[{"}]', '', regex=True)]
+        sizes = np.array([len(vals) for vals in values], dtype=np.int64)
+        pos_values = domain.drop(columns=['domain']).iloc[np.repeat(np.arange(domain.shape[0]), sizes)]
+        pos_values = pos_values.reset_index(drop=True)
+        pos_values['rv_val'] = list(itertools.chain.from_iterable(values))
+        # val_id restarts at 1 for every cell.
+        starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        pos_values['val_id'] = np.arange(pos_values.shape[0]) - starts + 1
+        self.bulk_load_df(name, pos_values, if_exists='replace' if vids is None else 'append')
+        return int(pos_values.shape[0])
+
+    def create_inferred_values(self, name, cell_domain, inf_values_idx):
+        cells = self.get_table(cell_domain)[['_vid_', '_tid_', 'attribute']]
+        inferred = self.get_table(inf_values_idx)[['_vid_', 'inferred_val']]
+        inf_values_dom = cells.merge(inferred, on='_vid_')[['_tid_', 'attribute', 'inferred_val']] \
+            .rename(columns={'inferred_val': 'rv_value'})
+        self.bulk_load_df(name, inf_values_dom)
+        return int(inf_values_dom.shape[0])
+
+    def weak_label_columns(self, cell_domain, dk_cells, not_set):
+        cells = self.get_table(cell_domain)
+        clean = ~cells['_cid_'].isin(self.get_table(dk_cells)['_cid_']).values
+        keep = (cells['weak_label'].values != NULL_REPR) & (clean | (cells['fixed'].values != not_set))
+        cells = cells[keep]
+        return {'_vid_': cells['_vid_'].values.astype(np.int64),
+                'weak_label_idx': cells['weak_label_idx'].values.astype(np.int64),
+                'fixed': cells['fixed'].values.astype(np.int64),
+                'clean': clean[keep].astype(np.int64)}
+
+    def violations(self, dataset, constraints, tag=None):
+        evaluator = dataset.get_constraint_evaluator()
+        for idx, c in enumerate(constraints):
+            tic = time.time()
+            tids = evaluator.violations(c)
+            self.query_log.record(c.cnf_form, time.time() - tic, rows=len(tids), tag=tag)
+            yield idx, tids
+
+    def relaxed_violations(self, dataset, pos_values, relaxations, tag=None):
+        evaluator = dataset.get_constraint_evaluator()
+        pos_values = self.get_table(pos_values)
+        for idx, relaxation in enumerate(relaxations):
+            yield idx, evaluate_relaxed(evaluator, pos_values, relaxation, self.query_log, tag)
+
+    def count_repairs(self, cell_domain, inf_values_dom):
+        return float(self._repairs_df(cell_domain, inf_values_dom).shape[0])
+
+    def count_repairs_grdt(self, cell_domain, inf_values_dom, clean):
+        repairs = self._repairs_df(cell_domain, inf_values_dom).merge(
+            self.get_table(clean), left_on=['_tid_', 'attribute'], right_on=['_tid_', '_attribute_'])
+        is_correct = repairs['init_value'].values == repairs['_value_'].values
+        return float(is_correct.sum()), float((~is_correct).sum())
+
+    def count_errors(self, raw, clean, attrs):
+        return float(self._errors_df(raw, clean, attrs).shape[0])
+
+    def count_detected_errors(self, cell_domain, clean, dk_cells):
+        cells = self.get_table(cell_domain)
+        cells = cells[cells['_cid_'].isin(self.get_table(dk_cells)['_cid_'])]
+        cells = cells.merge(self.get_table(clean), left_on=['_tid_', 'attribute'], right_on=['_tid_', '_attribute_'])
+        return float((cells['init_value'].values != cells['_value_'].values).sum())
+
+    def count_correct_repairs(self, raw, clean, inf_values_dom, attrs):
+        correct = self._errors_df(raw, clean, attrs).merge(self.get_table(inf_values_dom),
+                                                           left_on=['_tid_', '_attribute_', '_value_'],
+                                                           right_on=['_tid_', 'attribute', 'rv_value'])
+        return float(correct.shape[0])
+
+    def weak_label_stats(self, cell_domain, clean, dk_cells, inf_values_dom):
+        cells = self.get_table(cell_domain)
+        dk_cells = self.get_table(dk_cells)[['_tid_', 'attribute']].drop_duplicates()
+        inferred = self.get_table(inf_values_dom)[['_tid_', 'attribute', 'rv_value']]
+        df = cells.merge(self.get_table(clean), left_on=['_tid_', 'attribute'], right_on=['_tid_', '_attribute_'])
+        df = df.merge(dk_cells.assign(_dk_=True), on=['_tid_', 'attribute'], how='left')
+        df = df.merge(inferred.assign(_inferred_=True), on=['_tid_', 'attribute'], how='left')
+        is_inferred = df['_inferred_'].notnull()
+
+        def equals(left, right):
+            # Comparisons with a NULL (not inferred) value are NULL.
+            eq = pd.Series(df[left].values == df[right].values, dtype=object)
+            if 'rv_value' in (left, right):
+                eq[~is_inferred.values] = None
+            return eq
+
+        stats = pd.DataFrame({'clean': df['_dk_'].isnull().values,
+                              'status': df['fixed'].values,
+                              'inferred': is_inferred.values,
+                              'init_eq_grdth': equals('init_value', '_value_'),
+                              'init_eq_infer': equals('init_value', 'rv_value'),
+                              'wl_eq_init': equals('weak_label', 'init_value'),
+                              'wl_eq_grdth': equals('weak_label', '_value_'),
+                              'wl_eq_infer': equals('weak_label', 'rv_value'),
+                              'infer_eq_grdth': equals('_value_', 'rv_value')})
+        # GROUP BY keeps NULL keys, groupby drops them.
+        counts = stats.fillna(NULL_REPR).groupby(list(stats.columns)).size()
+        return [tuple(None if val == NULL_REPR else val for val in key) + (count,) for key, count in counts.items()]
+
+    def _repairs_df(self, cell_domain, inf_values_dom):
+        """
+        _repairs_df returns the cells of :param cell_domain: joined with
+        their inferred value where the inferred value is not equal to the
+        initial value.
+        """
+        repairs = self.get_table(cell_domain)[['_tid_', 'attribute', 'init_value']].merge(
+            self.get_table(inf_values_dom)[['_tid_', 'attribute', 'rv_value']], on=['_tid_', 'attribute'])
+        # NULL inferred values are never counted, as in SQL.
+        return repairs[repairs['rv_value'].notnull() & (repairs['init_value'] != repairs['rv_value'])]
+
+    def _errors_df(self, raw, clean, attrs):
+        """
+        _errors_df returns the rows (_tid_, _attribute_, _value_) of the
+        ground truth :param clean: for all cells that have an error in
+        :param raw: (the 'errors' subquery of correct_repairs_template).
+        """
+        raw = self.get_table(raw)
+        clean = self.get_table(clean)
+        errors = []
+        for attr in attrs:
+            grdt = clean[clean['_attribute_'] == attr].merge(raw[['_tid_', attr]], on='_tid_')
+            errors.append(grdt.loc[grdt[attr].values != grdt['_value_'].values, ['_tid_', '_attribute_', '_value_']])
+        return pd.concat(errors, ignore_index=True)
+
+    def pool_stats(self):
+        return {'max_size': 0, 'open': 0, 'in_use': 0, 'max_in_use': 0, 'acquisitions': 0,
+                'total_wait': 0.0, 'max_wait': 0.0}
+
+    def close(self):
+        self.shutdown_task_executor()
+        self.tables = {}
+
+
+def _where_mask(df, where):
+    mask = np.ones(df.shape[0], dtype=bool)
+    for column, values in where.items():
+        mask &= df[column].isin(values).values
+    return mask
+
+
+def _df_columns(df, dtypes):
+    dtypes = dtypes or {}
+    return {col: np.asarray(df[col].values, dtype=dtypes.get(col, object)) for col in df.columns}
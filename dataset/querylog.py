@@ -0,0 +1,130 @@
+import itertools
+import json
+import threading
+
+import pandas as pd
+
+explain_template = 'EXPLAIN (ANALYZE, BUFFERS) {}'
+
+# # of rows sampled by estimate_bytes.
+BYTES_SAMPLE_ROWS = 100
+
+
+def estimate_bytes(rows):
+    """
+    estimate_bytes estimates the # of bytes of the text representation of
+    the result :param rows: (list of tuples) from a sample of the rows.
+    """
+    if not rows:
+        return 0
+    sample = rows[:BYTES_SAMPLE_ROWS]
+    sample_bytes = sum(len(str(val)) for row in sample for val in row)
+    return int(sample_bytes * len(rows) / float(len(sample)))
+
+
+class QueryLog:
+    """
+    QueryLog records one entry per query executed by DBengine: wall time,
+    # of rows returned, (estimated) bytes transferred, whether the query
+    timed out and its backup query was run instead, and optionally its
+    EXPLAIN (ANALYZE, BUFFERS) plan.
+
+    Queries are tagged by their caller (e.g. 'ConstraintFeaturizer') so the
+    report can rank the slowest queries of every stage. Entries may be
+    recorded concurrently from the query worker threads.
+    """
+    def __init__(self, explain=False):
+        """
+        :param explain: (bool) also capture the plans of tagged queries.
+            EXPLAIN ANALYZE runs every such query a second time.
+        """
+        self.explain = explain
+        self._entries = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def record(self, query, wall_time, rows=None, nbytes=None, tag=None, timed_out=False, fallback=False,
+               plan=None):
+        """
+        record adds the entry of :param query: that took :param wall_time:
+        seconds and returned :param rows: rows of :param nbytes: bytes.
+
+        :param timed_out: (bool) the query hit its statement_timeout.
+        :param fallback: (bool) the backup query was executed instead.
+        :param plan: (str) the EXPLAIN plan of the query.
+        """
+        entry = {'query_id': next(self._ids),
+                 'tag': tag,
+                 'query': query,
+                 'wall_time': wall_time,
+                 'rows': rows,
+                 'bytes': nbytes,
+                 'timed_out': timed_out,
+                 'fallback': fallback,
+                 'plan': plan}
+        with self._lock:
+            self._entries.append(entry)
+        return entry
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+
+    def to_df(self):
+        """
+        to_df returns the entries as a DataFrame (one row per query).
+        """
+        return pd.DataFrame(self.entries(), columns=['query_id', 'tag', 'query', 'wall_time', 'rows', 'bytes',
+                                                     'timed_out', 'fallback', 'plan'])
+
+    def report(self, top=10):
+        """
+        report returns a JSON-serializable dict with totals per tag and
+        the :param top: slowest queries overall and per tag.
+        """
+        df = self.to_df()
+        df['tag'] = df['tag'].fillna('untagged')
+        by_tag = []
+        for tag, group in df.groupby('tag'):
+            by_tag.append({'tag': tag,
+                           'queries': int(group.shape[0]),
+                           'total_time': float(group['wall_time'].sum()),
+                           'max_time': float(group['wall_time'].max()),
+                           'rows': int(group['rows'].fillna(0).sum()),
+                           'bytes': int(group['bytes'].fillna(0).sum()),
+                           'timeouts': int(group['timed_out'].sum()),
+                           'fallbacks': int(group['fallback'].sum())})
+        by_tag.sort(key=lambda stats: -stats['total_time'])
+        return {'queries': int(df.shape[0]),
+                'total_time': float(df['wall_time'].sum()),
+                'timeouts': int(df['timed_out'].sum()),
+                'fallbacks': int(df['fallback'].sum()),
+                'by_tag': by_tag,
+                'slowest': self._slowest(df, top),
+                'slowest_by_tag': {tag: self._slowest(group, top) for tag, group in df.groupby('tag')}}
+
+    def _slowest(self, df, top):
+        slowest = df.sort_values('wall_time', ascending=False).head(top)
+        # Let json.dump handle the values: numpy types and NaN are not
+        # serializable.
+        return [{key: _to_json(val) for key, val in entry.items()}
+                for entry in slowest.to_dict(orient='records')]
+
+    def dump(self, fpath, top=10):
+        """
+        dump writes the report (see report) to the JSON file :param fpath:.
+        """
+        with open(fpath, 'w') as f:
+            json.dump(self.report(top), f, indent=2)
+
+
+def _to_json(val):
+    if val is None or (isinstance(val, float) and val != val):
+        return None
+    if hasattr(val, 'item'):
+        return val.item()
+    return val
@@ -0,0 +1,166 @@
+import hashlib
+import logging
+
+import numpy as np
+
+from .cache import DiskCache
+
+explain_cost_template = 'EXPLAIN (FORMAT JSON) {}'
+
+
+class QueryScheduler:
+    """
+    QueryScheduler plans the (query, backup query) pairs run with
+    DBengine.iter_queries(backup=True): it selects the backup query up
+    front for queries that are predicted to time out (instead of waiting
+    for the timeout every run) and orders the queries longest first so the
+    slowest ones do not start last.
+
+    The wall time of a query is predicted from (in order of preference):
+    - the time recorded in an earlier run: this session's QueryLog or, with
+      a cache, the cost model stored by a previous session on the same data
+      (one DiskCache entry per data fingerprint).
+    - the total cost of the planner's EXPLAIN estimate, converted to
+      seconds with the median seconds per cost unit of the queries that
+      have a recorded time. Without any recorded time the queries are
+      ordered by their cost only.
+    """
+    def __init__(self, engine, cache=None, fingerprint=None):
+        """
+        :param engine: (DBengine) engine the queries are run on. Its timeout
+            (ms) is the budget of a query and its query_cost_budget (if not
+            None) the max EXPLAIN cost of a query without a recorded time.
+        :param cache: (DiskCache) cache of the recorded times (optional).
+        :param fingerprint: (str) fingerprint of the data the queries run on
+            (see EncodedTable.fingerprint), part of the cache keys.
+        """
+        self.engine = engine
+        self.cache = cache
+        self.fingerprint = fingerprint
+
+    def plan(self, queries):
+        """
+        plan returns (order, scheduled) where scheduled[i] is the
+        (query, backup query) pair to run for queries[order[i]]. The query
+        is None if its backup query should be run directly.
+
+        :param queries: (list[(str, str)]) (query, backup query) pairs. Pairs
+            without a backup query are never changed.
+        """
+        costs = self._explain_costs([query for query, _ in queries])
+        backup_costs = self._explain_costs([backup for _, backup in queries if backup])
+        backup_costs = iter(backup_costs)
+        backup_costs = [next(backup_costs) if backup else None for _, backup in queries]
+        logged, cached = self._log_index(), self._load_model()
+        history = [self._recorded(query, logged, cached) for query, _ in queries]
+
+        # Seconds per planner cost unit of the queries with a recorded time.
+        ratios = [wall_time / cost for (wall_time, timed_out), cost in zip(history, costs)
+                  if wall_time is not None and not timed_out and cost > 0]
+        calibrated = len(ratios) > 0
+        sec_per_cost = float(np.median(ratios)) if calibrated else None
+        budget = self.engine.timeout / 1000.0
+
+        # The sort keys are predicted seconds once calibrated, and planner
+        # costs until then: the two are never compared with each other.
+        scheduled, keys = [], []
+        for (query, backup), (wall_time, timed_out), cost, backup_cost in zip(queries, history, costs, backup_costs):
+            if timed_out:
+                predicted = float('inf')
+            elif wall_time is not None:
+                predicted = wall_time
+            elif calibrated:
+                predicted = cost * sec_per_cost
+            else:
+                predicted = None
+            over_budget = predicted is not None and predicted > budget
+            if predicted is None and self.engine.query_cost_budget is not None:
+                over_budget = cost > self.engine.query_cost_budget
+            if backup and over_budget:
+                logging.debug('running the backup of query predicted to take %s secs (cost %.0f) up front: %s',
+                              predicted, cost, query)
+                scheduled.append((None, backup))
+                keys.append(backup_cost * sec_per_cost if calibrated else backup_cost)
+            elif calibrated:
+                scheduled.append((query, backup))
+                keys.append(predicted)
+            else:
+                scheduled.append((query, backup))
+                # Queries that timed out before still go first.
+                keys.append(float('inf') if timed_out else cost)
+        # Longest first; ties keep the original order.
+        order = sorted(range(len(queries)), key=lambda idx: -keys[idx])
+        logging.debug('scheduled %d queries, %d backup queries selected up front', len(queries),
+                      sum(1 for query, _ in scheduled if query is None))
+        return order, [scheduled[idx] for idx in order]
+
+    def record(self, queries):
+        """
+        record saves the wall times of :param queries: (as passed to plan)
+        from this session's QueryLog to the cache for later runs, as a
+        single cost model entry per data fingerprint.
+        """
+        if self.cache is None:
+            return
+        logged = self._log_index()
+        model = self._load_model()
+        updated = False
+        for query, _ in queries:
+            if query in logged:
+                model[_query_hash(query)] = logged[query]
+                updated = True
+        if not updated:
+            return
+        hashes = sorted(model)
+        self.cache.store(self._cache_key(), {'queries': np.array(hashes, dtype=str),
+                                             'wall_time': np.array([model[h][0] for h in hashes], dtype=np.float64),
+                                             'timed_out': np.array([model[h][1] for h in hashes], dtype=bool)})
+
+    def _explain_costs(self, queries):
+        if not queries:
+            return []
+        results = self.engine.execute_queries([explain_cost_template.format(query) for query in queries])
+        return [float(res[0][0][0]['Plan']['Total Cost']) for res in results]
+
+    def _recorded(self, query, logged, cached):
+        """
+        _recorded returns the (wall_time, timed_out) recorded for
+        :param query: in this session (:param logged:, see _log_index) or
+        in the cost model (:param cached:, see _load_model), or
+        (None, False).
+        """
+        if query in logged:
+            return logged[query]
+        return cached.get(_query_hash(query), (None, False))
+
+    def _log_index(self):
+        """
+        _log_index returns { query -> (wall_time, timed_out) } of the last
+        run (not as a fallback) of every query in the QueryLog.
+        """
+        index = {}
+        for entry in self.engine.query_log.entries():
+            if not entry['fallback']:
+                index[entry['query']] = (entry['wall_time'], entry['timed_out'])
+        return index
+
+    def _load_model(self):
+        """
+        _load_model returns the cost model cached for the data fingerprint
+        as { query hash -> (wall_time, timed_out) }.
+        """
+        if self.cache is None:
+            return {}
+        arrays = self.cache.load(self._cache_key())
+        if arrays is None:
+            return {}
+        return {h: (float(wall_time), bool(timed_out))
+                for h, wall_time, timed_out in zip(arrays['queries'].tolist(), arrays['wall_time'].tolist(),
+                                                   arrays['timed_out'].tolist())}
+
+    def _cache_key(self):
+        return DiskCache.make_key('query_cost_model', self.fingerprint)
+
+
+def _query_hash(query):
+    return hashlib.sha1(query.encode('utf-8')).hexdigest()
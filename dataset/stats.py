@@ -0,0 +1,514 @@
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+from utils import NULL_CODE
+
+# Appended co-occurrences of a pair are merged into its count matrix once
+# they reach this fraction of its non-zeros (see PairStats.update).
+MERGE_FRACTION = 0.25
+
+# Code matrix of the raw data used by the pool workers of
+# compute_pair_matrices. With the default fork start method the workers
+# inherit it from the parent instead of receiving a pickled copy.
+_shared_codes = None
+
+
+def cooccur_matrix(first_codes, second_codes, shape):
+    """
+    cooccur_matrix returns the CSR matrix of co-occurrence counts of the code
+    columns :param first_codes: (rows) and :param second_codes: (columns).
+
+    NULL co-occurrences are kept in row/column NULL_CODE so the matrix is the
+    full contingency table of the two attributes.
+    """
+    ones = np.ones(len(first_codes), dtype=np.int32)
+    matrix = coo_matrix((ones, (first_codes, second_codes)), shape=shape).tocsr()
+    # Sums duplicate entries and sorts the column indices of every row,
+    # which _lookup relies on.
+    matrix.sum_duplicates()
+    return matrix
+
+
+def pair_matrix(encoded, attr1, attr2):
+    """
+    pair_matrix returns the co-occurrence count matrix (see cooccur_matrix)
+    of :param attr1: and :param attr2: in :param encoded: (EncodedTable).
+    """
+    shape = (len(encoded.dicts[attr1]), len(encoded.dicts[attr2]))
+    return cooccur_matrix(encoded.column(attr1), encoded.column(attr2), shape)
+
+
+def compute_pair_matrices(encoded, pairs, processes=1):
+    """
+    compute_pair_matrices returns the co-occurrence count matrices of the
+    attribute :param pairs: (list[(attr1, attr2)]) in the same order.
+
+    With :param processes: > 1 the pairs are spread over a pool of worker
+    processes that share the code matrix of :param encoded: and only send
+    back the (small) sparse matrices.
+    """
+    tasks = [(encoded.attr_to_idx[attr1], encoded.attr_to_idx[attr2],
+              (len(encoded.dicts[attr1]), len(encoded.dicts[attr2])))
+             for attr1, attr2 in pairs]
+    if processes <= 1 or len(tasks) <= 1:
+        _init_pair_worker(encoded.codes)
+        try:
+            return [_pair_worker(task) for task in tasks]
+        finally:
+            _init_pair_worker(None)
+    processes = min(processes, len(tasks))
+    chunksize = max(1, len(tasks) // (4 * processes))
+    pool = Pool(processes, initializer=_init_pair_worker, initargs=(encoded.codes,))
+    try:
+        return pool.map(_pair_worker, tasks, chunksize=chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _init_pair_worker(codes):
+    global _shared_codes
+    _shared_codes = codes
+
+
+def _pair_worker(task):
+    idx1, idx2, shape = task
+    return cooccur_matrix(_shared_codes[:, idx1], _shared_codes[:, idx2], shape)
+
+
+class PairStats:
+    """
+    PairStats stores the co-occurrence statistics of attribute pairs as one
+    sparse count matrix (CSR) over value codes per unordered pair of
+    attributes. The matrix of (attr2, attr1) is served as the transpose of the
+    stored (attr1, attr2) matrix, converted to CSR the first time it is
+    needed in that orientation and cached until the pair changes.
+
+    Lookups exclude NULL values: counts involving NULL_CODE are always 0 and
+    NULL values are never returned as co-occurring values.
+
+    Pairs that were not computed up front (see Dataset.collect_stats) are
+    computed from the encoded data the first time they are looked up.
+
+    The co-occurrences of appended tuples (see update) are kept apart from
+    the stored matrices until they reach MERGE_FRACTION of their non-zeros
+    or the full matrix is needed (csr, matrix): lookups add the counts of
+    both.
+    """
+    def __init__(self, encoded):
+        """
+        :param encoded: (EncodedTable) encoded raw data the codes refer to.
+        """
+        self._encoded = encoded
+        # (attr1, attr2) -> CSR matrix where attr1 comes before attr2 in
+        # encoded.attrs.
+        self._matrices = {}
+        # (attr1, attr2) -> CSR matrix of the transpose of
+        # self._matrices[(attr1, attr2)], built on first use.
+        self._transposed = {}
+        # (attr1, attr2) -> list of (codes of attr1, codes of attr2) of the
+        # appended tuples not merged into self._matrices[(attr1, attr2)] yet.
+        self._pending = {}
+        # (attr1, attr2) -> (CSR matrix, CSR transpose) of the counts of
+        # self._pending[(attr1, attr2)], built on first use.
+        self._deltas = {}
+
+    def _key(self, attr1, attr2):
+        """
+        _key returns the key of the stored matrix for the pair and whether
+        the pair is transposed w.r.t. the stored matrix.
+        """
+        idx = self._encoded.attr_to_idx
+        if idx[attr1] < idx[attr2]:
+            return (attr1, attr2), False
+        return (attr2, attr1), True
+
+    def set_matrix(self, attr1, attr2, matrix):
+        """
+        set_matrix stores the co-occurrence count :param matrix: of the pair
+        (attr1, attr2) (see cooccur_matrix).
+        """
+        (first, second), transposed = self._key(attr1, attr2)
+        self._matrices[(first, second)] = matrix.T.tocsr() if transposed else matrix
+        self._transposed.pop((first, second), None)
+        self._pending.pop((first, second), None)
+        self._deltas.pop((first, second), None)
+
+    def update(self, codes):
+        """
+        update adds the co-occurrences of new tuples to every stored matrix.
+        They are accumulated per pair and only merged into the matrix once
+        they reach MERGE_FRACTION of its non-zeros, so the cost of an update
+        depends on the # of new tuples rather than on the size of the
+        matrices.
+
+        :param codes: (numpy.ndarray) code matrix (rows of the encoded table)
+            of the new tuples.
+        """
+        idx = self._encoded.attr_to_idx
+        for key, matrix in list(self._matrices.items()):
+            pending = self._pending.setdefault(key, [])
+            pending.append((codes[:, idx[key[0]]].copy(), codes[:, idx[key[1]]].copy()))
+            self._deltas.pop(key, None)
+            if sum(len(codes1) for codes1, _ in pending) >= MERGE_FRACTION * max(matrix.nnz, 1):
+                self._merge(key)
+
+    def _merge(self, key):
+        """
+        _merge adds the pending co-occurrences of the pair :param key: to
+        its stored matrix, grown to the current dictionary sizes so new
+        values get their rows/columns.
+        """
+        pending = self._pending.pop(key, None)
+        if not pending:
+            return
+        matrix = self._matrices[key]
+        shape = (len(self._encoded.dicts[key[0]]), len(self._encoded.dicts[key[1]]))
+        indptr = np.concatenate([matrix.indptr,
+                                 np.full(shape[0] - matrix.shape[0], matrix.indptr[-1], dtype=matrix.indptr.dtype)])
+        grown = csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+        delta = cooccur_matrix(np.concatenate([codes1 for codes1, _ in pending]),
+                               np.concatenate([codes2 for _, codes2 in pending]), shape)
+        updated = (grown + delta).tocsr()
+        updated.sum_duplicates()
+        self._matrices[key] = updated
+        self._transposed.pop(key, None)
+        self._deltas.pop(key, None)
+
+    def _delta(self, key):
+        """
+        _delta returns the (CSR matrix, CSR transpose) of the pending
+        co-occurrences of the pair :param key: or None if there are none.
+        """
+        if not self._pending.get(key):
+            return None
+        if key not in self._deltas:
+            pending = self._pending[key]
+            shape = (len(self._encoded.dicts[key[0]]), len(self._encoded.dicts[key[1]]))
+            delta = cooccur_matrix(np.concatenate([codes1 for codes1, _ in pending]),
+                                   np.concatenate([codes2 for _, codes2 in pending]), shape)
+            transpose = delta.T.tocsr()
+            transpose.sort_indices()
+            self._deltas[key] = (delta, transpose)
+        return self._deltas[key]
+
+    def has_pair(self, attr1, attr2):
+        return self._key(attr1, attr2)[0] in self._matrices
+
+    def _stored(self, key):
+        if key not in self._matrices:
+            self._matrices[key] = pair_matrix(self._encoded, key[0], key[1])
+        return self._matrices[key]
+
+    def _stored_transpose(self, key):
+        if key not in self._transposed:
+            transpose = self._stored(key).T.tocsr()
+            transpose.sort_indices()
+            self._transposed[key] = transpose
+        return self._transposed[key]
+
+    def _oriented(self, attr1, attr2):
+        """
+        _oriented returns the CSR matrices with :param attr1: codes as rows
+        whose sum is the count matrix of (attr1, attr2): the stored matrix
+        and, if any, the matrix of the pending co-occurrences. The stored
+        matrix may have fewer rows/columns than the dictionaries.
+        """
+        key, transposed = self._key(attr1, attr2)
+        if not transposed:
+            return self._parts(key)
+        matrices = [self._stored_transpose(key)]
+        delta = self._delta(key)
+        if delta is not None:
+            matrices.append(delta[1])
+        return matrices
+
+    def _parts(self, key):
+        """
+        _parts returns the stored matrix of the pair :param key: and, if
+        any, the matrix of its pending co-occurrences (see _oriented).
+        """
+        delta = self._delta(key)
+        return [self._stored(key)] if delta is None else [self._stored(key), delta[0]]
+
+    def pairs(self):
+        """
+        pairs returns the stored (unordered) attribute pairs.
+        """
+        return list(self._matrices.keys())
+
+    def matrix(self, attr1, attr2):
+        """
+        matrix returns the count matrix with :param attr1: codes as rows and
+        :param attr2: codes as columns. For the transposed pair this is a
+        (CSC) view of the stored matrix and not a copy.
+        """
+        key, transposed = self._key(attr1, attr2)
+        self._stored(key)
+        self._merge(key)
+        matrix = self._matrices[key]
+        return matrix.T if transposed else matrix
+
+    def _lookup(self, matrix, row, cols):
+        counts = np.zeros(len(cols), dtype=np.int64)
+        if row >= matrix.shape[0]:
+            return counts
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        row_cols = matrix.indices[start:end]
+        pos = np.searchsorted(row_cols, cols)
+        found = pos < len(row_cols)
+        found[found] = row_cols[pos[found]] == cols[found]
+        counts[found] = matrix.data[start + pos[found]]
+        return counts
+
+    def counts(self, attr1, attr2, code1, codes2):
+        """
+        counts returns the # of tuples where attr1 = :param code1: and
+        attr2 = c for every code c in :param codes2:.
+
+        :return: (numpy.ndarray) of counts aligned with :param codes2:.
+        """
+        codes2 = np.asarray(codes2)
+        if code1 == NULL_CODE:
+            return np.zeros(len(codes2), dtype=np.int64)
+        counts = sum(self._lookup(matrix, code1, codes2) for matrix in self._oriented(attr1, attr2))
+        counts[codes2 == NULL_CODE] = 0
+        return counts
+
+    def count(self, attr1, attr2, code1, code2):
+        """
+        count returns the # of tuples where attr1 = :param code1: and
+        attr2 = :param code2:.
+        """
+        if code1 == NULL_CODE or code2 == NULL_CODE:
+            return 0
+        key, transposed = self._key(attr1, attr2)
+        if transposed:
+            code1, code2 = code2, code1
+        return int(sum(self._lookup(matrix, code1, np.array([code2]))[0] for matrix in self._parts(key)))
+
+    def entry_counts(self, attr1, attr2, codes1, codes2):
+        """
+        entry_counts returns the # of tuples where attr1 = codes1[i] and
+        attr2 = codes2[i] for every i, NULLs included (unlike the other
+        lookups).
+        """
+        key, transposed = self._key(attr1, attr2)
+        if transposed:
+            codes1, codes2 = codes2, codes1
+        counts = np.zeros(len(codes1), dtype=np.int64)
+        for matrix in self._parts(key):
+            inside = (codes1 < matrix.shape[0]) & (codes2 < matrix.shape[1])
+            if inside.any():
+                counts[inside] += np.asarray(matrix[codes1[inside], codes2[inside]]).ravel().astype(np.int64)
+        return counts
+
+    def get(self, attr1, attr2, val1, val2):
+        """
+        get returns the # of tuples where attr1 = :param val1: and
+        attr2 = :param val2: (0 if either value does not appear).
+        """
+        code1 = self._encoded.encode(attr1, val1)
+        code2 = self._encoded.encode(attr2, val2)
+        if code1 is None or code2 is None:
+            return 0
+        return self.count(attr1, attr2, code1, code2)
+
+    def row(self, attr1, attr2, code1):
+        """
+        row returns the non-NULL values of attr2 that co-occur with
+        attr1 = :param code1: as (codes2, counts), sorted by code.
+        """
+        if code1 == NULL_CODE:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)
+        parts = [(matrix.indices[matrix.indptr[code1]:matrix.indptr[code1 + 1]],
+                  matrix.data[matrix.indptr[code1]:matrix.indptr[code1 + 1]])
+                 for matrix in self._oriented(attr1, attr2) if code1 < matrix.shape[0]]
+        if not parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)
+        if len(parts) == 1:
+            codes2, counts = parts[0]
+        else:
+            codes2, inverse = np.unique(np.concatenate([codes for codes, _ in parts]), return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate([data for _, data in parts]),
+                                 minlength=len(codes2))
+        not_null = (codes2 != NULL_CODE) & (counts > 0)
+        return codes2[not_null], counts[not_null].astype(np.int64)
+
+    def csr(self, attr1, attr2):
+        """
+        csr returns the count matrix of (attr1, attr2) in CSR format with
+        sorted column indices. For the transposed pair this is the cached
+        transpose (see _stored_transpose).
+        """
+        key, transposed = self._key(attr1, attr2)
+        self._stored(key)
+        self._merge(key)
+        return self._stored_transpose(key) if transposed else self._matrices[key]
+
+    @property
+    def nbytes(self):
+        matrices = list(self._matrices.values()) + list(self._transposed.values())
+        pending = [codes for chunks in self._pending.values() for chunk in chunks for codes in chunk]
+        return sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for m in matrices) \
+            + sum(codes.nbytes for codes in pending)
+
+    def to_arrays(self):
+        """
+        to_arrays returns the stored matrices as a flat dict
+        { name -> numpy.ndarray } (e.g. for DiskCache.store).
+        """
+        idx = self._encoded.attr_to_idx
+        for key in list(self._pending):
+            self._merge(key)
+        arrays = {}
+        for (attr1, attr2), matrix in self._matrices.items():
+            prefix = 'pair_{}_{}_'.format(idx[attr1], idx[attr2])
+            arrays[prefix + 'data'] = matrix.data
+            arrays[prefix + 'indices'] = matrix.indices
+            arrays[prefix + 'indptr'] = matrix.indptr
+            arrays[prefix + 'shape'] = np.array(matrix.shape)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, encoded, arrays):
+        """
+        from_arrays rebuilds the PairStats saved with to_arrays for the same
+        :param encoded: (EncodedTable).
+        """
+        stats = cls(encoded)
+        for name in arrays:
+            if not (name.startswith('pair_') and name.endswith('_data')):
+                continue
+            prefix = name[:-len('data')]
+            idx1, idx2 = [int(i) for i in prefix.split('_')[1:3]]
+            matrix = csr_matrix((arrays[prefix + 'data'], arrays[prefix + 'indices'], arrays[prefix + 'indptr']),
+                                shape=tuple(arrays[prefix + 'shape']))
+            stats.set_matrix(encoded.attrs[idx1], encoded.attrs[idx2], matrix)
+        return stats
+
+
+def _pair_counts(codes1, codes2, size2):
+    """
+    _pair_counts returns the distinct (code1 * size2 + code2) cells of the
+    code arrays :param codes1: and :param codes2: and their counts.
+    """
+    return np.unique(codes1.astype(np.int64) * size2 + codes2, return_counts=True)
+
+
+def _nlogn(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    return np.where(counts > 0, counts * np.log(np.maximum(counts, 1)), 0.0)
+
+
+class EntropyStats:
+    """
+    EntropyStats keeps the sums of n * log(n) over the value counts of
+    every attribute and over the co-occurrence counts of every pair of
+    attributes (NULLs included). The normalized conditional entropy
+    correlations (see correlations) follow from these sums:
+    H(x|y) = (sum_y - sum_xy) / # of tuples. After an append only the counts
+    the new tuples touch change, so the sums are updated from the new tuples
+    instead of rescanning the data or the count matrices.
+    """
+    def __init__(self, encoded, counts=None, sums=None, pair_sums=None, total=None):
+        """
+        :param encoded: (EncodedTable) encoded raw data. The sums are
+            computed from its codes unless they are given (see from_arrays).
+        """
+        self._encoded = encoded
+        attrs = encoded.attrs
+        if counts is None:
+            counts = {attr: np.bincount(encoded.column(attr), minlength=len(encoded.dicts[attr])).astype(np.int64)
+                      for attr in attrs}
+            sums = {attr: float(_nlogn(counts[attr]).sum()) for attr in attrs}
+            pair_sums = {(attr1, attr2): float(_nlogn(_pair_counts(encoded.column(attr1), encoded.column(attr2),
+                                                                   len(encoded.dicts[attr2]))[1]).sum())
+                         for idx, attr1 in enumerate(attrs) for attr2 in attrs[idx + 1:]}
+            total = len(encoded)
+        self._counts = counts
+        self._sums = sums
+        self._pair_sums = pair_sums
+        self.total = total
+
+    def update(self, codes, pair_stats):
+        """
+        update adds the new tuples of the code matrix :param codes: to the
+        sums. The co-occurrence counts of the pairs are looked up in
+        :param pair_stats: (PairStats), which must already include the new
+        tuples (see PairStats.update).
+        """
+        encoded = self._encoded
+        self.total += len(codes)
+        for attr in encoded.attrs:
+            counts = self._counts[attr]
+            delta = np.bincount(codes[:, encoded.attr_to_idx[attr]], minlength=len(encoded.dicts[attr]))
+            if len(delta) > len(counts):
+                counts = np.concatenate([counts, np.zeros(len(delta) - len(counts), dtype=np.int64)])
+            changed = np.flatnonzero(delta)
+            old = counts[changed]
+            counts[changed] += delta[changed]
+            self._counts[attr] = counts
+            self._sums[attr] += float(_nlogn(counts[changed]).sum() - _nlogn(old).sum())
+        for (attr1, attr2) in self._pair_sums:
+            size2 = len(encoded.dicts[attr2])
+            cells, delta = _pair_counts(codes[:, encoded.attr_to_idx[attr1]], codes[:, encoded.attr_to_idx[attr2]],
+                                        size2)
+            new = pair_stats.entry_counts(attr1, attr2, cells // size2, cells % size2)
+            self._pair_sums[(attr1, attr2)] += float(_nlogn(new).sum() - _nlogn(new - delta).sum())
+
+    def to_arrays(self):
+        """
+        to_arrays returns the sums as a dict of arrays for DiskCache.
+        """
+        attrs = self._encoded.attrs
+        pair_sums = np.zeros((len(attrs), len(attrs)), dtype=np.float64)
+        for (attr1, attr2), pair_sum in self._pair_sums.items():
+            pair_sums[attrs.index(attr1), attrs.index(attr2)] = pair_sum
+        arrays = {'total': np.array([self.total]),
+                  'sums': np.array([self._sums[attr] for attr in attrs], dtype=np.float64),
+                  'pair_sums': pair_sums}
+        for idx, attr in enumerate(attrs):
+            arrays['counts_{}'.format(idx)] = self._counts[attr]
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, encoded, arrays):
+        """
+        from_arrays rebuilds the EntropyStats saved with to_arrays for the
+        same :param encoded: (EncodedTable).
+        """
+        attrs = encoded.attrs
+        counts = {attr: arrays['counts_{}'.format(idx)].astype(np.int64) for idx, attr in enumerate(attrs)}
+        sums = {attr: float(arrays['sums'][idx]) for idx, attr in enumerate(attrs)}
+        pair_sums = {(attr1, attr2): float(arrays['pair_sums'][idx, idx + 1 + jdx])
+                     for idx, attr1 in enumerate(attrs) for jdx, attr2 in enumerate(attrs[idx + 1:])}
+        return cls(encoded, counts, sums, pair_sums, int(arrays['total'][0]))
+
+    def correlations(self):
+        """
+        correlations returns { x -> { y -> correlation } } where the
+        correlation is 1 - H(x|y) normalized by the log of the # of values
+        of x, 1 for x == y and 0 for every y if x has a single value.
+
+        The normalized conditional entropy is 0 if y determines x and 1 if
+        x and y are independent, so the correlation is the reverse.
+        """
+        attrs = self._encoded.attrs
+        corr = {}
+        for x in attrs:
+            num_values = np.count_nonzero(self._counts[x])
+            if num_values == 1:
+                corr[x] = {y: 0.0 for y in attrs}
+                continue
+            corr[x] = {}
+            for y in attrs:
+                if x == y:
+                    corr[x][y] = 1.0
+                    continue
+                pair_sum = self._pair_sums[(x, y)] if (x, y) in self._pair_sums else self._pair_sums[(y, x)]
+                cond_entropy = (self._sums[y] - pair_sum) / self.total
+                corr[x][y] = 1.0 - cond_entropy / np.log(num_values)
+        return corr
@@ -1,14 +1,157 @@
 from enum import Enum
 import logging
+import os
 
+import numpy as np
 import pandas as pd
 
+# DEFAULT_NA_VALUES are the strings pd.read_csv reads as NaN by default:
+# the columnar sources treat them (and na_values) as NULL too.
+try:
+    from pandas._libs.parsers import STR_NA_VALUES as DEFAULT_NA_VALUES
+except ImportError:
+    from pandas.io.common import _NA_VALUES as DEFAULT_NA_VALUES
+
 
 class Source(Enum):
     FILE = 1
     DF   = 2
     DB   = 3
     SQL  = 4
+    PARQUET = 5
+    ARROW   = 6
+
+
+# File extensions of the columnar sources (see source_from_path).
+PARQUET_EXTS = ('.parquet', '.pq')
+ARROW_EXTS = ('.arrow', '.feather', '.ipc')
+
+
+def source_from_path(fpath):
+    """
+    source_from_path returns Source.PARQUET or Source.ARROW for files with
+    one of the PARQUET_EXTS/ARROW_EXTS extensions and Source.FILE (CSV)
+    otherwise.
+    """
+    ext = os.path.splitext(fpath)[1].lower()
+    if ext in PARQUET_EXTS:
+        return Source.PARQUET
+    if ext in ARROW_EXTS:
+        return Source.ARROW
+    return Source.FILE
+
+
+def normalize_df(df, exclude_attr_cols):
+    """
+    normalize_df converts the attributes of :param df: (except
+    :param exclude_attr_cols:) to lowercase strings with stripped
+    whitespaces, in place.
+    """
+    for attr in df.columns.values:
+        if attr not in exclude_attr_cols:
+            df[attr] = df[attr].str.strip().str.lower()
+    return df
+
+
+def read_csv_chunks(fpath, chunksize, na_values=None, exclude_attr_cols=['_tid_']):
+    """
+    read_csv_chunks reads the CSV file :param fpath: as strings in chunks of
+    :param chunksize: rows and yields each chunk normalized (see normalize_df).
+
+    Unlike Source.FILE, null columns are not dropped since we cannot know
+    whether a column is null without reading the whole file.
+    """
+    reader = pd.read_csv(fpath, dtype=str, na_values=na_values, encoding='utf-8', chunksize=chunksize)
+    for chunk in reader:
+        yield normalize_df(chunk, exclude_attr_cols)
+
+
+def read_columnar(fpath, src, columns=None, na_values=None, exclude_attr_cols=['_tid_']):
+    """
+    read_columnar reads the Parquet (Source.PARQUET) or Arrow IPC/Feather
+    (Source.ARROW) file :param fpath: memory-mapped and returns the
+    :param columns: (all columns if None) as a pandas.DataFrame.
+
+    Columns other than :param exclude_attr_cols: are dictionary-encoded by
+    Arrow (Parquet string columns are decoded straight into dictionaries)
+    and returned as pandas Categoricals. The normalization of the CSV path
+    (see normalize_df) and :param na_values: are applied to the
+    dictionary values only, so no per-row strings are materialized.
+    Non-string columns are cast to strings like the CSV path reads them,
+    NULLs are NaN and null columns are dropped. As with the CSV path, the
+    DEFAULT_NA_VALUES are NULL as well as :param na_values:.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise Exception("ERROR while loading table. Reading {} files requires pyarrow.".format(src.name))
+
+    if src == Source.PARQUET:
+        schema = pq.read_schema(fpath)
+        names = columns if columns is not None else schema.names
+        read_dictionary = [name for name in names
+                           if name not in exclude_attr_cols and pa.types.is_string(schema.field(name).type)]
+        table = pq.read_table(fpath, columns=names, memory_map=True, read_dictionary=read_dictionary)
+    elif src == Source.ARROW:
+        source = pa.memory_map(fpath, 'r')
+        try:
+            table = pa.ipc.open_file(source).read_all()
+        except pa.ArrowInvalid:
+            source.seek(0)
+            table = pa.ipc.open_stream(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    else:
+        raise Exception("ERROR while loading table. {} is not a columnar source.".format(src))
+
+    if na_values is None:
+        na_values = []
+    elif not isinstance(na_values, (list, tuple, set)):
+        na_values = [na_values]
+    na_values = set(DEFAULT_NA_VALUES) | set(na_values)
+    # Chunks (e.g. Parquet row groups) may have different dictionaries.
+    table = table.unify_dictionaries()
+    data = {}
+    for name in table.column_names:
+        col = table.column(name)
+        if name in exclude_attr_cols:
+            data[name] = col.to_pandas()
+            continue
+        values = _normalized_categorical(col, na_values)
+        if values.isnull().all():
+            logging.warning("Dropping the following null column from the dataset: '%s'", name)
+            continue
+        data[name] = values
+    return pd.DataFrame(data, columns=[name for name in table.column_names if name in data])
+
+
+def _normalized_categorical(col, na_values):
+    """
+    _normalized_categorical converts the Arrow ChunkedArray :param col: into
+    a pandas Categorical with normalized (see normalize_df) categories.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not pa.types.is_dictionary(col.type):
+        if not pa.types.is_string(col.type):
+            col = pc.cast(col, pa.string())
+        col = pc.dictionary_encode(col)
+    arr = col.combine_chunks() if len(col.chunks) != 1 else col.chunk(0)
+    dictionary = arr.dictionary
+    if not pa.types.is_string(dictionary.type):
+        dictionary = pc.cast(dictionary, pa.string())
+    values = pd.Series(dictionary.to_pandas(), dtype=object)
+    values[values.isin(na_values)] = np.nan
+    values = values.str.strip().str.lower()
+    # Normalization may map different dictionary values to the same value.
+    remap, categories = pd.factorize(values)
+    # Null indices take the last code of remap: -1 (NaN).
+    remap = np.append(remap, -1)
+    indices = arr.indices.fill_null(len(dictionary)).to_numpy(zero_copy_only=False).astype(np.int64)
+    codes = remap[indices]
+    return pd.Categorical.from_codes(codes, categories=categories).remove_unused_categories()
 
 
 class Table:
@@ -16,7 +159,8 @@ class Table:
     A wrapper class for Dataset Tables.
     """
     def __init__(self, name, src, na_values=None, exclude_attr_cols=['_tid_'],
-            fpath=None, df=None, schema_name=None, table_query=None, db_engine=None):
+            fpath=None, df=None, schema_name=None, table_query=None, db_engine=None,
+            lazy=False, order_by=None, columns=None):
         """
         :param name: (str) name to assign to dataset.
         :param na_values: (str or list[str]) values to interpret as NULL.
@@ -26,21 +170,39 @@ class Table:
             parameters MUST be provided for each specific source:
                 Source.FILE: :param fpath:, read from CSV file
                 Source.DF: :param df:, read from pandas DataFrame
-                Source.DB: :param db_engine:, read from database table with :param name:
+                Source.DB: :param db_engine:, read the table :param name: of
+                    the engine (DBengine or MemoryEngine)
                 Source.SQL: :param table_query: and :param db_engine:, use result
-                    from :param table_query:
+                    from :param table_query: (read lazily like Source.DB with
+                    :param lazy:)
+                Source.PARQUET, Source.ARROW: :param fpath:, read from a Parquet
+                    or Arrow IPC/Feather file (see read_columnar)
 
         :param fpath: (str) File path to CSV file containing raw data
         :param df: (pandas.DataFrame) DataFrame contain the raw ingested data
         :param schema_name: (str) Schema used while loading Source.DB
         :param table_query: (str) sql query to construct table from
-        :param db_engine: (DBEngine) database engine object
+        :param db_engine: (Engine) database engine object
+        :param lazy: (bool) for Source.DB, do not read the table until self.df
+            is first accessed.
+        :param order_by: (str) for lazy Source.DB tables, column to order the
+            rows by when the table is read.
+        :param columns: (list[str]) for Source.PARQUET/ARROW, only read these
+            columns.
         """
         self.name = name
         self.index_count = 0
         # Copy the list to memoize
         self.exclude_attr_cols = list(exclude_attr_cols)
         self.df = pd.DataFrame()
+        # Set for lazy tables that are only read from Postgres on first access.
+        self._db_engine = None
+        self._schema_name = schema_name
+        self._order_by = order_by
+        # Index set with create_df_index before a lazy table is read.
+        self._df_index = None
+        # Row count of Source.SQL tables (known from creating the table).
+        self._row_count = None
 
         if src == Source.FILE:
             if fpath is None:
@@ -53,9 +215,11 @@ class Table:
                 if self.df[attr].isnull().all():
                     logging.warning("Dropping the following null column from the dataset: '%s'", attr)
                     self.df.drop(labels=[attr], axis=1, inplace=True)
-                    continue
-                if attr not in exclude_attr_cols:
-                    self.df[attr] = self.df[attr].str.strip().str.lower()
+            normalize_df(self.df, exclude_attr_cols)
+        elif src in (Source.PARQUET, Source.ARROW):
+            if fpath is None:
+                raise Exception("ERROR while loading table. File path for {} file expected. Please provide <fpath> param.".format(src.name))
+            self.df = read_columnar(fpath, src, columns=columns, na_values=na_values, exclude_attr_cols=exclude_attr_cols)
         elif src == Source.DF:
             if df is None:
                 raise Exception("ERROR while loading table. Dataframe expected. Please provide <df> param.")
@@ -63,28 +227,118 @@ class Table:
         elif src == Source.DB:
             if db_engine is None:
                 raise Exception("ERROR while loading table. DB connection expected. Please provide <db_engine>.")
-            self.df = pd.read_sql_table(name, db_engine.conn, schema=schema_name)
+            if lazy:
+                self._db_engine = db_engine
+                self._df = None
+            else:
+                self.df = db_engine.read_table(name, schema_name=schema_name)
         elif src == Source.SQL:
             if table_query is None or db_engine is None:
                 raise Exception("ERROR while loading table. SQL Query and DB connection expected. Please provide <table_query> and <db_engine>.")
-            db_engine.create_db_table_from_query(self.name, table_query)
-            self.df = pd.read_sql_table(name, db_engine.conn)
+            self._row_count = db_engine.create_db_table_from_query(self.name, table_query)
+            # The result is only read back from Postgres if self.df is accessed.
+            self._db_engine = db_engine
+            self._df = None
+
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = self._db_engine.read_table(self.name, schema_name=self._schema_name, order_by=self._order_by)
+            if self._df_index is not None:
+                self._df.set_index(self._df_index, inplace=True)
+        return self._df
 
-    def store_to_db(self, db_conn, if_exists='replace', index=False, index_label=None):
+    @df.setter
+    def df(self, df):
+        self._df = df
+
+    def is_loaded(self):
+        """
+        is_loaded returns False for lazy tables that have not been read from
+        Postgres yet.
+        """
+        return self._df is not None
+
+    def row_count(self):
+        """
+        row_count returns the # of rows of the table without reading a lazy
+        table from Postgres.
+        """
+        if self.is_loaded():
+            return self._df.shape[0]
+        if self._row_count is not None:
+            return self._row_count
+        return self._db_engine.count_rows(self.name, schema_name=self._schema_name)
+
+    def iter_chunks(self, columns=None, chunksize=100000):
+        """
+        iter_chunks yields the rows of the table as DataFrames of at most
+        :param chunksize: rows. A lazy table is streamed from Postgres and
+        not kept in memory.
+
+        :param columns: (list[str]) only return these columns (all if None).
+        """
+        if self.is_loaded():
+            df = self._df.reset_index() if any(self._df.index.names) else self._df
+            if columns is not None:
+                df = df[columns]
+            for start in range(0, df.shape[0], chunksize):
+                yield df.iloc[start:start + chunksize]
+            return
+        for chunk in self._db_engine.iter_table(self.name, columns=columns, order_by=self._order_by,
+                                                chunksize=chunksize, schema_name=self._schema_name):
+            yield chunk
+
+    def store_to_db(self, db_engine, if_exists='replace', index=False, index_label=None, bulk=True):
+        """
+        store_to_db writes self.df to the Postgres table self.name.
+
+        :param db_engine: (DBengine) database engine object
+        :param if_exists: (str) 'replace' or 'append' (or 'fail' if :param bulk: is False)
+        :param index: (bool) also store the DataFrame index as column(s)
+        :param index_label: (str or list[str]) column name(s) for the index
+        :param bulk: (bool) use COPY (DBengine.bulk_load_df) instead of
+            the row-wise inserts of DataFrame.to_sql.
+        """
         # TODO: This version supports single session, single worker.
-        self.df.to_sql(self.name, db_conn, if_exists=if_exists, index=index, index_label=index_label)
+        if not bulk:
+            self.df.to_sql(self.name, db_engine.engine, if_exists=if_exists, index=index, index_label=index_label)
+            return
+        df = self.df
+        if index:
+            df = df.reset_index()
+            if index_label is not None:
+                labels = [index_label] if isinstance(index_label, str) else list(index_label)
+                df.columns = labels + list(df.columns[len(labels):])
+        db_engine.bulk_load_df(self.name, df, if_exists=if_exists)
+
+    def get_columns(self):
+        """
+        get_columns returns all columns of the table (including meta-columns
+        like _tid_) without reading a lazy table from Postgres.
+        """
+        if not self.is_loaded():
+            return self._db_engine.column_names(self.name, schema_name=self._schema_name)
+        return list(self.df.columns)
 
     def get_attributes(self):
         """
         get_attributes returns the columns that are trainable/learnable attributes
         (i.e. exclude meta-columns like _tid_).
         """
+        if not self.is_loaded():
+            # Avoid reading the whole table just to get its columns.
+            return list(col for col in self.get_columns() if col not in self.exclude_attr_cols)
         if self.df.empty:
             raise Exception("Empty Dataframe associated with table {name}. Cannot return attributes.".format(
                 name=self.name))
         return list(col for col in self.df.columns if col not in self.exclude_attr_cols)
 
     def create_df_index(self, attr_list):
+        if not self.is_loaded():
+            # Set once the table is read (see df).
+            self._df_index = attr_list
+            return
         self.df.set_index(attr_list, inplace=True)
 
     def create_db_index(self, db_engine, attr_list):
@@ -1,26 +1,7 @@
 import logging
 
-operationsArr = ['<>', '<=', '>=', '=', '<', '>']
-operationSign = ['IQ', 'LTE', 'GTE', 'EQ', 'LT', 'GT']
-
-
-def is_symmetric(operation):
-    if operation in set(['<>', '=']):
-        return True
-    return False
-
-
-def get_flip_operation(operation):
-    if operation == '<=':
-        return '>='
-    elif operation == '>=':
-        return '<='
-    elif operation == '<':
-        return '>'
-    elif operation == '>':
-        return '<'
-    else:
-        return operation
+from .ir import ConstraintIR, PredicateIR
+from .operations import operationsArr, operationSign
 
 
 def contains_operation(string):
@@ -79,6 +60,9 @@ class DenialConstraint:
         cnf_forms = [predicate.cnf_form for predicate in self.predicates]
         self.cnf_form = " AND ".join(cnf_forms)
 
+        # Compiled form of the DC for the in-memory evaluators
+        self.ir = ConstraintIR(self.tuple_names, [predicate.ir for predicate in self.predicates])
+
 
 class Predicate:
     """
@@ -113,6 +97,7 @@ class Predicate:
                         attr=component[1])
             if i < len(self.components) - 1:
                 self.cnf_form += self.operation
+        self.ir = PredicateIR.from_predicate(self, tuple_names, schema)
         logging.debug("DONE parsing predicate: %s", predicate_string)
 
     def parse_components(self, predicate_string):
@@ -19,6 +19,10 @@ class Parser:
         self.ds = dataset
         self.dc_strings = []
         self.dcs = []
+        # Index of a DC -> index of an earlier DC with the same predicates.
+        self.duplicate_dcs = {}
+        # Index of a DC -> index of another DC that implies it.
+        self.implied_dcs = {}
 
     def load_denial_constraints(self, fpath):
         """
@@ -26,10 +30,10 @@ class Parser:
         
         :param fpath: filepath to TXT file containing denial constraints
         """
-        tic = time.clock()
+        tic = time.time()
         if not self.ds.raw_data:
             status = 'No dataset specified'
-            toc = time.clock()
+            toc = time.time()
             return status, toc - tic
         attrs = self.ds.raw_data.get_attributes()
         try:
@@ -47,8 +51,70 @@ class Parser:
         except Exception:
             logging.error('FAILED to load constraints from file %s', os.path.basename(fpath))
             raise
-        toc = time.clock()
+        self.find_redundant_dcs()
+        toc = time.time()
         return status, toc - tic
 
     def get_dcs(self):
         return self.dcs
+
+    def find_redundant_dcs(self):
+        """
+        find_redundant_dcs finds the DCs that have the same predicates as an
+        earlier DC (duplicates) and the DCs that are implied by another DC
+        i.e. whose violations all violate the other DC too (see
+        ConstraintIR.implies). Both are only reported: the queries of
+        duplicate DCs and of relaxations with the same fixed predicates are
+        shared instead (see group_constraints and group_relaxations).
+        """
+        self.duplicate_dcs, self.implied_dcs = {}, {}
+        _, group_of = self.group_constraints(self.dcs)
+        irs = [dc.ir for dc in self.dcs]
+        for idx, ir in enumerate(irs):
+            if group_of[idx] != idx:
+                self.duplicate_dcs[idx] = group_of[idx]
+                logging.info('DC %s is a duplicate of DC %s', self.dc_strings[idx], self.dc_strings[group_of[idx]])
+                continue
+            for other in range(len(irs)):
+                if group_of[other] != other or other == idx or not irs[other].implies(ir):
+                    continue
+                # Of two equivalent DCs only the later one is implied.
+                if other > idx and ir.implies(irs[other]):
+                    continue
+                self.implied_dcs[idx] = other
+                logging.info('DC %s is implied by DC %s', self.dc_strings[idx], self.dc_strings[other])
+                break
+        return self.duplicate_dcs, self.implied_dcs
+
+    @staticmethod
+    def group_constraints(dcs):
+        """
+        group_constraints groups the DCs :param dcs: with the same
+        predicates (see ConstraintIR.key).
+
+        :return: (list[int] index of the first DC of every group,
+            list[int] index of the first DC of the group of every DC)
+        """
+        return Parser._group([dc.ir.key() for dc in dcs])
+
+    @staticmethod
+    def group_relaxations(relaxed):
+        """
+        group_relaxations groups the relaxed predicates :param relaxed:
+        (see ConstraintFeaturizer.generate_relaxed_predicates) that count
+        the same violations: the same fixed predicates and relaxed
+        comparison (see ConstraintIR.relaxation_key).
+
+        :return: (list[int] index of the first relaxation of every group,
+            list[int] index of the first relaxation of the group of every
+            relaxation)
+        """
+        return Parser._group([c.ir.relaxation_key(pred_idx, join_rel, rv_attr, op, rv_val)
+                              for c, pred_idx, join_rel, rv_attr, op, rv_val in relaxed])
+
+    @staticmethod
+    def _group(keys):
+        first_of = {}
+        group_of = [first_of.setdefault(key, idx) for idx, key in enumerate(keys)]
+        firsts = [idx for idx, first in enumerate(group_of) if first == idx]
+        return firsts, group_of
@@ -0,0 +1,516 @@
+import operator
+
+import numpy as np
+import pandas as pd
+
+from .operations import get_flip_operation
+from .iejoin import range_counts, rank_values
+
+# Python/NumPy counterpart of every operation in operations.operationsArr.
+op_funcs = {'<>': operator.ne,
+            '<=': operator.le,
+            '>=': operator.ge,
+            '=': operator.eq,
+            '<': operator.lt,
+            '>': operator.gt}
+
+# Max # of (t1, t2) pairs materialized at once (see ConstraintEvaluator.pairs).
+MAX_PAIRS = 1 << 22
+
+
+def parse_operand(component):
+    """
+    parse_operand returns (tuple name, attribute) for an attribute
+    component of a Predicate and (None, value) for a quoted literal.
+    """
+    if isinstance(component, str):
+        return None, component[1:-1]
+    return component[0], component[1]
+
+
+class ConstraintEvaluator:
+    """
+    ConstraintEvaluator evaluates denial constraints over the raw data held
+    in memory with pandas/NumPy instead of SQL. It computes the same results
+    as the queries of ViolationDetector (violating tuples) and of
+    ConstraintFeaturizer (# of violations of every domain value when one
+    predicate is relaxed).
+
+    Tuples are joined with a hash join (pandas merge) on the equality
+    predicates between t1 and t2, all other predicates are evaluated
+    vectorized over the joined pairs. Constraints with at most two other
+    (e.g. <, >=) predicates between t1 and t2 and no equality predicate
+    between them are evaluated with the sort-based counting of
+    dcparser.iejoin instead of over all pairs. Values are compared as Python strings,
+    i.e. <, <=, >, >= follow code point order and not the collation of
+    Postgres.
+
+    Given the encoded raw data, the predicates are evaluated on the value
+    codes instead (see EncodedEvaluator) and tuples are hash joined on
+    their int block IDs instead of their values.
+    """
+    def __init__(self, df, max_pairs=MAX_PAIRS, encoded=None):
+        """
+        :param df: (DataFrame) the raw data with a _tid_ column.
+        :param max_pairs: (int) max # of tuple pairs materialized at once.
+        :param encoded: (EncodedTable) the dictionary-encoded :param df:
+            (with the same rows) or None to compare the values of :param df:.
+        """
+        self.df = df
+        self.max_pairs = max_pairs
+        self.encoded = EncodedEvaluator(encoded) if encoded is not None else None
+        self.tids = np.asarray(df['_tid_'].values)
+        self.num_rows = len(self.tids)
+        self._columns = {}
+        self._tid_rows = None
+
+    def column(self, attr):
+        """
+        column returns the values of :param attr: as an object array.
+        """
+        if attr not in self._columns:
+            self._columns[attr] = np.asarray(self.df[attr], dtype=object)
+        return self._columns[attr]
+
+    def rows_of_tids(self, tids):
+        """
+        rows_of_tids returns the row index of every tuple ID in :param tids:.
+        """
+        if self._tid_rows is None:
+            self._tid_rows = pd.Series(np.arange(self.num_rows), index=self.tids)
+        return self._tid_rows.reindex(tids).values.astype(np.int64)
+
+    def values(self, component, rows):
+        """
+        values returns the values of the Predicate :param component: for the
+        tuples at row indexes :param rows: (a scalar for literals).
+        """
+        name, attr = parse_operand(component)
+        if name is None:
+            return attr
+        return self.column(attr)[rows]
+
+    def violations(self, constraint):
+        """
+        violations returns the sorted tuple IDs of the tuples t1 that violate
+        :param constraint: i.e. for which all predicates hold (for some t2
+        for multi-tuple constraints, including t2 = t1).
+        """
+        if len(constraint.tuple_names) == 1:
+            rows = self.filter_rows(constraint.predicates, np.arange(self.num_rows))
+        elif self._range_join(constraint.predicates):
+            rows = self._range_violations(constraint.predicates)
+        else:
+            rows = [rows1 for rows1, _ in self.pairs(constraint.predicates)]
+            rows = np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+        return np.sort(self.tids[rows])
+
+    def split_predicates(self, predicates):
+        """
+        split_predicates splits :param predicates: into the single tuple
+        predicates of t1 and t2 and the predicates between t1 and t2.
+
+        :return: (dict { 't1'/'t2' -> list[Predicate] }, list[Predicate])
+        """
+        single = {'t1': [], 't2': []}
+        between = []
+        for pred in predicates:
+            names = set(parse_operand(comp)[0] for comp in pred.components) - set([None])
+            if len(names) == 1:
+                single[names.pop()].append(pred)
+            else:
+                between.append(pred)
+        return single, between
+
+    def _range_join(self, predicates, extra=0):
+        """
+        _range_join returns whether the predicates between t1 and t2 of
+        :param predicates: (plus :param extra: conditions) can be counted
+        with range_counts: at most two and none of them an equality (those
+        are hash joined).
+        """
+        _, between = self.split_predicates(predicates)
+        return len(between) + extra <= 2 and all(pred.operation != '=' for pred in between)
+
+    def _between_conditions(self, between, query_rel, query_rows, point_rows):
+        """
+        _between_conditions returns the range_counts conditions of the
+        predicates :param between: with the tuples :param query_rows: of
+        :param query_rel: as queries and :param point_rows: of the other
+        tuple as points.
+        """
+        conditions = []
+        for pred in between:
+            query_comp, point_comp = pred.components
+            op = pred.operation
+            if parse_operand(query_comp)[0] != query_rel:
+                query_comp, point_comp, op = point_comp, query_comp, get_flip_operation(op)
+            qvals, pvals = rank_values(self.values(query_comp, query_rows), self.values(point_comp, point_rows))
+            conditions.append((qvals, pvals, op))
+        return conditions
+
+    def _range_violations(self, predicates):
+        """
+        _range_violations returns the rows of the tuples t1 for which some t2
+        satisfies :param predicates: by counting the matching t2 of every
+        t1 (see range_counts) instead of joining all pairs.
+        """
+        single, between = self.split_predicates(predicates)
+        all_rows = np.arange(self.num_rows)
+        rows1 = self.filter_rows(single['t1'], all_rows)
+        rows2 = self.filter_rows(single['t2'], all_rows)
+        counts = range_counts(self._between_conditions(between, 't1', rows1, rows2), len(rows1), len(rows2))
+        return rows1[counts > 0]
+
+    def filter_rows(self, predicates, rows):
+        """
+        filter_rows returns the :param rows: for which all single tuple
+        :param predicates: hold.
+        """
+        if self.encoded is not None:
+            return self.encoded.filter_rows([pred.ir for pred in predicates], rows)
+        for pred in predicates:
+            if len(rows) == 0:
+                break
+            left = self.values(pred.components[0], rows)
+            right = self.values(pred.components[1], rows)
+            rows = rows[op_funcs[pred.operation](left, right)]
+        return rows
+
+    def pairs(self, predicates, distinct=False):
+        """
+        pairs yields (rows1, rows2), the row indexes of the (t1, t2) tuple
+        pairs for which all :param predicates: hold, in chunks of at most
+        self.max_pairs pairs (before the non-equality predicates between t1
+        and t2 are applied).
+
+        :param distinct: (bool) exclude the pairs where t1 = t2.
+        """
+        single, between = self.split_predicates(predicates)
+        equi = [pred for pred in between if pred.operation == '=']
+        theta = [pred for pred in between if pred.operation != '=']
+        all_rows = np.arange(self.num_rows)
+        rows1 = self.filter_rows(single['t1'], all_rows)
+        rows2 = self.filter_rows(single['t2'], all_rows)
+        if len(rows1) == 0 or len(rows2) == 0:
+            return
+
+        for pair_rows1, pair_rows2 in self._join(equi, rows1, rows2):
+            mask = np.ones(len(pair_rows1), dtype=bool)
+            if distinct:
+                mask &= pair_rows1 != pair_rows2
+            for pred in theta:
+                mask &= self._pair_mask(pred, pair_rows1, pair_rows2)
+            if mask.any():
+                yield pair_rows1[mask], pair_rows2[mask]
+
+    def _join(self, equi, rows1, rows2):
+        """
+        _join yields the (rows1, rows2) pairs that satisfy the equality
+        predicates :param equi: (all pairs if there are none) in chunks.
+        """
+        if not equi:
+            # Cross product of chunks of t1 with all of t2.
+            step = max(1, self.max_pairs // len(rows2))
+            for start in range(0, len(rows1), step):
+                block = rows1[start:start + step]
+                yield np.repeat(block, len(rows2)), np.tile(rows2, len(block))
+            return
+
+        keys1, keys2 = self._join_keys(equi, rows1, rows2)
+        keys = ['k{}'.format(idx) for idx in range(len(keys1))]
+        right = {'_row2': rows2}
+        for key, vals in zip(keys, keys2):
+            right[key] = vals
+        right = pd.DataFrame(right)
+        # Every t1 row joins with at most the largest group of t2.
+        largest = int(right.groupby(keys).size().max())
+        step = max(1, self.max_pairs // largest)
+        for start in range(0, len(rows1), step):
+            block = rows1[start:start + step]
+            left = {'_row1': block}
+            for key, vals in zip(keys, keys1):
+                left[key] = vals[start:start + step]
+            joined = pd.DataFrame(left).merge(right, on=keys)
+            yield joined['_row1'].values.astype(np.int64), joined['_row2'].values.astype(np.int64)
+
+    def _join_keys(self, equi, rows1, rows2):
+        """
+        _join_keys returns the join key columns of :param rows1: (t1) and
+        :param rows2: (t2) for the equality predicates :param equi:: their
+        values or, given the encoded data, a single column of block IDs.
+        """
+        if self.encoded is not None:
+            blocks1, blocks2 = self.encoded.equality_keys([pred.ir for pred in equi], rows1, rows2)
+            return [blocks1], [blocks2]
+        return ([self._side_values(pred, 't1', rows1) for pred in equi],
+                [self._side_values(pred, 't2', rows2) for pred in equi])
+
+    def _side_values(self, pred, name, rows):
+        for comp in pred.components:
+            if parse_operand(comp)[0] == name:
+                return self.values(comp, rows)
+
+    def _pair_mask(self, pred, rows1, rows2):
+        if self.encoded is not None:
+            return self.encoded.mask(pred.ir, [rows1, rows2])
+        left = self._pair_values(pred.components[0], rows1, rows2)
+        right = self._pair_values(pred.components[1], rows1, rows2)
+        return op_funcs[pred.operation](left, right)
+
+    def _pair_values(self, component, rows1, rows2):
+        name, _ = parse_operand(component)
+        if name == 't2':
+            return self.values(component, rows2)
+        return self.values(component, rows1)
+
+    def relaxed_violations(self, constraint, pred_idx, join_rel, rv_attr, op, rv_val, pos_values):
+        """
+        relaxed_violations counts the violations of :param constraint: for
+        every domain value of the cells of :param rv_attr: when predicate
+        :param pred_idx: is relaxed to "<domain value> :param op:
+        :param rv_val:", i.e. the result of ConstraintFeaturizer's
+        unary_template/binary_template queries.
+
+        :param join_rel: (str) tuple ('t1' or 't2') whose cells' domain
+            values are compared.
+        :param rv_val: (list or str) Predicate component the domain values
+            are compared to.
+        :param pos_values: (DataFrame) pos_values with the columns _vid_,
+            _tid_, attribute, rv_val and val_id.
+        :return: (_vid_, val_id, violations) numpy arrays.
+        """
+        predicates = constraint.predicates[:pred_idx] + constraint.predicates[(pred_idx+1):]
+        cells = pos_values[pos_values['attribute'].values == rv_attr]
+        empty = np.empty(0, dtype=np.int64)
+        if cells.empty:
+            return empty, empty, empty
+
+        if self.relaxed_range_join(constraint, pred_idx, join_rel, rv_val):
+            violations = self._relaxed_range_counts(predicates, join_rel, op, rv_val, cells)
+            found = violations > 0
+            return (cells['_vid_'].values[found].astype(np.int64),
+                    cells['val_id'].values[found].astype(np.int64),
+                    violations[found].astype(np.int64))
+
+        # Rank the values so that (row, value) pairs become sortable int keys.
+        cand_vals = np.asarray(cells['rv_val'].values, dtype=object)
+        name, attr = parse_operand(rv_val)
+        known_vals = np.array([attr], dtype=object) if name is None else self.column(attr)
+        uniq = np.unique(np.concatenate([known_vals, cand_vals]))
+        size = len(uniq) + 1
+
+        # Count the (row of join_rel, compared value) of every tuple (pair)
+        # that satisfies the other predicates.
+        keys, counts = [], []
+        for rel_rows, val_rows in self._relaxed_rows(constraint, predicates, join_rel, name):
+            vals = self.values(rv_val, val_rows)
+            ranks = np.searchsorted(uniq, vals) if name is not None else np.searchsorted(uniq, [vals])[0]
+            chunk_keys, chunk_counts = np.unique(rel_rows * size + ranks, return_counts=True)
+            keys.append(chunk_keys)
+            counts.append(chunk_counts)
+        if not keys:
+            return empty, empty, empty
+        keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+        cum = np.concatenate([[0], np.cumsum(counts)])
+
+        def count_below(key):
+            # # of (row, value) pairs with a key < :param key:.
+            return cum[np.searchsorted(keys, key, side='left')]
+
+        cand_rows = self.rows_of_tids(cells['_tid_'].values)
+        ranks = np.searchsorted(uniq, cand_vals)
+        base = cand_rows * size
+        # Range [lo, hi) of the ranks of the values v for which
+        # "<domain value> op v" holds.
+        lo, hi = np.zeros_like(ranks), np.full_like(ranks, size)
+        if op == '=':
+            lo, hi = ranks, ranks + 1
+        elif op == '<':
+            lo = ranks + 1
+        elif op == '<=':
+            lo = ranks
+        elif op == '>':
+            hi = ranks
+        elif op == '>=':
+            hi = ranks + 1
+        violations = count_below(base + hi) - count_below(base + lo)
+        if op == '<>':
+            violations = violations - (count_below(base + ranks + 1) - count_below(base + ranks))
+        found = violations > 0
+        return (cells['_vid_'].values[found].astype(np.int64),
+                cells['val_id'].values[found].astype(np.int64),
+                violations[found].astype(np.int64))
+
+    def relaxed_range_join(self, constraint, pred_idx, join_rel, rv_val):
+        """
+        relaxed_range_join returns whether relaxed_violations counts the
+        violations of the relaxed :param constraint: with range_counts
+        (sort-based) instead of joining all pairs, e.g. for constraints with
+        only <, <=, >, >= predicates between t1 and t2.
+        """
+        if len(constraint.tuple_names) == 1:
+            return False
+        predicates = constraint.predicates[:pred_idx] + constraint.predicates[(pred_idx+1):]
+        other_rel = 't2' if join_rel == 't1' else 't1'
+        return self._range_join(predicates, extra=int(parse_operand(rv_val)[0] == other_rel))
+
+    def _relaxed_range_counts(self, predicates, join_rel, op, rv_val, cells):
+        """
+        _relaxed_range_counts returns the # of violations of every cell
+        (domain value) of :param cells: computed as in relaxed_violations
+        but by counting the matching tuples of every cell with range_counts
+        instead of joining all pairs: the relaxed predicate is one more
+        condition if it compares to the other tuple.
+        """
+        single, between = self.split_predicates(predicates)
+        other_rel = 't2' if join_rel == 't1' else 't1'
+        all_rows = np.arange(self.num_rows)
+        rel_rows = self.filter_rows(single[join_rel], all_rows)
+        other_rows = self.filter_rows(single[other_rel], all_rows)
+        cand_rows = self.rows_of_tids(cells['_tid_'].values)
+        cand_vals = np.asarray(cells['rv_val'].values, dtype=object)
+
+        conditions = self._between_conditions(between, join_rel, cand_rows, other_rows)
+        name, _ = parse_operand(rv_val)
+        relaxed_holds = op_funcs[op](cand_vals, self.values(rv_val, cand_rows))
+        if name == other_rel:
+            qvals, pvals = rank_values(cand_vals, self.values(rv_val, other_rows))
+            conditions.append((qvals, pvals, op))
+            counts = range_counts(conditions, len(cand_rows), len(other_rows))
+        else:
+            # Compared to a literal or to the cell's own tuple.
+            counts = range_counts(conditions, len(cand_rows), len(other_rows)) * relaxed_holds
+
+        # Exclude the pairs where t1 = t2.
+        self_pair = np.isin(cand_rows, other_rows) & relaxed_holds
+        for pred in between:
+            self_pair &= op_funcs[pred.operation](self.values(pred.components[0], cand_rows),
+                                                  self.values(pred.components[1], cand_rows))
+        counts = counts - self_pair
+        counts[~np.isin(cand_rows, rel_rows)] = 0
+        return counts
+
+    def _relaxed_rows(self, constraint, predicates, join_rel, name):
+        """
+        _relaxed_rows yields (rows of join_rel, rows of the compared value)
+        of the tuples (t1 != t2 pairs for multi-tuple constraints) that
+        satisfy :param predicates:.
+        """
+        if len(constraint.tuple_names) == 1:
+            rows = self.filter_rows(predicates, np.arange(self.num_rows))
+            if len(rows):
+                yield rows, rows
+            return
+        other_rel = 't2' if join_rel == 't1' else 't1'
+        for rows1, rows2 in self.pairs(predicates, distinct=True):
+            rows = {'t1': rows1, 't2': rows2}
+            yield rows[join_rel], rows[other_rel] if name == other_rel else rows[join_rel]
+
+
+class EncodedEvaluator:
+    """
+    EncodedEvaluator evaluates compiled predicates (see dcparser.ir) over
+    the dictionary-encoded raw data (EncodedTable) with NumPy instead of
+    SQL or string comparisons.
+
+    A comparison of two attributes is a comparison of the int ranks of
+    their values, looked up by code in one rank table per attribute (ranks
+    are shared by both attributes so they compare like the values). A
+    comparison with a constant is a boolean table over the dictionary of
+    the attribute, looked up by code. Every predicate is thus evaluated
+    once per distinct value and then gathered by code.
+    """
+    def __init__(self, encoded):
+        """
+        :param encoded: (EncodedTable) the dictionary-encoded raw data.
+        """
+        self.encoded = encoded
+        self.num_rows = len(encoded)
+        self._rank_luts = {}
+        self._const_luts = {}
+
+    def rank_luts(self, attr1, attr2):
+        """
+        rank_luts returns the rank tables (code -> rank) of :param attr1:
+        and :param attr2: over the union of their values.
+        """
+        key = (attr1, attr2)
+        if key not in self._rank_luts:
+            ranks = rank_values(self.encoded.dicts[attr1].values, self.encoded.dicts[attr2].values)
+            self._rank_luts[key] = tuple(ranks)
+        return self._rank_luts[key]
+
+    def const_lut(self, attr, op, const):
+        """
+        const_lut returns the table (code -> bool) of "value :param op:
+        :param const:" for the values of :param attr:.
+        """
+        key = (attr, op, const)
+        if key not in self._const_luts:
+            values = self.encoded.dicts[attr].decode(np.arange(len(self.encoded.dicts[attr])))
+            self._const_luts[key] = np.asarray(op_funcs[op](values, const), dtype=bool)
+        return self._const_luts[key]
+
+    def mask(self, pred, rows):
+        """
+        mask returns whether the compiled predicate :param pred:
+        (PredicateIR) holds for the tuples :param rows: (list of row index
+        arrays of the same length, one per tuple of the constraint).
+        """
+        left, op, right = pred.left, pred.op, pred.right
+        if left.is_const:
+            left, op, right = right, get_flip_operation(op), left
+        left_codes = self.encoded.column(left.attr)[rows[left.tuple_idx]]
+        if right.is_const:
+            return self.const_lut(left.attr, op, right.const)[left_codes]
+        right_codes = self.encoded.column(right.attr)[rows[right.tuple_idx]]
+        if left.attr == right.attr and op in ('=', '<>'):
+            return op_funcs[op](left_codes, right_codes)
+        left_lut, right_lut = self.rank_luts(left.attr, right.attr)
+        return op_funcs[op](left_lut[left_codes], right_lut[right_codes])
+
+    def filter_rows(self, preds, rows):
+        """
+        filter_rows returns the :param rows: (of a single tuple) for which
+        all single tuple predicates :param preds: hold.
+        """
+        for pred in preds:
+            if len(rows) == 0:
+                break
+            rows = rows[self.mask(pred, [rows] * (max(pred.tuple_idxs) + 1))]
+        return rows
+
+    def violations(self, ir):
+        """
+        violations returns the rows of the tuples that violate the single
+        tuple constraint :param ir: (ConstraintIR).
+        """
+        return self.filter_rows(ir.predicates, np.arange(self.num_rows))
+
+    def equality_keys(self, equalities, rows1, rows2):
+        """
+        equality_keys returns the block IDs of the tuples :param rows1: (t1)
+        and :param rows2: (t2) such that a t1 and a t2 satisfy all
+        :param equalities: (list[PredicateIR] between t1 and t2) iff they
+        are in the same block.
+        """
+        keys1, keys2 = [], []
+        for pred in equalities:
+            left, _, right = pred.operand_of(0)
+            codes1 = self.encoded.column(left.attr)[rows1]
+            codes2 = self.encoded.column(right.attr)[rows2]
+            if left.attr == right.attr:
+                keys1.append(codes1.astype(np.int64))
+                keys2.append(codes2.astype(np.int64))
+            else:
+                lut1, lut2 = self.rank_luts(left.attr, right.attr)
+                keys1.append(lut1[codes1])
+                keys2.append(lut2[codes2])
+        if len(equalities) == 1:
+            return keys1[0], keys2[0]
+        keys = np.concatenate([np.column_stack(keys1), np.column_stack(keys2)])
+        _, blocks = np.unique(keys, axis=0, return_inverse=True)
+        blocks = blocks.reshape(-1)
+        return blocks[:len(rows1)], blocks[len(rows1):]
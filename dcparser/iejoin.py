@@ -0,0 +1,109 @@
+import numpy as np
+
+# Operations that range_counts reduces to the order operations.
+ORDER_OPS = ('<', '<=', '>', '>=')
+
+
+def rank_values(*arrays):
+    """
+    rank_values returns the dense ranks of the values of :param arrays:
+    (one int64 array per input array) in one common order, so that the
+    ranks of two arrays compare like their values.
+    """
+    sizes = [len(arr) for arr in arrays]
+    values = np.concatenate([np.asarray(arr, dtype=object) for arr in arrays])
+    _, ranks = np.unique(values, return_inverse=True)
+    return np.split(ranks.reshape(-1).astype(np.int64), np.cumsum(sizes)[:-1])
+
+
+def _upper_keys(qvals, pvals, op):
+    """
+    _upper_keys returns (query keys, point keys) such that "q :param op: p"
+    holds iff point key >= query key, for the int ranks :param qvals: and
+    :param pvals:.
+    """
+    if op == '<':
+        return qvals + 1, pvals
+    if op == '<=':
+        return qvals, pvals
+    if op == '>':
+        return -qvals + 1, -pvals
+    if op == '>=':
+        return -qvals, -pvals
+    raise ValueError("unsupported order operation {}".format(op))
+
+
+def dominance_counts(qx, qy, px, py):
+    """
+    dominance_counts returns for every query i the # of points j with
+    px[j] >= qx[i] and py[j] >= qy[i] (int keys) in O(N log^2 N) for N
+    points and queries.
+
+    The points and queries are sorted by x (descending, points first on
+    ties) into one permutation array, so the points counted for a query
+    are exactly those before it whose y is >= its y. These are counted
+    level by level of a merge sort over the permutation: at every level
+    the queries in a right block search the sorted ys of the points in
+    the sibling left block, with a single (vectorized) searchsorted over
+    all blocks.
+    """
+    num_points, num_queries = len(px), len(qx)
+    counts = np.zeros(num_queries, dtype=np.int64)
+    if num_points == 0 or num_queries == 0:
+        return counts
+    xs = np.concatenate([px, qx])
+    ys = np.concatenate([py, qy]).astype(np.int64)
+    ys = ys - ys.min()
+    span = int(ys.max()) + 2
+    is_query = np.concatenate([np.zeros(num_points, dtype=bool), np.ones(num_queries, dtype=bool)])
+    order = np.lexsort((is_query, -xs))
+    pos = np.empty(len(order), dtype=np.int64)
+    pos[order] = np.arange(len(order))
+    ppos, qpos = pos[:num_points], pos[num_points:]
+    pys, qys = ys[:num_points], ys[num_points:]
+
+    level = 0
+    while (1 << level) < len(order):
+        # Points in left blocks, keyed by their parent block and y.
+        left = ((ppos >> level) & 1) == 0
+        keys = np.sort((ppos[left] >> (level + 1)) * span + pys[left])
+        right = ((qpos >> level) & 1) == 1
+        parent = (qpos[right] >> (level + 1)) * span
+        counts[right] += (np.searchsorted(keys, parent + span - 1, side='left') -
+                          np.searchsorted(keys, parent + qys[right], side='left'))
+        level += 1
+    return counts
+
+
+def range_counts(conditions, num_queries, num_points):
+    """
+    range_counts returns for every query i the # of points j for which all
+    :param conditions: hold, in O(N log N) (one order condition) or
+    O(N log^2 N) (two order conditions) for N points and queries instead of
+    comparing all pairs.
+
+    :param conditions: (list[(qvals, pvals, op)]) at most two conditions
+        "qvals[i] op pvals[j]" over int ranks (see rank_values) with op in
+        '<', '<=', '>', '>=', '=', '<>'. Equality and inequality conditions
+        are reduced to order conditions by inclusion-exclusion.
+    :param num_queries: (int) # of queries.
+    :param num_points: (int) # of points.
+    """
+    for idx, (qvals, pvals, op) in enumerate(conditions):
+        rest = conditions[:idx] + conditions[idx+1:]
+        if op == '<>':
+            return (range_counts(rest, num_queries, num_points) -
+                    range_counts(rest + [(qvals, pvals, '=')], num_queries, num_points))
+        if op == '=':
+            return (range_counts(rest + [(qvals, pvals, '<=')], num_queries, num_points) -
+                    range_counts(rest + [(qvals, pvals, '<')], num_queries, num_points))
+    keys = [_upper_keys(qvals, pvals, op) for qvals, pvals, op in conditions]
+    if not keys:
+        return np.full(num_queries, num_points, dtype=np.int64)
+    if len(keys) == 1:
+        qkeys, pkeys = keys[0]
+        return num_points - np.searchsorted(np.sort(pkeys), qkeys, side='left').astype(np.int64)
+    if len(keys) == 2:
+        (qx, px), (qy, py) = keys
+        return dominance_counts(qx, qy, px, py)
+    raise ValueError("range_counts supports at most two conditions, got {}".format(len(conditions)))
@@ -0,0 +1,183 @@
+import itertools
+
+from .operations import get_flip_operation
+
+# Kinds of compiled predicates (see PredicateIR.kind).
+CONSTANT = 'constant'
+EQUALITY = 'equality'
+INEQUALITY = 'inequality'
+
+
+class Operand:
+    """
+    Operand is one side of a compiled predicate: either the attribute
+    attr (at index attr_idx of the schema) of the tuple tuple_idx of the
+    constraint (0 for t1, 1 for t2, ...) or the constant const.
+    """
+    __slots__ = ('tuple_idx', 'attr', 'attr_idx', 'const')
+
+    def __init__(self, tuple_idx=None, attr=None, attr_idx=None, const=None):
+        self.tuple_idx = tuple_idx
+        self.attr = attr
+        self.attr_idx = attr_idx
+        self.const = const
+
+    @property
+    def is_const(self):
+        return self.tuple_idx is None
+
+    @classmethod
+    def from_component(cls, component, tuple_names, schema):
+        """
+        from_component compiles a Predicate component: ['t1', 'Attr'] or a
+        quoted literal e.g. "'value'".
+        """
+        if isinstance(component, str):
+            return cls(const=component[1:-1])
+        return cls(tuple_idx=tuple_names.index(component[0]), attr=component[1],
+                   attr_idx=list(schema).index(component[1]))
+
+    def key(self, rename=None):
+        """
+        key returns a hashable key of the operand with the tuple index
+        mapped by :param rename: (list, None for no renaming).
+        """
+        if self.is_const:
+            return (-1, self.const)
+        return (rename[self.tuple_idx] if rename else self.tuple_idx, self.attr)
+
+    def __repr__(self):
+        if self.is_const:
+            return repr(self.const)
+        return 't{}.{}'.format(self.tuple_idx + 1, self.attr)
+
+
+class PredicateIR:
+    """
+    PredicateIR is the compiled form of a Predicate: "left op right".
+
+    kind is CONSTANT if one operand is a constant, else EQUALITY for '='
+    and INEQUALITY for every other operation. cross_tuple is True for
+    predicates between two different tuples (e.g. t1.A = t2.A).
+    """
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+        if left.is_const or right.is_const:
+            self.kind = CONSTANT
+        elif op == '=':
+            self.kind = EQUALITY
+        else:
+            self.kind = INEQUALITY
+        self.tuple_idxs = sorted(set(operand.tuple_idx for operand in (left, right) if not operand.is_const))
+        self.cross_tuple = len(self.tuple_idxs) > 1
+
+    @classmethod
+    def from_predicate(cls, predicate, tuple_names, schema):
+        left, right = [Operand.from_component(comp, tuple_names, schema) for comp in predicate.components]
+        return cls(predicate.operation, left, right)
+
+    def operand_of(self, tuple_idx):
+        """
+        operand_of returns the operand of tuple :param tuple_idx: of a cross
+        tuple predicate and the operation oriented so that it is on the left.
+
+        :return: (Operand, op, Operand)
+        """
+        if self.left.tuple_idx == tuple_idx:
+            return self.left, self.op, self.right
+        return self.right, get_flip_operation(self.op), self.left
+
+    def key(self, rename=None):
+        """
+        key returns a hashable key of the predicate (see Operand.key) that
+        is the same for equivalent forms e.g. t1.A > t2.B and t2.B < t1.A.
+        """
+        left, op, right = self.left.key(rename), self.op, self.right.key(rename)
+        if op in ('>', '>='):
+            left, op, right = right, get_flip_operation(op), left
+        elif op in ('=', '<>') and right < left:
+            left, right = right, left
+        return left, op, right
+
+    def __repr__(self):
+        return '{} {} {}'.format(self.left, self.op, self.right)
+
+
+class ConstraintIR:
+    """
+    ConstraintIR is the compiled form of a DenialConstraint: its tuple
+    aliases and its predicates as PredicateIR, grouped by kind so that
+    evaluators can run the single tuple predicates as filters and join the
+    tuples on the equality predicates between them (see EncodedEvaluator).
+    """
+    def __init__(self, tuple_names, predicates):
+        self.tuple_names = list(tuple_names)
+        self.arity = len(self.tuple_names)
+        self.predicates = predicates
+
+    def single(self, tuple_idx):
+        """
+        single returns the predicates over the tuple :param tuple_idx: only.
+        """
+        return [pred for pred in self.predicates if pred.tuple_idxs == [tuple_idx]]
+
+    @property
+    def equalities(self):
+        """
+        equalities returns the equality predicates between two tuples.
+        """
+        return [pred for pred in self.predicates if pred.cross_tuple and pred.kind == EQUALITY]
+
+    @property
+    def inequalities(self):
+        """
+        inequalities returns the predicates between two tuples other than
+        equalities.
+        """
+        return [pred for pred in self.predicates if pred.cross_tuple and pred.kind == INEQUALITY]
+
+    def key(self, rename=None):
+        """
+        key returns a hashable key of the constraint: constraints with the
+        same key have the same predicates up to their order and form.
+        """
+        return self.arity, frozenset(pred.key(rename) for pred in self.predicates)
+
+    def implies(self, other):
+        """
+        implies returns True if every violation of the constraint :param
+        other: (ConstraintIR) also violates this constraint i.e. if the
+        predicates of this constraint are a subset of the predicates of
+        :param other: for some mapping of its tuples to the tuples of
+        :param other:.
+        """
+        _, preds = other.key()
+        for rename in itertools.permutations(range(other.arity), self.arity):
+            if self.key(rename)[1] <= preds:
+                return True
+        return False
+
+    def relaxation_key(self, pred_idx, tuple_name, attr, op, component):
+        """
+        relaxation_key returns a hashable key of the relaxation of the
+        predicate :param pred_idx: in which the domain values of the cells
+        of :param attr: of the tuple :param tuple_name: are compared with
+        :param op: to the Predicate component :param component: while all
+        other (fixed) predicates hold. Relaxations with the same key count
+        the same violations: their tuples are renamed so that the tuple of
+        the relaxed cells is t1.
+        """
+        tuple_idx = self.tuple_names.index(tuple_name)
+        rename = list(range(self.arity))
+        rename[0], rename[tuple_idx] = tuple_idx, 0
+        fixed = frozenset(pred.key(rename) for idx, pred in enumerate(self.predicates) if idx != pred_idx)
+        if isinstance(component, str):
+            other = (-1, component[1:-1])
+        else:
+            other = (rename[self.tuple_names.index(component[0])], component[1])
+        return self.arity, fixed, attr, op, other
+
+    def __repr__(self):
+        return ' & '.join(repr(pred) for pred in self.predicates)
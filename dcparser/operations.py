@@ -0,0 +1,23 @@
+# Operations of the denial constraint predicates, shared by the parser
+# (dcparser.constraint) and the compiled predicates (dcparser.ir).
+operationsArr = ['<>', '<=', '>=', '=', '<', '>']
+operationSign = ['IQ', 'LTE', 'GTE', 'EQ', 'LT', 'GT']
+
+
+def is_symmetric(operation):
+    if operation in set(['<>', '=']):
+        return True
+    return False
+
+
+def get_flip_operation(operation):
+    if operation == '<=':
+        return '>='
+    elif operation == '>=':
+        return '<='
+    elif operation == '<':
+        return '>'
+    elif operation == '>':
+        return '<'
+    else:
+        return operation
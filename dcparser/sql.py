@@ -0,0 +1,119 @@
+from string import Template
+
+# SQL counterpart of ConstraintEvaluator (see dcparser.evaluator): the
+# queries DBengine runs for the violations of denial constraints and for
+# the relaxed constraints of ConstraintFeaturizer.
+
+unary_violation_template = Template('SELECT t1._tid_ FROM "$table" as t1 WHERE $cond')
+multi_violation_template = Template('SELECT t1._tid_ FROM "$table" as t1 WHERE $cond1 $c EXISTS (SELECT t2._tid_ FROM "$table" as t2 WHERE $cond2)')
+
+# unary_template is used for constraints where the current predicate
+# used for detecting violations in pos_values have a reference to only
+# one relation's (e.g. t1) attribute on one side and a fixed constant
+# value on the other side of the comparison.
+unary_template = Template('SELECT _vid_, val_id, count(*) violations '
+                          'FROM   "$init_table" as t1, $pos_values as t2 '
+                          'WHERE  t1._tid_ = t2._tid_ '
+                          '  AND  t2.attribute = \'$rv_attr\' '
+                          '  AND  $orig_predicates '
+                          '  AND  t2.rv_val $operation $rv_val '
+                          'GROUP BY _vid_, val_id')
+
+# binary_template is used for constraints where the current predicate
+# used for detecting violations in pos_values have a reference to both
+# relations (t1, t2) i.e. no constant value in predicate.
+binary_template = Template('SELECT _vid_, val_id, count(*) violations '
+                           'FROM   "$init_table" as t1, "$init_table" as t2, $pos_values as t3 '
+                           'WHERE  t1._tid_ != t2._tid_ '
+                           '  AND  $join_rel._tid_ = t3._tid_ '
+                           '  AND  t3.attribute = \'$rv_attr\' '
+                           '  AND  $orig_predicates '
+                           '  AND  t3.rv_val $operation $rv_val '
+                           'GROUP BY _vid_, val_id')
+
+# ex_binary_template is used as a fallback for binary_template in case
+# binary_template takes too long to query. Instead of counting the # of violations
+# this returns simply a 0-1 indicator if the possible value violates the constraint.
+ex_binary_template = Template('SELECT _vid_, val_id, 1 violations '
+                              'FROM   "$init_table" as $join_rel, $pos_values as t3 '
+                              'WHERE  $join_rel._tid_ = t3._tid_ '
+                              '  AND  t3.attribute = \'$rv_attr\' '
+                              '  AND EXISTS (SELECT $other_rel._tid_ '
+                              '              FROM   "$init_table" AS $other_rel '
+                              '              WHERE  $join_rel._tid_ != $other_rel._tid_ '
+                              '                AND  $orig_predicates '
+                              '                AND  t3.rv_val $operation $rv_val)')
+
+
+def orig_cnf(predicates, idx):
+    """
+    orig_cnf returns the CNF form of the predicates that does not include
+    the predicate at index :param idx:.
+
+    This CNF is usually used for the left relation when counting violations.
+    """
+    orig_preds = predicates[:idx] + predicates[(idx+1):]
+    return " AND ".join([pred.cnf_form for pred in orig_preds])
+
+
+def violation_query(table, constraint):
+    """
+    violation_query returns the query of the _tid_'s of the tuples t1 of
+    :param table: that violate :param constraint: (with some other tuple t2
+    for two-tuple constraints).
+    """
+    if len(constraint.tuple_names) == 1:
+        return unary_violation_template.substitute(table=table, cond=constraint.cnf_form)
+    # Iterate over constraint predicates to identify cond1 and cond2
+    cond1_preds = []
+    cond2_preds = []
+    for pred in constraint.predicates:
+        if 't1' in pred.cnf_form:
+            if 't2' in pred.cnf_form:
+                cond2_preds.append(pred.cnf_form)
+            else:
+                cond1_preds.append(pred.cnf_form)
+        elif 't2' in pred.cnf_form:
+            cond2_preds.append(pred.cnf_form)
+        else:
+            raise Exception("ERROR in violation detector. Cannot ground mult-tuple template.")
+    cond1 = " AND ".join(cond1_preds)
+    cond2 = " AND ".join(cond2_preds)
+    return multi_violation_template.substitute(table=table, cond1=cond1, c='AND' if cond1 != '' else '',
+                                               cond2=cond2)
+
+
+def relaxed_queries(init_table, pos_values, constraint, pred_idx, join_rel, rv_attr, op, rv_val):
+    """
+    relaxed_queries returns the (query, backup query) of :param constraint:
+    relaxed on the predicate :param pred_idx: (see
+    ConstraintFeaturizer.generate_relaxed_predicates): the # of violations
+    of every domain value (in :param pos_values:) of the cells of
+    :param rv_attr: in tuple :param join_rel: when compared with
+    :param op: to the component :param rv_val:, and as backup query a 0-1
+    indicator of any violation (for predicates between t1 and t2 only,
+    '' otherwise).
+    """
+    cnf = orig_cnf(constraint.predicates, pred_idx)
+    # If there are no other predicates in the constraint, append TRUE to
+    # the WHERE condition. This avoids having multiple SQL templates.
+    if len(cnf) == 0:
+        cnf = 'TRUE'
+    if isinstance(rv_val, str):
+        # do not quote literals/constants in comparison
+        rv_sql = rv_val if rv_val.startswith('\'') else '"{}"'.format(rv_val)
+    else:
+        rv_sql = '{}."{}"'.format(rv_val[0], rv_val[1])
+    if len(constraint.tuple_names) == 1:
+        query = unary_template.substitute(init_table=init_table, pos_values=pos_values, orig_predicates=cnf,
+                                          rv_attr=rv_attr, operation=op, rv_val=rv_sql)
+        return query, ''
+    query = binary_template.substitute(init_table=init_table, pos_values=pos_values, join_rel=join_rel,
+                                       orig_predicates=cnf, rv_attr=rv_attr, operation=op, rv_val=rv_sql)
+    if isinstance(rv_val, str) or rv_val[0] == join_rel:
+        return query, ''
+    # fallback 0-1 query instead of count
+    ex_query = ex_binary_template.substitute(init_table=init_table, pos_values=pos_values, join_rel=join_rel,
+                                             orig_predicates=cnf, rv_attr=rv_attr, operation=op, rv_val=rv_sql,
+                                             other_rel=rv_val[0])
+    return query, ex_query
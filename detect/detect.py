@@ -1,6 +1,7 @@
 import logging
 import time
 
+import numpy as np
 import pandas as pd
 
 from dataset import AuxTables
@@ -10,42 +11,100 @@ class DetectEngine:
     def __init__(self, env, dataset):
         self.env = env
         self.ds = dataset
+        # Detector name -> { 'time': wall time in secs, 'cells': # of detected cells }
+        self.detector_stats = {}
 
     def detect_errors(self, detectors):
         """
         Detects errors using a list of detectors.
         :param detectors: (list) of ErrorDetector objects
         """
-        errors = []
-        tic_total = time.clock()
+        tic_total = time.time()
+
+        # Load the raw and encoded data once instead of in every detector
+        # thread.
+        self.ds.get_raw_data()
+        self.ds.get_encoded_data()
 
         # Initialize all error detectors.
         for detector in detectors:
             detector.setup(self.ds, self.env)
 
-        # Run detection using each detector.
-        for detector in detectors:
-            tic = time.clock()
-            error_df = detector.detect_noisy_cells()
-            toc = time.clock()
-            logging.debug("DONE with Error Detector: %s in %.2f secs", detector.name, toc-tic)
-            errors.append(error_df)
+        # Detectors that start worker processes run first on the main thread
+        # (see Detector.uses_processes). The others run concurrently: they
+        # mostly wait on Postgres or run NumPy code, both of which release
+        # the GIL.
+        results = {}
+        threaded = []
+        for idx, detector in enumerate(detectors):
+            if detector.uses_processes():
+                results[idx] = self._run_detector(detector)
+            else:
+                threaded.append(idx)
+        if self.env['threads'] <= 1 or len(threaded) <= 1:
+            for idx in threaded:
+                results[idx] = self._run_detector(detectors[idx])
+        else:
+            executor = self.ds.engine.task_executor()
+            futures = {idx: executor.submit(self._run_detector, detectors[idx]) for idx in threaded}
+            for idx, future in futures.items():
+                results[idx] = future.result()
+
+        self.detector_stats = {}
+        cids = []
+        for idx, detector in enumerate(detectors):
+            cid, secs = results[idx]
+            self.detector_stats[detector.name] = {'time': secs, 'cells': len(cid)}
+            logging.debug("DONE with Error Detector: %s in %.2f secs (%d cells)", detector.name, secs, len(cid))
+            cids.append(cid)
 
         # Get unique errors only that might have been detected from multiple detectors.
-        errors_df = pd.concat(errors, ignore_index=True).drop_duplicates().reset_index(drop=True)
-        errors_df['_cid_'] = errors_df.apply(lambda x: self.ds.get_cell_id(x['_tid_'], x['attribute']), axis=1)
+        errors_df = self.cells_df(np.unique(np.concatenate(cids)))
         logging.info("detected %d potentially erroneous cells", errors_df.shape[0])
 
         # Store errors to db.
         self.store_detected_errors(errors_df)
         status = "DONE with error detection."
-        toc_total = time.clock()
+        toc_total = time.time()
         detect_time = toc_total - tic_total
         return status, detect_time
 
+    def _run_detector(self, detector):
+        """
+        _run_detector returns the cell IDs of the cells detected by
+        :param detector: and its wall time.
+        """
+        tic = time.time()
+        error_df = detector.detect_noisy_cells()
+        return self.cell_ids(error_df), time.time() - tic
+
+    def cell_ids(self, errors_df):
+        """
+        cell_ids returns the cell IDs (see Dataset.get_cell_id) of the
+        cells (_tid_, attribute) of :param errors_df: as an int64 array.
+        """
+        attr_idx = errors_df['attribute'].map(self.ds.attr_to_idx)
+        if attr_idx.isnull().any():
+            unknown = sorted(set(errors_df['attribute'][attr_idx.isnull()]))
+            raise Exception("ERROR: detected errors in unknown attributes {}".format(unknown))
+        tids = np.asarray(errors_df['_tid_'], dtype=np.int64)
+        return tids * self.ds.attr_count + np.asarray(attr_idx, dtype=np.int64)
+
+    def cells_df(self, cids):
+        """
+        cells_df returns the DataFrame (_tid_, attribute, _cid_) of the
+        cells with the cell IDs :param cids:.
+        """
+        attrs = np.empty(self.ds.attr_count, dtype=object)
+        for attr, idx in self.ds.attr_to_idx.items():
+            attrs[idx] = attr
+        return pd.DataFrame({'_tid_': cids // self.ds.attr_count,
+                             'attribute': attrs[cids % self.ds.attr_count],
+                             '_cid_': cids},
+                            columns=['_tid_', 'attribute', '_cid_'])
+
     def store_detected_errors(self, errors_df):
         if errors_df.empty:
             raise Exception("ERROR: Detected errors dataframe is empty.")
         self.ds.generate_aux_table(AuxTables.dk_cells, errors_df, store=True)
         self.ds.aux_table[AuxTables.dk_cells].create_db_index(self.ds.engine, ['_cid_'])
-
@@ -22,6 +22,14 @@ class Detector:
     def setup(self, dataset, env):
         raise NotImplementedError
 
+    def uses_processes(self):
+        """
+        uses_processes returns whether detect_noisy_cells starts worker
+        processes. DetectEngine runs these detectors on the main thread:
+        forking while other threads hold locks can deadlock the children.
+        """
+        return False
+
     @abstractmethod
     def detect_noisy_cells(self):
         """
@@ -1,6 +1,6 @@
 import pandas as pd
 
-from dataset.table import Table, Source
+from dataset.table import Table, Source, source_from_path
 from .detector import Detector
 
 
@@ -18,7 +18,7 @@ class ErrorsLoaderDetector(Detector):
                  id_col="_tid_", attr_col="attribute", 
                  name="ErrorLoaderDetector"):
         """
-        :param fpath: (str) Path to source csv file to load errors
+        :param fpath: (str) Path to source csv (or Parquet/Arrow) file to load errors
         :param df: (DataFrame) datarame containing the errors
         :param db_engine: (DBEngine) Database engine object
         :param table_name: (str) Relational table considered for loading errors
@@ -36,7 +36,7 @@ class ErrorsLoaderDetector(Detector):
         dataset_name = None
         if fpath is not None:
             dataset_name = "errors_file"
-            src = Source.FILE
+            src = source_from_path(fpath)
         elif df is not None:
             dataset_name = "errors_df"
             src = Source.DF
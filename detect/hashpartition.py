@@ -0,0 +1,133 @@
+from multiprocessing import Pool
+
+import numpy as np
+
+from dcparser.evaluator import MAX_PAIRS
+
+# State of the pool workers of partitioned_violations (see _init_worker).
+# With the default fork start method the workers inherit it from the parent
+# instead of receiving a pickled copy.
+_shared = None
+
+
+def partitioned_violations(evaluator, constraint, processes=1, max_pairs=MAX_PAIRS):
+    """
+    partitioned_violations returns the sorted tuple IDs of the tuples t1 that
+    violate the two-tuple :param constraint: (the same result as
+    ConstraintEvaluator.violations) for a constraint with at least one
+    equality predicate between t1 and t2.
+
+    The tuples are grouped by the block IDs of their equality predicate
+    attributes (see EncodedEvaluator.equality_keys) and the other
+    predicates between t1 and t2 are only evaluated on the pairs within a
+    group. Groups are batched into tasks of about :param max_pairs: pairs
+    that are spread over :param processes: worker processes.
+
+    :param evaluator: (ConstraintEvaluator) over the raw data and its
+        encoded data.
+    """
+    ir = constraint.ir
+    if not ir.equalities:
+        raise ValueError("partitioned_violations requires an equality predicate between t1 and t2: {}"
+                         .format(constraint.cnf_form))
+    if evaluator.encoded is None:
+        raise ValueError("partitioned_violations requires a ConstraintEvaluator over the encoded data")
+    encoded = evaluator.encoded
+    all_rows = np.arange(evaluator.num_rows)
+    rows1 = encoded.filter_rows(ir.single(0), all_rows)
+    rows2 = encoded.filter_rows(ir.single(1), all_rows)
+    gid1, gid2 = encoded.equality_keys(ir.equalities, rows1, rows2)
+    # Groups with tuples on both sides.
+    groups = np.intersect1d(gid1, gid2)
+    rows1, gid1 = rows1[np.isin(gid1, groups)], gid1[np.isin(gid1, groups)]
+    rows2, gid2 = rows2[np.isin(gid2, groups)], gid2[np.isin(gid2, groups)]
+    if len(rows1) == 0:
+        return np.empty(0, dtype=evaluator.tids.dtype)
+    theta = ir.inequalities
+    if not theta:
+        # Every t1 with a matching t2 violates the constraint.
+        return np.sort(evaluator.tids[rows1])
+
+    order1 = np.argsort(gid1, kind='mergesort')
+    order2 = np.argsort(gid2, kind='mergesort')
+    sorted1, sorted2 = rows1[order1], rows2[order2]
+    _, start1, count1 = np.unique(gid1[order1], return_index=True, return_counts=True)
+    _, start2, count2 = np.unique(gid2[order2], return_index=True, return_counts=True)
+    state = (encoded, theta, sorted1, sorted2, start1, count1, start2, count2)
+    tasks = _tasks(count1, count2, max_pairs)
+    if processes <= 1 or len(tasks) <= 1:
+        _init_worker(state)
+        try:
+            results = [_worker(task) for task in tasks]
+        finally:
+            _init_worker(None)
+    else:
+        processes = min(processes, len(tasks))
+        pool = Pool(processes, initializer=_init_worker, initargs=(state,))
+        try:
+            results = pool.map(_worker, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    rows = np.unique(np.concatenate(results)) if results else np.empty(0, dtype=np.int64)
+    return np.sort(evaluator.tids[rows])
+
+
+def _tasks(count1, count2, max_pairs):
+    """
+    _tasks batches consecutive groups into tasks (first group, last group,
+    first t1 offset, last t1 offset) of about :param max_pairs: pairs. The
+    t1 tuples of a group larger than :param max_pairs: are split over
+    several tasks.
+    """
+    tasks = []
+    first, pairs = 0, 0
+    for group in range(len(count1)):
+        group_pairs = int(count1[group]) * int(count2[group])
+        if group_pairs > max_pairs:
+            if group > first:
+                tasks.append((first, group, 0, None))
+            step = max(1, max_pairs // int(count2[group]))
+            for offset in range(0, int(count1[group]), step):
+                tasks.append((group, group + 1, offset, offset + step))
+            first, pairs = group + 1, 0
+            continue
+        if pairs + group_pairs > max_pairs and group > first:
+            tasks.append((first, group, 0, None))
+            first, pairs = group, 0
+        pairs += group_pairs
+    if first < len(count1):
+        tasks.append((first, len(count1), 0, None))
+    return tasks
+
+
+def _init_worker(state):
+    global _shared
+    _shared = state
+
+
+def _worker(task):
+    """
+    _worker returns the rows of the t1 tuples of the groups of :param task:
+    that have a t2 in their group for which all predicates hold.
+    """
+    encoded, theta, sorted1, sorted2, start1, count1, start2, count2 = _shared
+    first, last, offset, end = task
+    start1, count1 = start1[first:last], count1[first:last]
+    start2, count2 = start2[first:last], count2[first:last]
+    if end is not None:
+        # Slice of the t1 tuples of a single large group.
+        start1 = start1 + offset
+        count1 = np.minimum(count1 - offset, end - offset)
+    # Enumerate the pairs of every group: pair p of group g is the
+    # (p // count2[g])-th t1 and the (p % count2[g])-th t2 of g.
+    group_pairs = count1 * count2
+    group = np.repeat(np.arange(len(group_pairs)), group_pairs)
+    pos = np.arange(group_pairs.sum()) - np.repeat(np.cumsum(group_pairs) - group_pairs, group_pairs)
+    pair_rows1 = sorted1[start1[group] + pos // count2[group]]
+    pair_rows2 = sorted2[start2[group] + pos % count2[group]]
+    mask = np.ones(len(pair_rows1), dtype=bool)
+    for pred in theta:
+        mask &= encoded.mask(pred, [pair_rows1, pair_rows2])
+    return np.unique(pair_rows1[mask])
+
@@ -1,7 +1,7 @@
 import pandas as pd
 
 from .detector import Detector
-from utils import NULL_REPR
+from utils import NULL_CODE
 
 
 class NullDetector(Detector):
@@ -15,7 +15,7 @@ class NullDetector(Detector):
     def setup(self, dataset, env):
         self.ds = dataset
         self.env = env
-        self.df = self.ds.get_raw_data()
+        self.encoded = self.ds.get_encoded_data()
 
     def detect_noisy_cells(self):
         """
@@ -29,7 +29,8 @@ class NullDetector(Detector):
         attributes = self.ds.get_attributes()
         errors = []
         for attr in attributes:
-            tmp_df = self.df[self.df[attr] == NULL_REPR]['_tid_'].to_frame()
+            tids = self.encoded.tids[self.encoded.column(attr) == NULL_CODE]
+            tmp_df = pd.DataFrame({'_tid_': tids})
             tmp_df.insert(1, "attribute", attr)
             errors.append(tmp_df)
         errors_df = pd.concat(errors, ignore_index=True)
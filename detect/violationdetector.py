@@ -1,11 +1,11 @@
-from string import Template
+import time
 
+import numpy as np
 import pandas as pd
 
 from .detector import Detector
-
-unary_template = Template('SELECT t1._tid_ FROM "$table" as t1 WHERE $cond')
-multi_template = Template('SELECT t1._tid_ FROM "$table" as t1 WHERE $cond1 $c EXISTS (SELECT t2._tid_ FROM "$table" as t2 WHERE $cond2)')
+from .hashpartition import partitioned_violations
+from dcparser import Parser
 
 
 class ViolationDetector(Detector):
@@ -13,13 +13,27 @@ class ViolationDetector(Detector):
     Detector to detect violations of integrity constraints (mainly denial constraints).
     """
 
-    def __init__(self, name='ViolationDetector'):
+    def __init__(self, name='ViolationDetector', partitioned=False):
+        """
+        :param partitioned: (bool) evaluate the constraints in memory instead
+            of in Postgres. Two-tuple constraints with an equality predicate
+            between t1 and t2 (e.g. FDs) are evaluated within hash partitions
+            of the tuples (see partitioned_violations) in env['threads']
+            processes instead of as EXISTS self-joins.
+        """
         super(ViolationDetector, self).__init__(name)
+        self.partitioned = partitioned
 
     def setup(self, dataset, env):
         self.ds = dataset
         self.env = env
-        self.constraints = dataset.constraints
+        # Duplicate constraints detect the same cells: run them once.
+        firsts, _ = Parser.group_constraints(dataset.constraints)
+        self.constraints = [dataset.constraints[idx] for idx in firsts]
+        self.processes = env['threads']
+
+    def uses_processes(self):
+        return self.partitioned and self.processes > 1
 
     def detect_noisy_cells(self):
         """
@@ -30,72 +44,34 @@ class ViolationDetector(Detector):
             _tid_: entity ID
             attribute: attribute violating any denial constraint.
         """
-        # Convert  Constraints to SQL queries
-        tbl = self.ds.raw_data.name
-        queries = []
-        attrs = []
-        for c in self.constraints:
-            q = self.to_sql(tbl, c)
-            queries.append(q)
-            attrs.append(c.components)
-        # Execute Queries over the DBEngine of Dataset
-        results = self.ds.engine.execute_queries(queries)
-
-        # Generate final output
+        if self.partitioned:
+            violations = self._partitioned_violations()
+        else:
+            # Generate the output of each constraint as soon as it completes.
+            violations = self.ds.engine.violations(self.ds, self.constraints, tag=self.name)
         errors = []
-        for i in range(len(attrs)):
-            res = results[i]
-            attr_list = attrs[i]
-            tmp_df = self.gen_tid_attr_output(res, attr_list)
-            errors.append(tmp_df)
+        for idx, tids in violations:
+            attrs = self.constraints[idx].components
+            errors.append(pd.DataFrame({'_tid_': np.repeat(tids, len(attrs)),
+                                        'attribute': np.tile(attrs, len(tids))},
+                                       columns=['_tid_', 'attribute']))
         errors_df = pd.concat(errors, ignore_index=True).drop_duplicates().reset_index(drop=True)
         return errors_df
 
-    def to_sql(self, tbl, c):
-        # Check tuples in constraint
-        unary = len(c.tuple_names)==1
-        if unary:
-            query = self.gen_unary_query(tbl, c)
-        else:
-            query = self.gen_mult_query(tbl, c)
-        return query
-
-    def gen_unary_query(self, tbl, c):
-        query = unary_template.substitute(table=tbl, cond=c.cnf_form)
-        return query
-
-    def gen_mult_query(self, tbl, c):
-        # Iterate over constraint predicates to identify cond1 and cond2
-        cond1_preds = []
-        cond2_preds = []
-        for pred in c.predicates:
-            if 't1' in pred.cnf_form:
-                if 't2' in pred.cnf_form:
-                    cond2_preds.append(pred.cnf_form)
-                else:
-                    cond1_preds.append(pred.cnf_form)
-            elif 't2' in pred.cnf_form:
-                cond2_preds.append(pred.cnf_form)
+    def _partitioned_violations(self):
+        """
+        _partitioned_violations yields (index in self.constraints, _tid_'s of
+        the violating tuples) of the constraints evaluated in memory (see
+        ConstraintEvaluator): two-tuple constraints with an equality
+        predicate between t1 and t2 within hash partitions of the tuples
+        (see partitioned_violations).
+        """
+        evaluator = self.ds.get_constraint_evaluator()
+        for idx, c in enumerate(self.constraints):
+            tic = time.time()
+            if c.ir.arity > 1 and c.ir.equalities:
+                tids = partitioned_violations(evaluator, c, processes=self.processes)
             else:
-                raise Exception("ERROR in violation detector. Cannot ground mult-tuple template.")
-        cond1 = " AND ".join(cond1_preds)
-        cond2 = " AND ".join(cond2_preds)
-        a = ','.join(c.components)
-        a = []
-        for b in c.components:
-            a.append("'"+b+"'")
-        a = ','.join(a)
-        if cond1 != '':
-            query = multi_template.substitute(table=tbl, cond1=cond1, c='AND', cond2=cond2)
-        else:
-            query = multi_template.substitute(table=tbl, cond1=cond1, c='', cond2=cond2)
-        return query
-
-    def gen_tid_attr_output(self, res, attr_list):
-        errors = []
-        for tuple in res:
-            tid = int(tuple[0])
-            for attr in attr_list:
-                errors.append({'_tid_': tid, 'attribute': attr})
-        error_df  = pd.DataFrame(data=errors)
-        return error_df
+                tids = evaluator.violations(c)
+            self.ds.engine.query_log.record(c.cnf_form, time.time() - tic, rows=len(tids), tag=self.name)
+            yield idx, tids
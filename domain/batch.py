@@ -0,0 +1,235 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import NULL_CODE
+
+# Max # of rows whose candidate domains are built at once (see batch_domains).
+CHUNK_ROWS = 1 << 16
+
+
+def candidate_table(encoded, candidates, cond_attr, attr):
+    """
+    candidate_table converts the pruned co-occurrence candidates
+    :param candidates: ({ value of cond_attr -> [values of attr] }, see
+    DomainEngine._pruned_pair_stats) to a CSR table over the value codes of
+    :param encoded: (EncodedTable): the candidate codes of :param attr: for
+    the code c of :param cond_attr: are indices[indptr[c]:indptr[c + 1]].
+
+    :return: (indptr, indices) int64 arrays.
+    """
+    cond_dict, attr_dict = encoded.dicts[cond_attr], encoded.dicts[attr]
+    lengths = np.zeros(len(cond_dict), dtype=np.int64)
+    items = sorted((cond_dict.code(val), vals) for val, vals in candidates.items() if val in cond_dict)
+    for code, vals in items:
+        lengths[code] = len(vals)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    indices = np.array([attr_dict.code(val) for _, vals in items for val in vals], dtype=np.int64)
+    return indptr, indices
+
+
+def sort_ranks(encoded, attr):
+    """
+    sort_ranks returns the rank (code -> position in the sorted values) of
+    every value code of :param attr: and the values in sorted order.
+    """
+    values = encoded.dicts[attr].decode(np.arange(len(encoded.dicts[attr])))
+    order = np.argsort(values, kind='stable')
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    return ranks, values[order]
+
+
+class ContextCache:
+    """
+    ContextCache is a bounded LRU cache of the candidate codes of an
+    attribute for a context: the codes of the values of its correlated
+    attributes in a row (see context_candidates). Rows with the same
+    context have the same candidates, so domain generation only computes
+    them once per distinct context.
+
+    Entries are keyed by (attr, code of cond_attr_1, code of cond_attr_2,
+    ...). The least recently used entry is evicted once the cache holds
+    max_size entries.
+    """
+    def __init__(self, max_size):
+        """
+        :param max_size: (int) max # of entries, 0 disables the cache.
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        get returns the entry of :param key: (and marks it as most recently
+        used) or None on a miss.
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        clear removes all entries, e.g. after the candidates changed. The
+        counters are kept.
+        """
+        self.entries.clear()
+
+    def counts(self):
+        return self.hits, self.misses, self.evictions
+
+    def add_counts(self, hits, misses, evictions):
+        """
+        add_counts adds the counters of a copy of the cache (e.g. of a
+        worker process, see DomainEngine.generate_domain).
+        """
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+
+    def stats(self):
+        """
+        stats returns the # of cache hits, misses, evictions and entries
+        and the hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.entries), 'hit_rate': float(self.hits) / lookups if lookups else 0.0}
+
+
+def context_candidates(encoded, attr, tables, contexts, cache=None):
+    """
+    context_candidates returns the candidate codes of :param attr: of every
+    context in :param contexts: (int64 matrix: one row per context, one
+    column per correlated attribute of :param tables: in order): the union
+    of the candidates of the codes of the correlated attributes, sorted by
+    code. The candidates are looked up in :param cache: (ContextCache) and
+    only computed for the contexts that miss it.
+
+    :param tables: (dict { cond_attr -> (indptr, indices) }) the candidate
+        tables (see candidate_table) of the correlated attributes.
+    :return: (list of int64 arrays) the candidate codes of every context.
+    """
+    keys = [(attr,) + tuple(context) for context in contexts.tolist()]
+    found = [cache.get(key) for key in keys] if cache is not None else [None] * len(keys)
+    missing = [idx for idx, candidates in enumerate(found) if candidates is None]
+    if not missing:
+        return found
+    missing_contexts = contexts[missing]
+    num_codes = len(encoded.dicts[attr])
+    context_ids = np.arange(len(missing))
+    # (context, candidate code) of every candidate of every context.
+    context_parts, code_parts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for col, (indptr, indices) in enumerate(tables.values()):
+        cond_codes = missing_contexts[:, col]
+        lengths = indptr[cond_codes + 1] - indptr[cond_codes]
+        lengths[cond_codes == NULL_CODE] = 0
+        pos = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        context_parts.append(np.repeat(context_ids, lengths))
+        code_parts.append(indices[np.repeat(indptr[cond_codes], lengths) + pos])
+    keys_codes = np.unique(np.concatenate(context_parts) * num_codes + np.concatenate(code_parts))
+    bounds = np.searchsorted(keys_codes // num_codes, np.arange(len(missing) + 1))
+    codes = keys_codes % num_codes
+    for context_id, idx in enumerate(missing):
+        found[idx] = codes[bounds[context_id]:bounds[context_id + 1]].copy()
+        if cache is not None:
+            cache.put(keys[idx], found[idx])
+    return found
+
+
+def unique_rows(matrix, radices):
+    """
+    unique_rows returns the distinct rows of the int64 :param matrix:
+    (whose column j holds codes < :param radices:[j]) in lexicographic
+    order and the index of the distinct row of every row. Rows are packed
+    into a single int64 key when the codes fit (np.unique with axis=0 sorts
+    much slower).
+    """
+    if int(np.prod([max(radix, 1) for radix in radices], dtype=object)) >= 1 << 63:
+        uniques, inverse = np.unique(matrix, axis=0, return_inverse=True)
+        return uniques, inverse.reshape(-1)
+    keys = np.zeros(len(matrix), dtype=np.int64)
+    for col, radix in enumerate(radices):
+        keys = keys * radix + matrix[:, col]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return matrix[first], inverse.reshape(-1)
+
+
+def batch_domains(encoded, attr, tables, rows, chunk_rows=CHUNK_ROWS, cache=None):
+    """
+    batch_domains returns the initial domains of the cells of :param attr:
+    in the rows :param rows: (row indexes): the union of the candidates of
+    the values of the correlated attributes and the initial value (unless
+    NULL), sorted. It computes the same domains as the original per-cell
+    loop (reference_domain_cell in benchmarks/domain_benchmark.py) for all
+    cells at once.
+
+    The cells are grouped by their context (the codes of the correlated
+    attributes, see context_candidates) and initial value: the candidates
+    are computed (or looked up in :param cache:) once per distinct context
+    and the sorted domain is built once per group by sorting the int keys
+    (group, rank of the value), so the cost grows with the # of distinct
+    contexts rather than with the # of rows.
+
+    :param tables: (dict { cond_attr -> (indptr, indices) }) the candidate
+        tables (see candidate_table) of the correlated attributes.
+    :param cache: (ContextCache) cache of the candidates of the contexts.
+    :return: (list[str] ||| separated sorted domain of every cell, int64
+        array of the domain size of every cell, int64 array of the index of
+        the initial value in the domain or -1 if it is NULL)
+    """
+    ranks, sorted_values = sort_ranks(encoded, attr)
+    sorted_values = sorted_values.tolist()
+    num_values = len(ranks)
+    columns = [encoded.column(cond_attr) for cond_attr in tables] + [encoded.column(attr)]
+    radices = [len(encoded.dicts[cond_attr]) for cond_attr in tables] + [num_values]
+    domains, sizes, init_idxs = [], [], []
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        # Distinct (context, initial value) groups of the cells and the
+        # distinct contexts of the groups.
+        cells = np.stack([column[chunk] for column in columns], axis=1).astype(np.int64)
+        groups, group_of_cell = unique_rows(cells, radices)
+        contexts, context_of_group = unique_rows(groups[:, :-1], radices[:-1])
+        candidates = context_candidates(encoded, attr, tables, contexts, cache)
+        lengths = np.array([len(codes) for codes in candidates], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        indices = np.concatenate([np.empty(0, dtype=np.int64)] + candidates)
+        # (group, code) of the candidates and the initial value of every group.
+        group_ids = np.arange(len(groups))
+        lengths = lengths[context_of_group]
+        pos = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        init = groups[:, -1]
+        has_init = init != NULL_CODE
+        group_parts = np.concatenate([np.repeat(group_ids, lengths), group_ids[has_init]])
+        code_parts = np.concatenate([indices[np.repeat(indptr[context_of_group], lengths) + pos], init[has_init]])
+        # Sort by (group, rank of the value) and drop the duplicates.
+        keys = np.unique(group_parts * num_values + ranks[code_parts])
+        bounds = np.searchsorted(keys // num_values, np.arange(len(groups) + 1))
+        values = [sorted_values[rank] for rank in (keys % num_values).tolist()]
+        group_domains = ['|||'.join(values[begin:end])
+                         for begin, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+        init_idx = np.searchsorted(keys, group_ids * num_values + ranks[init]) - bounds[:-1]
+        group_init_idxs = np.where(has_init, init_idx, -1)
+        domains.extend(group_domains[group] for group in group_of_cell.tolist())
+        sizes.append(np.diff(bounds)[group_of_cell])
+        init_idxs.append(group_init_idxs[group_of_cell])
+    if not sizes:
+        return domains, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return domains, np.concatenate(sizes), np.concatenate(init_idxs)
@@ -1,15 +1,25 @@
 import logging
+import multiprocessing
 import pandas as pd
 import time
 
-import itertools
 import numpy as np
-from pyitlib import discrete_random_variable as drv
 from tqdm import tqdm
 
-from dataset import AuxTables, CellStatus
+from dataset import AuxTables
+from dataset.stats import EntropyStats
+from .batch import ContextCache, candidate_table
 from .estimators import NaiveBayes
-from utils import NULL_REPR
+from .generator import DOMAIN_COLUMNS, DomainGenerator
+from utils import NULL_CODE
+
+# Rows per shard of generate_domain. It does not depend on the # of workers
+# so that the random domains (seeded per shard) do not either.
+SHARD_ROWS = 1 << 14
+
+# DomainGenerator of the pool workers of generate_domain (see
+# _init_shard_worker).
+_generator = None
 
 
 class DomainEngine:
@@ -32,10 +42,21 @@ class DomainEngine:
         self.correlations = None
         self._corr_attrs = {}
         self.cor_strength = env["cor_strength"]
+        self.needed_pairs_only = env["stats_needed_pairs_only"]
         self.max_sample = max_sample
         self.single_stats = {}
         self.pair_stats = {}
         self.all_attrs = {}
+        # Worker processes and rows per shard of generate_domain.
+        self.processes = env['threads']
+        self.shard_rows = SHARD_ROWS
+        # Candidate tables (see _candidate_tables) and candidates of the
+        # contexts (see batch.context_candidates) of the active attributes.
+        # Both are cleared whenever the pruned statistics change.
+        self._candidate_tables_memo = {}
+        self.context_cache = ContextCache(env['domain_cache_size'])
+        # EntropyStats of the correlations (see compute_correlations).
+        self._entropy_stats = None
 
     def setup(self):
         """
@@ -56,55 +77,31 @@ class DomainEngine:
         compute_correlations memoizes to self.correlations; a data structure
         that contains pairwise correlations between attributes (values are treated as
         discrete categories).
-        """
-        self.correlations = self._compute_norm_cond_entropy_corr()
-
-    def _compute_norm_cond_entropy_corr(self):
-        """
-        Computes the correlations between attributes by calculating
-        the normalized conditional entropy between them. The conditional
-        entropy is asymmetric, therefore we need pairwise computation.
 
-        The computed correlations are stored in a dictionary in the format:
+        The correlations are the normalized conditional entropies between
+        attributes (see EntropyStats.correlations), in the format:
         {
           attr_a: { cond_attr_i: corr_strength_a_i,
                     cond_attr_j: corr_strength_a_j, ... },
           attr_b: { cond_attr_i: corr_strength_b_i, ...}
         }
 
-        :return a dictionary of correlations
+        The entropy sums are kept in self._entropy_stats so that appends
+        only update them with the new tuples (see update_domain).
         """
-        data_df = self.ds.get_raw_data()
-        attrs = self.ds.get_attributes()
-
-        corr = {}
-        # Compute pair-wise conditional entropy.
-        for x in attrs:
-            corr[x] = {}
-            x_vals = data_df[x]
-            x_domain_size = x_vals.nunique()
-            for y in attrs:
-                # Set correlation to 0.0 if entropy of x is 1 (only one possible value).
-                if x_domain_size == 1:
-                    corr[x][y] = 0.0
-                    continue
-
-                # Set correlation to 1 for same attributes.
-                if x == y:
-                    corr[x][y] = 1.0
-                    continue
-
-                # Compute the conditional entropy H(x|y) = H(x,y) - H(y).
-                # H(x,y) denotes H(x U y).
-                # If H(x|y) = 0, then y determines x, i.e., y -> x.
-                # Use the domain size of x as a log base for normalization.
-                y_vals = data_df[y]
-                x_y_entropy = drv.entropy_conditional(x_vals, y_vals, base=x_domain_size)
-
-                # The conditional entropy is 0 for strongly correlated attributes and 1 for
-                # completely independent attributes. We reverse this to reflect the correlation.
-                corr[x][y] = 1.0 - x_y_entropy
-        return corr
+        cache = self.ds.cache
+        encoded = self.ds.get_encoded_data()
+        self._entropy_stats = None
+        if cache is not None:
+            key = self.ds.cache_key('entropy_stats')
+            arrays = cache.load(key)
+            if arrays is not None:
+                self._entropy_stats = EntropyStats.from_arrays(encoded, arrays)
+        if self._entropy_stats is None:
+            self._entropy_stats = EntropyStats(encoded)
+            if cache is not None:
+                cache.store(key, self._entropy_stats.to_arrays())
+        self.correlations = self._entropy_stats.correlations()
 
     def store_domains(self, domain):
         """
@@ -125,47 +122,71 @@ class DomainEngine:
             self.ds.generate_aux_table(AuxTables.cell_domain, domain, store=True, index_attrs=['_vid_'])
             self.ds.aux_table[AuxTables.cell_domain].create_db_index(self.ds.engine, ['_tid_'])
             self.ds.aux_table[AuxTables.cell_domain].create_db_index(self.ds.engine, ['_cid_'])
-            query = "SELECT _vid_, _cid_, _tid_, attribute, a.rv_val, a.val_id from %s , unnest(string_to_array(regexp_replace(domain,\'[{\"\"}]\',\'\',\'gi\'),\'|||\')) WITH ORDINALITY a(rv_val,val_id)" % AuxTables.cell_domain.name
-            self.ds.generate_aux_table_sql(AuxTables.pos_values, query, index_attrs=['_tid_', 'attribute'])
+            self.ds.engine.create_pos_values(AuxTables.pos_values.name, AuxTables.cell_domain.name)
+            self.ds.register_aux_table(AuxTables.pos_values, index_attrs=['_tid_', 'attribute'])
 
     def setup_attributes(self):
         self.active_attributes = self.get_active_attributes()
-        total, single_stats, pair_stats = self.ds.get_statistics()
+        stats_pairs, domain_pairs = None, None
+        if self.needed_pairs_only:
+            # Domain generation and the Naive Bayes estimator only read the
+            # pairs of active attributes with their correlated attributes.
+            thres = min(self.cor_strength, self.env['nb_cor_strength'])
+            stats_pairs = [(attr, corr_attr) for attr in self.active_attributes
+                           for corr_attr in self.get_corr_attributes(attr, thres)]
+            domain_pairs = [(corr_attr, attr) for attr in self.active_attributes
+                            for corr_attr in self.get_corr_attributes(attr, self.cor_strength)]
+        total, single_stats, pair_stats = self.ds.get_statistics(stats_pairs)
         self.total = total
         self.single_stats = single_stats
+        self._clear_candidates()
         logging.debug("preparing pruned co-occurring statistics...")
-        tic = time.clock()
-        self.pair_stats = self._pruned_pair_stats(pair_stats)
-        logging.debug("DONE with pruned co-occurring statistics in %.2f secs", time.clock() - tic)
+        tic = time.time()
+        self.pair_stats = self._pruned_pair_stats(pair_stats, domain_pairs)
+        logging.debug("DONE with pruned co-occurring statistics in %.2f secs", time.time() - tic)
         self.setup_complete = True
 
-    def _pruned_pair_stats(self, pair_stats):
+    def _pruned_pair_stats(self, pair_stats, pairs=None):
         """
-        _pruned_pair_stats converts 'pair_stats' which is a dictionary mapping
-            { attr1 -> { attr2 -> {val1 -> {val2 -> count } } } } where
-              <val1>: all possible values for attr1
-              <val2>: all values for attr2 that appeared at least once with <val1>
-              <count>: frequency (# of entities) where attr1: <val1> AND attr2: <val2>
+        _pruned_pair_stats converts 'pair_stats' (PairStats) which holds for
+        every pair of attributes attr1, attr2 a sparse matrix of counts where
+        entry (val1, val2) is the frequency (# of entities) where attr1: <val1>
+        AND attr2: <val2>
 
         to a flattened 4-level dictionary { attr1 -> { attr2 -> { val1 -> [pruned list of val2] } } }
         i.e. maps to the co-occurring values for attr2 that exceed
         the self.domain_thresh_1 co-occurrence probability for a given
         attr1-val1 pair.
-        """
 
-        out = {}
-        for attr1 in tqdm(pair_stats.keys()):
-            out[attr1] = {}
-            for attr2 in pair_stats[attr1].keys():
-                out[attr1][attr2] = {}
-                for val1 in pair_stats[attr1][attr2].keys():
-                    denominator = self.single_stats[attr1][val1]
-                    # tau becomes a threshhold on co-occurrence frequency
-                    # based on the co-occurrence probability threshold
-                    # domain_thresh_1.
-                    tau = float(self.domain_thresh_1*denominator)
-                    top_cands = [val2 for (val2, count) in pair_stats[attr1][attr2][val1].items() if count > tau]
-                    out[attr1][attr2][val1] = top_cands
+        :param pairs: (list[(attr1, attr2)]) if not None, only these pairs
+            are pruned instead of every pair of attributes.
+        """
+        encoded = self.ds.get_encoded_data()
+        attrs = self.ds.get_attributes()
+        if pairs is None:
+            pairs = [(attr1, attr2) for attr1 in attrs for attr2 in attrs]
+        out = {attr: {} for attr in attrs}
+        for attr1, attr2 in tqdm(pairs):
+            if attr1 == attr2 or attr2 in out[attr1]:
+                continue
+            counts = pair_stats.csr(attr1, attr2)
+            row_codes = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+            col_codes = counts.indices
+            # Ignore co-occurrences with NULL values.
+            not_null = (row_codes != NULL_CODE) & (col_codes != NULL_CODE) & (counts.data > 0)
+            row_codes, col_codes, data = row_codes[not_null], col_codes[not_null], counts.data[not_null]
+            # The frequency of val1 is the sum of its row (including NULLs).
+            denominator = np.asarray(counts.sum(axis=1)).ravel()
+            # tau becomes a threshhold on co-occurrence frequency
+            # based on the co-occurrence probability threshold
+            # domain_thresh_1.
+            tau = self.domain_thresh_1 * denominator[row_codes].astype(float)
+            top = data > tau
+            vals1 = encoded.decode(attr1, row_codes)
+            vals2 = encoded.decode(attr2, col_codes)
+            out[attr1][attr2] = {val1: [] for val1 in vals1}
+            for val1, val2 in zip(vals1[top], vals2[top]):
+                out[attr1][attr2][val1].append(val2)
         return out
 
     def get_active_attributes(self):
@@ -174,12 +195,11 @@ class DomainEngine:
         These attributes correspond only to attributes that contain at least
         one potentially erroneous cell.
         """
-        query = 'SELECT DISTINCT attribute as attribute FROM {}'.format(AuxTables.dk_cells.name)
-        result = self.ds.engine.execute_query(query)
+        result = self.ds.engine.distinct_values(AuxTables.dk_cells.name, 'attribute')
         if not result:
             raise Exception("No attribute contains erroneous cells.")
         # Sort the active attributes to maintain the order of the ids of random variable.
-        return sorted(itertools.chain(*result))
+        return sorted(result)
 
     def get_corr_attributes(self, attr, thres):
         """
@@ -208,12 +228,18 @@ class DomainEngine:
         as assigns a random variable ID (_vid_) for cells that have
         a domain of size >= 2.
 
-        See get_domain_cell for how the domain is generated from co-occurrence
-        and correlated attributes.
+        See batch_domains (domain/batch.py) for how the domain is generated
+        from co-occurrence and correlated attributes.
 
         If no values can be found from correlated attributes, return a random
         sample of domain values.
 
+        The rows are split into shards of self.shard_rows rows (_tid_ ranges)
+        that are generated and pruned with the posterior model by
+        self.processes (env['threads']) worker processes. Random samples are
+        seeded per shard and _vid_'s are assigned in shard order, so the
+        domains do not depend on the # of workers.
+
         :return: DataFrame with columns
             _tid_: entity/tuple ID
             _cid_: cell ID (one for every cell in the raw data in active attributes)
@@ -230,230 +256,298 @@ class DomainEngine:
             raise Exception(
                 "Call <setup_attributes> to setup active attributes. Error detection should be performed before setup.")
 
-        logging.debug('generating initial set of un-pruned domain values...')
-        tic = time.clock()
-        # Iterate over dataset rows.
-        cells = []
-        vid = 0
-        records = self.ds.get_raw_data().to_records()
-        self.all_attrs = list(records.dtype.names)
-        for row in tqdm(list(records)):
-            tid = row['_tid_']
-            for attr in self.active_attributes:
-                init_value, init_value_idx, dom = self.get_domain_cell(attr, row)
-                # We will use an estimator model for additional weak labelling
-                # below, which requires an initial pruned domain first.
-                # Weak labels will be trained on the init values.
-                cid = self.ds.get_cell_id(tid, attr)
-
-                # Originally, all cells have a NOT_SET status to be considered
-                # in weak labelling.
-                cell_status = CellStatus.NOT_SET.value
-
-                if len(dom) <= 1:
-                    # Initial  value is NULL and we cannot come up with
-                    # a domain; a random domain probably won't help us so
-                    # completely ignore this cell and continue.
-                    # Note if len(dom) == 1, then we generated a single correct
-                    # value (since NULL is not included in the domain).
-                    # This would be a "SINGLE_VALUE" example and we'd still
-                    # like to generate a random domain for it.
-                    if init_value == NULL_REPR and len(dom) == 0:
-                        continue
-
-                    # Not enough domain values, we need to get some random
-                    # values (other than 'init_value') for training. However,
-                    # this might still get us zero domain values.
-                    rand_dom_values = self.get_random_domain(attr, init_value)
-
-                    # rand_dom_values might still be empty. In this case,
-                    # there are no other possible values for this cell. There
-                    # is not point to use this cell for training and there is no
-                    # point to run inference on it since we cannot even generate
-                    # a random domain. Therefore, we just ignore it from the
-                    # final tensor.
-                    if len(rand_dom_values) == 0:
-                        continue
-
-                    # Otherwise, just add the random domain values to the domain
-                    # and set the cell status accordingly.
-                    dom.extend(rand_dom_values)
-
-                    # Set the cell status that this is a single value and was
-                    # randomly assigned other values in the domain. These will
-                    # not be modified by the estimator.
-                    cell_status = CellStatus.SINGLE_VALUE.value
-
-                cells.append({"_tid_": tid,
-                              "attribute": attr,
-                              "_cid_": cid,
-                              "_vid_": vid,
-                              "domain": "|||".join(dom),
-                              "domain_size": len(dom),
-                              "init_value": init_value,
-                              "init_index": init_value_idx,
-                              "weak_label": init_value,
-                              "weak_label_idx": init_value_idx,
-                              "fixed": cell_status})
-                vid += 1
-        domain_df = pd.DataFrame(data=cells).sort_values('_vid_')
-        logging.debug('DONE generating initial set of domain values in %.2f', time.clock() - tic)
-
-        # Skip estimator model since we do not require any weak labelling or domain
-        # pruning based on posterior probabilities.
-        if self.env['weak_label_thresh'] == 1 and self.env['domain_thresh_2'] == 0:
-            return domain_df
-
-        # Run pruned domain values from correlated attributes above through
-        # posterior model for a naive probability estimation.
-        logging.debug('training posterior model for estimating domain value probabilities...')
-        tic = time.clock()
-        estimator = NaiveBayes(self.env, self.ds, domain_df, self.correlations)
-        logging.debug('DONE training posterior model in %.2fs', time.clock() - tic)
-
-        # Predict probabilities for all pruned domain values.
-        logging.debug('predicting domain value probabilities from posterior model...')
-        tic = time.clock()
-        preds_by_cell = estimator.predict_pp_batch()
-        logging.debug('DONE predictions in %.2f secs, re-constructing cell domain...', time.clock() - tic)
-
-        logging.debug('re-assembling final cell domain table...')
-        tic = time.clock()
-        # iterate through raw/current data and generate posterior probabilities for
-        # weak labelling
-        num_weak_labels = 0
-        updated_domain_df = []
-        for preds, row in tqdm(zip(preds_by_cell, domain_df.to_records())):
-            # Do not re-label single valued cells.
-            if row['fixed'] == CellStatus.SINGLE_VALUE.value:
-                updated_domain_df.append(row)
-                continue
-
-            # prune domain if any of the values are above our domain_thresh_2
-            preds = [[val, proba] for val, proba in preds if proba >= self.domain_thresh_2] or preds
-
-            # cap the maximum # of domain values to self.max_domain based on probabilities.
-            domain_values = [val for val, proba in sorted(preds, key=lambda pred: pred[1], reverse=True)[:self.max_domain]]
-
-            # ensure the initial value is included even if its probability is low.
-            if row['init_value'] not in domain_values and row['init_value'] != NULL_REPR:
-                domain_values.append(row['init_value'])
-            domain_values = sorted(domain_values)
-            # update our memoized domain values for this row again
-            row['domain'] = '|||'.join(domain_values)
-            row['domain_size'] = len(domain_values)
-            # update init index based on new domain
-            if row['init_value'] in domain_values:
-                row['init_index'] = domain_values.index(row['init_value'])
-            # update weak label index based on new domain
-            if row['weak_label'] != NULL_REPR:
-                row['weak_label_idx'] = domain_values.index(row['weak_label'])
-
-            weak_label, weak_label_prob = max(preds, key=lambda pred: pred[1])
-
-            # Assign weak label if it is not the same as init AND domain value
-            # exceeds our weak label threshold.
-            if weak_label != row['init_value'] and weak_label_prob >= self.weak_label_thresh:
-                num_weak_labels += 1
-
-                weak_label_idx = domain_values.index(weak_label)
-                row['weak_label'] = weak_label
-                row['weak_label_idx'] = weak_label_idx
-                row['fixed'] = CellStatus.WEAK_LABEL.value
-
-            updated_domain_df.append(row)
-
-        # update our cell domain df with our new updated domain
-        domain_df = pd.DataFrame.from_records(updated_domain_df, columns=updated_domain_df[0].dtype.names).drop('index', axis=1).sort_values('_vid_')
-        logging.debug('DONE assembling cell domain table in %.2fs', time.clock() - tic)
-
-        logging.info('number of (additional) weak labels assigned from posterior model: %d', num_weak_labels)
-
-        logging.debug('DONE generating domain and weak labels')
+        logging.debug('generating domain values in shards of %d rows...', self.shard_rows)
+        tic = time.time()
+        encoded = self.ds.get_encoded_data()
+        self.all_attrs = ['_tid_'] + encoded.attrs
+        # The workers only receive the DomainGenerator: the trained
+        # estimator, the candidate tables and the statistics they look up.
+        estimator = self._posterior_estimator()
+        generator = self._generator(estimator)
+        shards = [(shard, start, min(start + self.shard_rows, len(encoded)))
+                  for shard, start in enumerate(range(0, len(encoded), self.shard_rows))]
+        if self.processes <= 1 or len(shards) <= 1:
+            _init_shard_worker(generator)
+            try:
+                results = [_shard_worker(shard) for shard in shards]
+            finally:
+                _init_shard_worker(None)
+        else:
+            pool = _pool_context().Pool(min(self.processes, len(shards)), initializer=_init_shard_worker,
+                                        initargs=(generator,))
+            try:
+                results = pool.map(_shard_worker, shards)
+            finally:
+                pool.close()
+                pool.join()
+            # The workers filled their own copy of the context cache.
+            for _, _, counts in results:
+                self.context_cache.add_counts(*counts)
+        if not results:
+            return pd.DataFrame(columns=DOMAIN_COLUMNS)
+        # _vid_'s are numbered per shard: renumber them in shard order.
+        domain_df = pd.concat([shard_df for shard_df, _, _ in results], ignore_index=True)
+        domain_df['_vid_'] = np.arange(len(domain_df))
+        logging.debug('DONE generating domain values in %.2f secs', time.time() - tic)
+        self._log_context_cache()
+        if estimator is not None:
+            logging.info('number of (additional) weak labels assigned from posterior model: %d',
+                         sum(num_weak_labels for _, num_weak_labels, _ in results))
         return domain_df
 
-    def get_domain_cell(self, attr, row):
-        """
-        get_domain_cell returns a list of all domain values for the given
-        entity (row) and attribute. The domain never has null as a possible value.
-
-        We define domain values as values in 'attr' that co-occur with values
-        in attributes ('cond_attr') that are correlated with 'attr' at least in
-        magnitude of self.cor_strength (init parameter).
-
-        For example:
-
-                cond_attr       |   attr
-                H                   B                   <-- current row
-                H                   C
-                I                   D
-                H                   E
+    def _log_context_cache(self):
+        stats = self.context_cache.stats()
+        logging.debug('domain context cache: %d hits, %d misses (%.1f%% hit rate), %d entries, %d evictions',
+                      stats['hits'], stats['misses'], 100 * stats['hit_rate'], stats['size'], stats['evictions'])
 
-        This would produce [B,C,E] as domain values.
-
-        :return: (initial value of entity-attribute, domain values for entity-attribute).
+    def _generator(self, estimator=None):
+        """
+        _generator returns the DomainGenerator of the domains of the active
+        attributes, with the posterior :param estimator: (see
+        _posterior_estimator) if not None.
         """
+        return DomainGenerator(self.env, self.ds.get_encoded_data(), self.active_attributes,
+                               {attr: self._candidate_tables(attr) for attr in self.active_attributes},
+                               self.single_stats, self.ds.attr_to_idx, self.ds.attr_count, self.context_cache,
+                               estimator=estimator, max_sample=self.max_sample)
 
-        domain = set()
-        init_value = row[attr]
-        correlated_attributes = self.get_corr_attributes(attr, self.cor_strength)
-        # Iterate through all correlated attributes and take the top K co-occurrence values
-        # for 'attr' with the current row's 'cond_attr' value.
-        for cond_attr in correlated_attributes:
+    def _candidate_tables(self, attr):
+        """
+        _candidate_tables returns the candidate tables (see candidate_table)
+        of the correlated attributes of :param attr: that have pruned
+        co-occurrence statistics with :param attr:. The correlated
+        attributes of the tables (in order) are the context of the cells of
+        :param attr: (see batch.context_candidates).
+        """
+        if attr in self._candidate_tables_memo:
+            return self._candidate_tables_memo[attr]
+        encoded = self.ds.get_encoded_data()
+        tables = {}
+        for cond_attr in self.get_corr_attributes(attr, self.cor_strength):
             # Ignore correlations with index, tuple id or the same attribute.
             if cond_attr == attr or cond_attr == '_tid_':
                 continue
             if not self.pair_stats[cond_attr][attr]:
                 logging.warning("domain generation could not find pair_statistics between attributes: {}, {}".format(cond_attr, attr))
                 continue
-            cond_val = row[cond_attr]
-            # Ignore co-occurrence with a NULL cond init value since we do not
-            # store them.
-            # Also it does not make sense to retrieve the top co-occuring
-            # values with a NULL value.
-            # It is possible for cond_val to not be in pair stats if it only co-occurs
-            # with NULL values.
-            if cond_val == NULL_REPR or cond_val not in self.pair_stats[cond_attr][attr]:
-                continue
+            tables[cond_attr] = candidate_table(encoded, self.pair_stats[cond_attr][attr], cond_attr, attr)
+        self._candidate_tables_memo[attr] = tables
+        return tables
 
-            # Update domain with top co-occuring values with the cond init value.
-            candidates = self.pair_stats[cond_attr][attr][cond_val]
-            domain.update(candidates)
-
-        # We should not have any NULLs since we do not store co-occurring NULL
-        # values.
-        assert NULL_REPR not in domain
+    def _clear_candidates(self):
+        """
+        _clear_candidates clears the candidate tables and the context cache
+        after the pruned statistics, the correlations or the value codes
+        changed.
+        """
+        self._candidate_tables_memo = {}
+        self.context_cache.clear()
 
-        # Add the initial value to the domain if it is not NULL.
-        if init_value != NULL_REPR:
-            domain.add(init_value)
+    def _posterior_domain(self, domain_df):
+        """
+        _posterior_domain prunes the initial domains of :param domain_df:
+        (see DomainGenerator.domain_cells) with the posterior probabilities
+        of the Naive Bayes estimator and assigns weak labels.
+        """
+        estimator = self._posterior_estimator()
+        if estimator is None:
+            return domain_df
+        domain_df, num_weak_labels = self._generator(estimator).posterior_labels(domain_df)
+        logging.info('number of (additional) weak labels assigned from posterior model: %d', num_weak_labels)
+        return domain_df
 
-        # Convert to ordered list to preserve order.
-        domain_lst = sorted(list(domain))
+    def _posterior_estimator(self):
+        """
+        _posterior_estimator returns the Naive Bayes estimator of the
+        posterior probabilities of the domain values or None if domains are
+        neither pruned nor weak labelled with it.
+        """
+        # Skip estimator model since we do not require any weak labelling or domain
+        # pruning based on posterior probabilities.
+        if self.env['weak_label_thresh'] == 1 and self.env['domain_thresh_2'] == 0:
+            return None
+        logging.debug('training posterior model for estimating domain value probabilities...')
+        tic = time.time()
+        estimator = NaiveBayes(self.env, self.ds, None, self.correlations)
+        logging.debug('DONE training posterior model in %.2fs', time.time() - tic)
+        return estimator
 
-        # Get the index of the initial value.
-        # NULL values are not in the domain so we set their index to -1.
-        init_value_idx = -1
-        if init_value != NULL_REPR:
-            init_value_idx = domain_lst.index(init_value)
+    def update_domain(self, rows):
+        """
+        update_domain updates the correlations, the pruned co-occurrence
+        statistics and the cell domains after the tuples at row indexes
+        :param rows: were appended to the dataset (see Dataset.append_data).
+
+        Domains are only regenerated for the cells of the new tuples and the
+        cells whose co-occurrence candidates changed: cells whose value of a
+        correlated attribute gained/lost candidates, or all cells of an
+        attribute whose correlated attributes changed. Only the rows of
+        these cells are replaced in 'cell_domain' and 'pos_values' (see
+        _replace_domains).
+        """
+        tic = time.time()
+        if not self.setup_complete or self.ds.aux_table[AuxTables.cell_domain] is None:
+            raise Exception("ERROR the domain has not been set up yet. Call <setup_domain> first.")
+        encoded = self.ds.get_encoded_data()
+        total, single_stats, pair_stats = self.ds.get_statistics()
+        self.total = total
+        self._clear_candidates()
 
-        return init_value, init_value_idx, domain_lst
+        old_corr_attrs = {attr: self.get_corr_attributes(attr, self.cor_strength) for attr in self.active_attributes}
+        self._entropy_stats.update(encoded.codes[rows], pair_stats)
+        self.correlations = self._entropy_stats.correlations()
+        self._corr_attrs = {}
+        if self.needed_pairs_only:
+            missing = [(corr_attr, attr) for attr in self.active_attributes
+                       for corr_attr in self.get_corr_attributes(attr, self.cor_strength)
+                       if attr not in self.pair_stats[corr_attr]]
+            for attr1, pruned in self._pruned_pair_stats(pair_stats, missing).items():
+                self.pair_stats[attr1].update(pruned)
+        changed = self._update_pruned_pair_stats(pair_stats, encoded.codes[rows])
+        self._clear_candidates()
+
+        # Row indexes of the cells to regenerate for each active attribute.
+        rows_by_attr = {}
+        for attr in self.active_attributes:
+            corr_attrs = self.get_corr_attributes(attr, self.cor_strength)
+            if corr_attrs != old_corr_attrs[attr]:
+                rows_by_attr[attr] = np.arange(len(encoded))
+                continue
+            affected = [np.asarray(rows, dtype=np.int64)]
+            for cond_attr in corr_attrs:
+                codes = changed.get((cond_attr, attr))
+                if codes:
+                    affected.append(encoded.rows_with(cond_attr, sorted(codes)))
+            rows_by_attr[attr] = np.unique(np.concatenate(affected))
+        num_cells = sum(len(rows) for rows in rows_by_attr.values())
+        logging.debug('regenerating the domain of %d cells', num_cells)
+
+        domain_df = self._generator().domain_cells(rows_by_attr)
+        self._log_context_cache()
+        if not domain_df.empty:
+            domain_df = self._posterior_domain(domain_df)
+        regenerated_cids = np.concatenate([self.ds.get_cell_id(encoded.tids[rows], attr)
+                                           for attr, rows in rows_by_attr.items()])
+        self._replace_domains(regenerated_cids, domain_df)
+        status = "DONE updating the domain of {} cells.".format(num_cells)
+        toc = time.time()
+        return status, toc - tic
 
-    def get_random_domain(self, attr, cur_value):
+    def _replace_domains(self, cids, domain_df):
         """
-        get_random_domain returns a random sample of at most size
-        'self.max_sample' of domain values for 'attr' that is NOT 'cur_value'.
+        _replace_domains replaces the rows of the cells :param cids: in the
+        'cell_domain' and 'pos_values' tables with the regenerated domains
+        :param domain_df: (see DomainGenerator.domain_cells).
+
+        Cells that already had a domain keep their _vid_. The _vid_'s stay
+        dense (0 to # of cells - 1): new cells take the _vid_'s freed by the
+        cells that no longer have a domain or the next ones after the max,
+        and the few cells whose _vid_ would be past the new # of cells are
+        moved to the remaining free _vid_'s. Only these rows are read and
+        written, never the whole tables.
         """
-        domain_pool = set(self.single_stats[attr].keys())
-        # We should not have any NULLs since we do not keep track of their
-        # counts.
-        assert NULL_REPR not in domain_pool
-        domain_pool.discard(cur_value)
-        domain_pool = sorted(list(domain_pool))
-        size = len(domain_pool)
-        if size > 0:
-            k = min(self.max_sample, size)
-            additional_values = np.random.choice(domain_pool, size=k, replace=False)
-        else:
-            additional_values = []
-        return sorted(additional_values)
+        engine = self.ds.engine
+        cell_domain, pos_values = AuxTables.cell_domain.name, AuxTables.pos_values.name
+        int_columns = {col: np.int64 for col in ['_tid_', '_cid_', '_vid_', 'domain_size', 'init_index',
+                                                 'weak_label_idx', 'fixed']}
+        old = engine.select_rows(cell_domain, ['_cid_', '_tid_', '_vid_'], {'_cid_': cids}, dtypes=int_columns,
+                                 tag='DomainEngine')
+        count, _ = engine.count_and_max(cell_domain, '_vid_')
+        total = count - len(old['_cid_']) + len(domain_df)
+
+        # _vid_'s of the regenerated cells that already had a domain.
+        order = np.argsort(old['_cid_'])
+        old_cids, old_vids = old['_cid_'][order], old['_vid_'][order]
+        new_cids = domain_df['_cid_'].values.astype(np.int64)
+        vids = np.full(len(new_cids), -1, dtype=np.int64)
+        if len(old_cids):
+            pos = np.minimum(np.searchsorted(old_cids, new_cids), len(old_cids) - 1)
+            found = old_cids[pos] == new_cids
+            vids[found] = old_vids[pos[found]]
+
+        # Cells of the other rows past the new # of cells.
+        moved_vids = np.setdiff1d(np.arange(total, count), old_vids)
+        moved = pd.DataFrame(engine.select_rows(cell_domain, DOMAIN_COLUMNS, {'_vid_': moved_vids},
+                                                dtypes=int_columns, tag='DomainEngine'),
+                             columns=DOMAIN_COLUMNS).sort_values('_vid_')
+        domain_df = pd.concat([domain_df, moved], ignore_index=True)
+        vids = np.concatenate([vids, np.full(len(moved), -1, dtype=np.int64)])
+        # Free _vid_'s below the new # of cells, for the new cells and the
+        # cells past it.
+        free = np.concatenate([np.setdiff1d(old_vids, vids), np.arange(count, total)])
+        free = np.sort(free[free < total])
+        relocated = (vids < 0) | (vids >= total)
+        if len(free) != np.count_nonzero(relocated):
+            raise Exception("ERROR the _vid_'s of the cell domain table are not dense.")
+        vids[relocated] = free
+        domain_df['_vid_'] = vids
+
+        replaced = np.concatenate([old['_cid_'], moved['_cid_'].values.astype(np.int64)])
+        replaced_tids = np.unique(np.concatenate([old['_tid_'], moved['_tid_'].values.astype(np.int64)]))
+        engine.delete_rows(pos_values, {'_tid_': replaced_tids, '_cid_': replaced})
+        engine.delete_rows(cell_domain, {'_cid_': replaced})
+        engine.bulk_load_df(cell_domain, domain_df, if_exists='append')
+        engine.create_pos_values(pos_values, cell_domain, vids=vids)
+        # The tables (and their Postgres indexes) already exist: only
+        # re-register them so their DataFrames are read again on access.
+        self.ds.register_aux_table(AuxTables.cell_domain)
+        self.ds.aux_table[AuxTables.cell_domain].create_df_index(['_vid_'])
+        self.ds.register_aux_table(AuxTables.pos_values)
+        self.ds.aux_table[AuxTables.pos_values].create_df_index(['_tid_', 'attribute'])
+        logging.debug('replaced the domain of %d cells with %d cells, moved %d cells', len(old_cids),
+                      len(new_cids), len(moved))
+
+    def _update_pruned_pair_stats(self, pair_stats, codes):
+        """
+        _update_pruned_pair_stats recomputes the pruned co-occurrence
+        candidates (see _pruned_pair_stats) of the values in :param codes:
+        (code matrix of the new tuples). The candidates of other values do
+        not change since neither their co-occurrence counts nor their
+        frequency changed.
+
+        :return: (dict { (attr1, attr2) -> set(code1) }) the codes of attr1
+            whose candidates for attr2 changed.
+        """
+        encoded = self.ds.get_encoded_data()
+        changed = {}
+        for attr1, pruned in self.pair_stats.items():
+            codes1 = np.unique(codes[:, encoded.attr_to_idx[attr1]])
+            codes1 = codes1[codes1 != NULL_CODE]
+            vals1 = encoded.decode(attr1, codes1)
+            for attr2, candidates in pruned.items():
+                for code1, val1 in zip(codes1, vals1):
+                    codes2, data = pair_stats.row(attr1, attr2, code1)
+                    if len(codes2) == 0:
+                        continue
+                    tau = self.domain_thresh_1 * float(self.single_stats[attr1][val1])
+                    new_candidates = list(encoded.decode(attr2, codes2[data > tau]))
+                    if candidates.get(val1) != new_candidates:
+                        candidates[val1] = new_candidates
+                        changed.setdefault((attr1, attr2), set()).add(code1)
+        return changed
+
+def _pool_context():
+    """
+    _pool_context returns the multiprocessing context of the workers of
+    generate_domain. Forking the main process would copy it in the middle of
+    the operations of the engine's connections and task executor threads,
+    so the workers are forked from a fork server (that imports this module
+    once) where available and spawned otherwise.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _init_shard_worker(generator):
+    global _generator
+    _generator = generator
+
+
+def _shard_worker(shard):
+    hits, misses, evictions = _generator.context_cache.counts()
+    domain_df, num_weak_labels = _generator.shard_domain(shard)
+    counts = _generator.context_cache.counts()
+    return domain_df, num_weak_labels, (counts[0] - hits, counts[1] - misses, counts[2] - evictions)
@@ -18,6 +18,13 @@ class Estimator:
         self.ds = dataset
         self.attrs = self.ds.get_attributes()
 
+    def __getstate__(self):
+        # The Dataset (with its engine and connections) is only used to set
+        # the estimator up: workers receive the estimator without it.
+        state = self.__dict__.copy()
+        state['ds'] = None
+        return state
+
     @abstractmethod
     def train(self, **kwargs):
         raise NotImplementedError
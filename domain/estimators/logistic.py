@@ -71,7 +71,7 @@ class Logistic(Estimator, torch.nn.Module):
         used for training and prediction.
         """
         logging.debug('Logistic: featurizing training data...')
-        tic = time.clock()
+        tic = time.time()
         # Each row corresponds to a possible value for a given attribute
         # and given TID
         self._X = torch.zeros(self.n_samples, self.num_features)
@@ -85,12 +85,12 @@ class Logistic(Estimator, torch.nn.Module):
         to use in training. We assign Y as 1 if the value is the initial value.
         """
         sample_idx = 0
-        raw_data_dict = self.ds.raw_data.df.set_index('_tid_').to_dict('index')
+        encoded = self.ds.get_encoded_data()
         # Keep track of which indices correspond to a VID so we can re-use
         # self._X in prediction.
         self.vid_to_idxs = {}
         for rec in tqdm(list(self.domain_records)):
-            init_row = raw_data_dict[rec['_tid_']]
+            init_row = encoded.row(rec['_tid_'])
             domain_vals = rec['domain'].split('|||')
 
             # Generate the feature tensor for all the domain values for this
@@ -120,7 +120,7 @@ class Logistic(Estimator, torch.nn.Module):
         # Convert this to a vector of indices rather than a vector mask.
         self._train_idx = (self._train_idx == 1).nonzero()[:,0]
 
-        logging.debug('Logistic: DONE featurization in %.2fs', time.clock() - tic)
+        logging.debug('Logistic: DONE featurization in %.2fs', time.time() - tic)
 
     def _gen_feat_tensor(self, init_row, attr, domain_vals):
         """
@@ -230,9 +230,8 @@ class CooccurAttrFeaturizer(Featurizer):
         :param attrs: attributes in columns of :param data_df: to compute feautres for.
         :param freq: (dict { attr: { val: count } } }) if not None, uses these
             frequency statistics instead of computing it from data_df.
-        :param cooccur_freq: (dict { attr1: { attr2: { val1: { val2: count } } } })
-            if not None, uses these co-occurrence statistics instead of
-            computing it from data_df.
+        :param cooccur_freq: (PairStats) if not None, uses these
+            co-occurrence statistics instead of computing it from data_df.
         """
         self.ds = dataset
         self.attrs = self.ds.get_attributes()
@@ -269,7 +268,7 @@ class CooccurAttrFeaturizer(Featurizer):
                 if val == NULL_REPR or other_val == NULL_REPR:
                     fv = NA_COOCCUR_FV
                 else:
-                    cooccur = self.cooccur_freq[attr][other_attr].get(val, {}).get(other_val, NA_COOCCUR_FV)
+                    cooccur = self.cooccur_freq.get(attr, other_attr, val, other_val) or NA_COOCCUR_FV
                     freq = self.freq[other_attr][row[other_attr]]
                     fv = float(cooccur) / float(freq)
 
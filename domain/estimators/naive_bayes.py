@@ -23,10 +23,8 @@ class NaiveBayes(Estimator):
         self._cor_strength = self.env['nb_cor_strength']
         self._corr_attrs = {}
 
-        # TID to raw data tuple for prediction.
-        self._raw_records_by_tid = {}
-        for row in self.ds.get_raw_data().to_records():
-            self._raw_records_by_tid[row['_tid_']] = row
+        # Encoded raw data to look up the tuple of a cell for prediction.
+        self._encoded = self.ds.get_encoded_data()
 
     def train(self):
         pass
@@ -48,10 +46,9 @@ class NaiveBayes(Estimator):
                 # on a NULL value.
                 if val2 == NULL_REPR:
                     continue
-                val2_val1_count = 0.1
-                if val1 in self._cooccur_freq[attr][at]:
-                    if val2 in self._cooccur_freq[attr][at][val1]:
-                        val2_val1_count = max(self._cooccur_freq[attr][at][val1][val2] - 1.0, 0.1)
+                # Pairs that never co-occur have a count of 0 and get the
+                # same 0.1 smoothing.
+                val2_val1_count = max(self._cooccur_freq.get(attr, at, val1, val2) - 1.0, 0.1)
                 p = float(val2_val1_count) / float(val1_count)
                 log_prob += math.log(p)
             nb_score.append((val1, log_prob))
@@ -61,9 +58,10 @@ class NaiveBayes(Estimator):
         for val, log_prob in nb_score:
             yield (val, math.exp(log_prob) / denom)
 
-    def predict_pp_batch(self):
+    def predict_pp_batch(self, domain_df=None):
         """
-        Performs batch prediction.
+        Performs batch prediction for the cells of :param domain_df: (or
+        of the domain_df given at construction if None).
 
         This technically invokes predict_pp underneath.
 
@@ -72,8 +70,10 @@ class NaiveBayes(Estimator):
         during construction) and each Tuple is (val, proba) where
         val is the domain value and proba is the estimator's posterior probability estimate.
         """
-        for row in tqdm(self.domain_df.to_records()):
-            yield self.predict_pp(self._raw_records_by_tid[row['_tid_']], row['attribute'], row['domain'].split('|||'))
+        if domain_df is None:
+            domain_df = self.domain_df
+        for row in tqdm(domain_df.to_records()):
+            yield self.predict_pp(self._encoded.row(row['_tid_']), row['attribute'], row['domain'].split('|||'))
 
     def _get_corr_attributes(self, attr):
         """
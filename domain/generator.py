@@ -0,0 +1,237 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from dataset import CellStatus
+from .batch import batch_domains
+from utils import NULL_REPR
+
+DOMAIN_COLUMNS = ['_tid_', 'attribute', '_cid_', '_vid_', 'domain', 'domain_size', 'init_value',
+                  'init_index', 'weak_label', 'weak_label_idx', 'fixed']
+
+
+class DomainGenerator:
+    """
+    DomainGenerator generates the domains of cells from the state of a
+    DomainEngine they depend on: the encoded raw data, the candidate tables
+    of the active attributes, the value frequencies and the posterior
+    estimator. It holds no Dataset nor engine so that it can be pickled to
+    the worker processes of DomainEngine.generate_domain.
+    """
+    def __init__(self, env, encoded, active_attributes, tables, single_stats, attr_to_idx, attr_count,
+                 context_cache, estimator=None, max_sample=5):
+        """
+        :param env: (dict) global settings (seed, thresholds and max_domain).
+        :param encoded: (EncodedTable) encoded raw data.
+        :param active_attributes: (list[str]) attributes to generate domains for.
+        :param tables: (dict { attr -> candidate tables }) see
+            DomainEngine._candidate_tables.
+        :param single_stats: (dict { attr -> { value -> count } }) value
+            frequencies of the random domains.
+        :param attr_to_idx: (dict { attr -> int }) attribute indexes of the
+            cell ids (see Dataset.get_cell_id).
+        :param attr_count: (int) # of attributes of the cell ids.
+        :param context_cache: (ContextCache) cache of the candidates of the
+            cell contexts.
+        :param estimator: (Estimator) posterior estimator, None if domains
+            are neither pruned nor weak labelled with it.
+        :param max_sample: (int) maximum # of values of a random domain.
+        """
+        self.env = env
+        self.encoded = encoded
+        self.active_attributes = active_attributes
+        self.tables = tables
+        self.single_stats = single_stats
+        self.attr_to_idx = attr_to_idx
+        self.attr_count = attr_count
+        self.context_cache = context_cache
+        self.estimator = estimator
+        self.max_sample = max_sample
+        # Sorted values of every attribute for random_domain.
+        self._random_pools = {}
+
+    def shard_domain(self, shard):
+        """
+        shard_domain returns the domains of the cells of the rows of
+        :param shard: ((shard index, first row, end row)) pruned with the
+        estimator (see posterior_labels) and the # of weak labels assigned.
+        Random domains are sampled with a random state seeded with
+        env['seed'] and the shard index.
+        """
+        shard_idx, start, end = shard
+        rng = np.random.RandomState([self.env['seed'], shard_idx])
+        rows = np.arange(start, end)
+        domain_df = self.domain_cells({attr: rows for attr in self.active_attributes}, rng=rng)
+        if self.estimator is None or domain_df.empty:
+            return domain_df, 0
+        return self.posterior_labels(domain_df)
+
+    def domain_cells(self, rows_by_attr, rng=None):
+        """
+        domain_cells generates the initial (un-pruned) domain of the cells
+        of the rows :param rows_by_attr: ({ attr -> sorted row indexes }) of
+        the active attributes, ordered by row then by active attribute, and
+        assigns _vid_'s in order. See DomainEngine.generate_domain for the
+        columns of the returned DataFrame.
+
+        The domain of a cell is made of the values that co-occur with the
+        values of its correlated attributes (see batch.batch_domains) and of
+        its initial value. Cells with a single domain value get a random
+        domain (see random_domain) and cells without any are skipped.
+
+        :param rng: (numpy.random.RandomState) random state of the random
+            domains (np.random if None).
+        """
+        encoded = self.encoded
+        rows, attr_pos, domains, sizes, init_idxs = [], [], [], [], []
+        for pos, attr in enumerate(self.active_attributes):
+            attr_rows = np.asarray(rows_by_attr.get(attr, []), dtype=np.int64)
+            attr_domains, attr_sizes, attr_init_idxs = batch_domains(encoded, attr, self.tables[attr], attr_rows,
+                                                                     cache=self.context_cache)
+            rows.append(attr_rows)
+            attr_pos.append(np.full(len(attr_rows), pos, dtype=np.int64))
+            domains.extend(attr_domains)
+            sizes.append(attr_sizes)
+            init_idxs.append(attr_init_idxs)
+        rows, attr_pos = np.concatenate(rows), np.concatenate(attr_pos)
+        order = np.lexsort((attr_pos, rows))
+        rows, attr_pos = rows[order], attr_pos[order]
+        domains = [domains[idx] for idx in order.tolist()]
+        sizes, init_idxs = np.concatenate(sizes)[order], np.concatenate(init_idxs)[order]
+
+        attrs = np.array(self.active_attributes, dtype=object)[attr_pos]
+        tids = encoded.tids[rows]
+        attr_idx = np.array([self.attr_to_idx[attr] for attr in self.active_attributes], dtype=np.int64)
+        init_values = np.empty(len(rows), dtype=object)
+        for pos, attr in enumerate(self.active_attributes):
+            mask = attr_pos == pos
+            init_values[mask] = encoded.decode(attr, encoded.column(attr)[rows[mask]])
+        status = np.full(len(rows), CellStatus.NOT_SET.value, dtype=np.int64)
+        keep = np.ones(len(rows), dtype=bool)
+        # Cells with at most one domain value get a random domain, in row
+        # order so that the random samples do not depend on the batching.
+        for idx in np.flatnonzero(sizes <= 1):
+            # A NULL cell without any candidate is ignored: a random domain
+            # would probably not help.
+            if init_values[idx] == NULL_REPR and sizes[idx] == 0:
+                keep[idx] = False
+                continue
+            rand_dom_values = self.random_domain(attrs[idx], init_values[idx], rng=rng)
+            # There are no other values for this cell: it is useless for
+            # both training and inference.
+            if len(rand_dom_values) == 0:
+                keep[idx] = False
+                continue
+            # The domain has exactly one value here.
+            domains[idx] = '|||'.join([domains[idx]] + list(rand_dom_values))
+            sizes[idx] += len(rand_dom_values)
+            status[idx] = CellStatus.SINGLE_VALUE.value
+
+        kept = np.flatnonzero(keep)
+        domain_df = pd.DataFrame({'_tid_': tids[kept],
+                                  'attribute': attrs[kept],
+                                  '_cid_': tids[kept] * self.attr_count + attr_idx[attr_pos[kept]],
+                                  '_vid_': np.arange(len(kept)),
+                                  'domain': [domains[idx] for idx in kept.tolist()],
+                                  'domain_size': sizes[kept],
+                                  'init_value': init_values[kept],
+                                  'init_index': init_idxs[kept],
+                                  'weak_label': init_values[kept],
+                                  'weak_label_idx': init_idxs[kept],
+                                  'fixed': status[kept]},
+                                 columns=DOMAIN_COLUMNS)
+        return domain_df
+
+    def random_domain(self, attr, cur_value, rng=None):
+        """
+        random_domain returns a random sample of at most size
+        'self.max_sample' of domain values for 'attr' that is NOT 'cur_value'.
+        """
+        if attr not in self._random_pools:
+            domain_pool = sorted(self.single_stats[attr].keys())
+            # We should not have any NULLs since we do not keep track of their
+            # counts.
+            assert NULL_REPR not in domain_pool
+            self._random_pools[attr] = np.array(domain_pool, dtype=object)
+        domain_pool = self._random_pools[attr]
+        pos = np.searchsorted(domain_pool, cur_value)
+        if pos < len(domain_pool) and domain_pool[pos] == cur_value:
+            domain_pool = np.delete(domain_pool, pos)
+        size = len(domain_pool)
+        if size > 0:
+            k = min(self.max_sample, size)
+            rng = rng if rng is not None else np.random
+            additional_values = rng.choice(domain_pool, size=k, replace=False)
+        else:
+            additional_values = []
+        return sorted(additional_values)
+
+    def posterior_labels(self, domain_df):
+        """
+        posterior_labels prunes the initial domains of :param domain_df:
+        with the posterior probabilities of the estimator and assigns weak
+        labels.
+
+        :return: (DataFrame, # of weak labels assigned)
+        """
+        domain_thresh_2, max_domain = self.env['domain_thresh_2'], self.env['max_domain']
+        weak_label_thresh = self.env['weak_label_thresh']
+        # Predict probabilities for all pruned domain values.
+        logging.debug('predicting domain value probabilities from posterior model...')
+        tic = time.time()
+        preds_by_cell = self.estimator.predict_pp_batch(domain_df)
+        logging.debug('DONE predictions in %.2f secs, re-constructing cell domain...', time.time() - tic)
+
+        logging.debug('re-assembling final cell domain table...')
+        tic = time.time()
+        # iterate through raw/current data and generate posterior probabilities for
+        # weak labelling
+        num_weak_labels = 0
+        updated_domain_df = []
+        for preds, row in tqdm(zip(preds_by_cell, domain_df.to_records())):
+            # Do not re-label single valued cells.
+            if row['fixed'] == CellStatus.SINGLE_VALUE.value:
+                updated_domain_df.append(row)
+                continue
+
+            # prune domain if any of the values are above our domain_thresh_2
+            preds = [[val, proba] for val, proba in preds if proba >= domain_thresh_2] or preds
+
+            # cap the maximum # of domain values to max_domain based on probabilities.
+            domain_values = [val for val, proba in sorted(preds, key=lambda pred: pred[1], reverse=True)[:max_domain]]
+
+            # ensure the initial value is included even if its probability is low.
+            if row['init_value'] not in domain_values and row['init_value'] != NULL_REPR:
+                domain_values.append(row['init_value'])
+            domain_values = sorted(domain_values)
+            # update our memoized domain values for this row again
+            row['domain'] = '|||'.join(domain_values)
+            row['domain_size'] = len(domain_values)
+            # update init index based on new domain
+            if row['init_value'] in domain_values:
+                row['init_index'] = domain_values.index(row['init_value'])
+            # update weak label index based on new domain
+            if row['weak_label'] != NULL_REPR:
+                row['weak_label_idx'] = domain_values.index(row['weak_label'])
+
+            weak_label, weak_label_prob = max(preds, key=lambda pred: pred[1])
+
+            # Assign weak label if it is not the same as init AND domain value
+            # exceeds our weak label threshold.
+            if weak_label != row['init_value'] and weak_label_prob >= weak_label_thresh:
+                num_weak_labels += 1
+
+                weak_label_idx = domain_values.index(weak_label)
+                row['weak_label'] = weak_label
+                row['weak_label_idx'] = weak_label_idx
+                row['fixed'] = CellStatus.WEAK_LABEL.value
+
+            updated_domain_df.append(row)
+
+        # update our cell domain df with our new updated domain
+        domain_df = pd.DataFrame.from_records(updated_domain_df, columns=updated_domain_df[0].dtype.names).drop('index', axis=1).sort_values('_vid_')
+        logging.debug('DONE assembling cell domain table in %.2fs', time.time() - tic)
+        return domain_df, num_weak_labels
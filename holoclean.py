@@ -45,6 +45,13 @@ arguments = [
          'default': 'holo',
          'type': str,
          'help': 'Name of DB used to persist state.'}),
+    (('-en', '--engine'),
+        {'metavar': 'ENGINE',
+         'dest': 'engine',
+         'default': 'postgres',
+         'type': str,
+         'help': "Engine that stores the tables and runs the queries: 'postgres' or 'memory'. "
+                 "The in-memory engine needs no Postgres server (for small and medium datasets)."}),
     (('-t', '--threads'),
      {'metavar': 'THREADS',
       'dest': 'threads',
@@ -159,6 +166,41 @@ arguments = [
       'default': 32,
       'type': int,
       'help': 'Size of batch used in SGD in the weak labelling and domain generation estimator.'}),
+    (('-cd', '--cache-dir'),
+     {'metavar': 'CACHE_DIR',
+      'dest': 'cache_dir',
+      'default': None,
+      'type': str,
+      'help': 'Directory of the on-disk cache for dataset statistics and attribute correlations. '
+              'The cache is disabled if not set.'}),
+    (('-csz', '--cache-size'),
+     {'metavar': 'CACHE_SIZE',
+      'dest': 'cache_size',
+      'default': 1024,
+      'type': int,
+      'help': 'Size cap (in MB) of the on-disk cache. Least recently used entries are evicted first.'}),
+    (('-dcsz', '--domain-cache-size'),
+     {'metavar': 'DOMAIN_CACHE_SIZE',
+      'dest': 'domain_cache_size',
+      'default': 100000,
+      'type': int,
+      'help': 'Max # of contexts (values of the correlated attributes of a cell) whose domain candidates '
+              'are cached during domain generation. Least recently used entries are evicted first, '
+              '0 disables the cache.'}),
+    (('-qcb', '--query-cost-budget'),
+     {'metavar': 'QUERY_COST_BUDGET',
+      'dest': 'query_cost_budget',
+      'default': None,
+      'type': float,
+      'help': 'Max planner (EXPLAIN) cost of a relaxed constraint query without a recorded run time. '
+              'The fallback query is run up front for costlier queries. Disabled if not set.'}),
+    (('-qr', '--query-report'),
+     {'metavar': 'QUERY_REPORT',
+      'dest': 'query_report',
+      'default': None,
+      'type': str,
+      'help': 'JSON file to write the query report (slowest queries, timeouts, fallbacks) to '
+              'after repairing and after evaluating. Not written if not set.'}),
 ]
 
 # Flags for Holoclean mode
@@ -183,6 +225,36 @@ flags = [
          'dest': 'debug_mode',
          'action': 'store_true',
          'help': 'dump a bunch of debug information to debug\/'}),
+    (tuple(['--unlogged-tables']),
+        {'default': False,
+         'dest': 'unlogged_tables',
+         'action': 'store_true',
+         'help': 'Create Postgres tables as UNLOGGED (faster bulk loads, not crash-safe).'}),
+    (tuple(['--stats-needed-pairs-only']),
+        {'default': False,
+         'dest': 'stats_needed_pairs_only',
+         'action': 'store_true',
+         'help': 'Only compute the co-occurrence statistics of active attributes with their '
+                 'correlated attributes up front (other pairs are computed on first use).'}),
+    (tuple(['--explain-queries']),
+        {'default': False,
+         'dest': 'explain_queries',
+         'action': 'store_true',
+         'help': 'Capture the EXPLAIN (ANALYZE, BUFFERS) plan of featurization, detection and evaluation '
+                 'queries in the query report. Runs every such query twice.'}),
+    (tuple(['--range-joins-in-memory']),
+        {'default': False,
+         'dest': 'range_joins_in_memory',
+         'action': 'store_true',
+         'help': 'Count the violations of relaxed constraints with <, >, <=, >= predicates between tuples '
+                 'in memory instead of in Postgres. Values are then compared in code point order '
+                 '(not the database collation) and without the query timeout.'}),
+    (tuple(['--cache-queries']),
+        {'default': False,
+         'dest': 'cache_queries',
+         'action': 'store_true',
+         'help': 'Cache the results of detection, featurization and evaluation queries in the on-disk cache '
+                 '(see --cache-dir). Queries over unchanged tables are then not run again, e.g. on reruns.'}),
 ]
 
 
@@ -268,9 +340,11 @@ class Session:
         self.eval_engine = EvalEngine(env, self.ds)
 
 
-    def load_data(self, name, fpath, na_values=None, entity_col=None, src_col=None):
+    def load_data(self, name, fpath, na_values=None, entity_col=None, src_col=None, chunksize=None, columns=None):
         """
         load_data takes the filepath to a CSV file to load as the initial dataset.
+        Parquet (.parquet, .pq) and Arrow IPC/Feather (.arrow, .feather, .ipc)
+        files are read memory-mapped instead.
 
         :param name: (str) name to initialize dataset with.
         :param fpath: (str) filepath to CSV file.
@@ -282,15 +356,64 @@ class Session:
         :param src_col: (str) if not None, for fusion tasks
             specifies the column containing the source for each "mention" of an
             entity.
+        :param chunksize: (int) if not None, stream the CSV file into the
+            database in chunks of this many rows (for files larger than memory).
+        :param columns: (list[str]) for Parquet/Arrow files, only load these
+            columns.
         """
         status, load_time = self.ds.load_data(name,
                                               fpath,
                                               na_values=na_values,
                                               entity_col=entity_col,
-                                              src_col=src_col)
+                                              src_col=src_col,
+                                              chunksize=chunksize,
+                                              columns=columns)
         logging.info(status)
         logging.debug('Time to load dataset: %.2f secs', load_time)
 
+    def append_data(self, fpath, na_values=None):
+        """
+        append_data appends the rows of the CSV file :param fpath: (with the
+        same columns as the initial dataset) to the loaded dataset.
+
+        Statistics are updated with the counts of the new rows and, if the
+        domain was already set up, the correlations and the domains of the
+        affected cells are updated as well (see DomainEngine.update_domain).
+        Errors are not detected in the new rows: call detect_errors (and
+        setup_domain) again for that.
+
+        :param fpath: (str) filepath to CSV file.
+        :param na_values: (str) value that identifies a NULL value
+        """
+        status, load_time = self.ds.append_data(fpath, na_values=na_values)
+        logging.info(status)
+        logging.debug('Time to append data: %.2f secs', load_time)
+        if self.domain_engine.setup_complete:
+            status, domain_time = self.domain_engine.update_domain(self.ds.appended_rows)
+            logging.info(status)
+            logging.debug('Time to update the domain: %.2f secs', domain_time)
+
+    def invalidate_cache(self):
+        """
+        invalidate_cache removes all cached statistics and correlations
+        (see --cache-dir) so they are recomputed on their next use.
+        """
+        self.ds.invalidate_cache()
+
+    def query_report(self, fpath=None, top=10):
+        """
+        query_report returns the report of the queries executed so far: wall
+        time, rows, bytes, timeouts and fallbacks per stage and the :param top:
+        slowest queries overall and per stage (e.g. the slowest constraint
+        queries of the ConstraintFeaturizer).
+
+        :param fpath: (str) if not None, also write the report to this JSON file.
+        """
+        query_log = self.ds.engine.query_log
+        if fpath is not None:
+            query_log.dump(fpath, top)
+        return query_log.report(top)
+
     def load_dcs(self, fpath):
         """
         load_dcs ingests the Denial Constraints for initialized dataset.
@@ -333,6 +456,7 @@ class Session:
         status, time = self.ds.get_repaired_dataset()
         logging.info(status)
         logging.debug('Time to store repaired dataset: %.2f secs', time)
+        self._dump_query_report()
         if self.env['print_fw']:
             status, time = self.repair_engine.get_featurizer_weights()
             logging.info(status)
@@ -360,4 +484,11 @@ class Session:
         status, report_time, eval_report = self.eval_engine.eval_report()
         logging.info(status)
         logging.debug('Time to generate report: %.2f secs', report_time)
+        self._dump_query_report()
         return eval_report
+
+    def _dump_query_report(self):
+        if self.env['query_report']:
+            report = self.query_report(self.env['query_report'])
+            logging.info('Wrote query report of %d queries (%.2f secs, %d timeouts) to %s', report['queries'],
+                         report['total_time'], report['timeouts'], self.env['query_report'])
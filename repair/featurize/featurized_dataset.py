@@ -1,14 +1,12 @@
 from collections import namedtuple
 import logging
 
-from tqdm import tqdm
 import numpy as np
 import pandas as pd
 import torch
 import torch.nn.functional as F
 
 from dataset import AuxTables, CellStatus
-from utils import NULL_REPR
 
 FeatInfo = namedtuple('FeatInfo', ['name', 'size', 'learnable', 'init_weight', 'feature_names'])
 
@@ -69,26 +67,15 @@ class FeaturizedDataset:
         # Generate weak labels for clean cells AND cells that have been weak
         # labelled. Do not train on cells with NULL weak labels (i.e.
         # NULL init values that were not weak labelled).
-        query = """
-        SELECT _vid_, weak_label_idx, fixed, (t2._cid_ IS NULL) AS clean
-        FROM {cell_domain} AS t1 LEFT JOIN {dk_cells} AS t2 ON t1._cid_ = t2._cid_
-        WHERE weak_label != '{null_repr}' AND (t2._cid_ is NULL OR t1.fixed != {cell_status});
-        """.format(cell_domain=AuxTables.cell_domain.name,
-                dk_cells=AuxTables.dk_cells.name,
-                null_repr=NULL_REPR,
-                cell_status=CellStatus.NOT_SET.value)
-        res = self.ds.engine.execute_query(query)
-        if len(res) == 0:
+        res = self.ds.engine.weak_label_columns(AuxTables.cell_domain.name, AuxTables.dk_cells.name,
+                                                CellStatus.NOT_SET.value)
+        if len(res['_vid_']) == 0:
             raise Exception("No weak labels available. Reduce pruning threshold.")
         labels = -1 * torch.ones(self.total_vars, 1).type(torch.LongTensor)
         is_clean = torch.zeros(self.total_vars, 1).type(torch.LongTensor)
-        for tuple in tqdm(res):
-            vid = int(tuple[0])
-            label = int(tuple[1])
-            fixed = int(tuple[2])
-            clean = int(tuple[3])
-            labels[vid] = label
-            is_clean[vid] = clean
+        vids = torch.from_numpy(res['_vid_'])
+        labels[vids, 0] = torch.from_numpy(res['weak_label_idx'])
+        is_clean[vids, 0] = torch.from_numpy(res['clean'])
         return labels, is_clean
 
     def generate_var_mask(self):
@@ -103,17 +90,18 @@ class FeaturizedDataset:
 
         :return: Torch.Tensor of size (# of variables) X (max domain)
             where tensor[i][j] = 0 iff the value corresponding to domain index 'j'
-            is valid for the i-th VID and tensor[i][j] = -10e6 otherwise.
+            is valid for the i-th VID and tensor[i][j] = -10e6 otherwise, and
+            a numpy.ndarray with the domain size of every VID.
         """
-        var_to_domsize = {}
-        query = 'SELECT _vid_, domain_size FROM %s' % AuxTables.cell_domain.name
-        res = self.ds.engine.execute_query(query)
+        res = self.ds.get_aux_columns(AuxTables.cell_domain, ['_vid_', 'domain_size'],
+                                      dtypes={'_vid_': np.int64, 'domain_size': np.int64}, tag='FeaturizedDataset')
+        vids, domain_size = res['_vid_'], res['domain_size']
         mask = torch.zeros(self.total_vars,self.classes)
-        for tuple in tqdm(res):
-            vid = int(tuple[0])
-            max_class = int(tuple[1])
-            mask[vid, max_class:] = -10e6
-            var_to_domsize[vid] = max_class
+        invalid = np.arange(self.classes)[np.newaxis, :] >= domain_size[:, np.newaxis]
+        mask[torch.from_numpy(vids)] = torch.from_numpy(np.where(invalid, -10e6, 0).astype(np.float32))
+        # var_to_domsize[vid] is the domain size of the VID.
+        var_to_domsize = np.zeros(self.total_vars, dtype=np.int64)
+        var_to_domsize[vids] = domain_size
         return mask, var_to_domsize
 
     def get_tensor(self):
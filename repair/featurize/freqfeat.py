@@ -1,3 +1,5 @@
+import numpy as np
+import pandas as pd
 import torch
 
 from dataset import AuxTables
@@ -13,23 +15,30 @@ class FreqFeaturizer(Featurizer):
         self.total = total
         self.single_stats = single_stats
 
-    def gen_feat_tensor(self, input, classes):
-        vid = int(input[0])
-        attribute = input[1]
-        domain = input[2].split('|||')
-        attr_idx = self.ds.attr_to_idx[attribute]
-        tensor = torch.zeros(1, classes, self.attrs_number)
-        for idx, val in enumerate(domain):
-            prob = float(self.single_stats[attribute][val])/float(self.total)
-            tensor[0][idx][attr_idx] = prob
-        return tensor
-
     def create_tensor(self):
-        query = 'SELECT _vid_, attribute, domain FROM %s ORDER BY _vid_' % AuxTables.cell_domain.name
-        results = self.ds.engine.execute_query(query)
-        tensors = [self.gen_feat_tensor(res, self.classes) for res in results]
-        combined = torch.cat(tensors)
-        return combined
+        combined = torch.zeros(self.total_vars, self.classes, self.attrs_number)
+        row = 0
+        # Stream cell_domain in chunks of columns and scatter the
+        # frequencies of all domain values of each chunk at once.
+        for chunk in self.ds.iter_aux_columns(AuxTables.cell_domain, ['_vid_', 'attribute', 'domain'], order_by='_vid_',
+                                              dtypes={'_vid_': np.int64}, tag=self.name):
+            domains = pd.Series(chunk['domain']).str.split('|||', regex=False)
+            sizes = domains.str.len().values.astype(np.int64)
+            values = domains.explode().values
+            attrs, attr_of = np.unique(np.asarray(chunk['attribute'], dtype=object), return_inverse=True)
+            attr_of = np.repeat(attr_of, sizes)
+            counts = np.empty(len(values), dtype=np.float64)
+            for idx, attr in enumerate(attrs):
+                mask = attr_of == idx
+                counts[mask] = pd.Series(values[mask]).map(self.single_stats[attr]).values
+            rows = row + np.repeat(np.arange(len(sizes)), sizes)
+            # Position of every value in its cell's domain.
+            positions = np.arange(len(values)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+            attr_idxs = np.array([self.ds.attr_to_idx[attr] for attr in attrs], dtype=np.int64)[attr_of]
+            combined[torch.from_numpy(rows), torch.from_numpy(positions), torch.from_numpy(attr_idxs)] = \
+                torch.from_numpy(counts / float(self.total)).float()
+            row += len(sizes)
+        return combined[:row]
 
     def feature_names(self):
         return self.all_attrs
@@ -1,20 +1,11 @@
-from functools import partial
-
+import numpy as np
+import pandas as pd
 import torch
 
 from dataset import AuxTables
 from .featurizer import Featurizer
 
 
-def gen_feat_tensor(input, classes, total_attrs):
-    vid = int(input[0])
-    attr_idx = input[1]
-    init_idx = int(input[2])
-    tensor = -1 * torch.ones(1, classes, total_attrs)
-    tensor[0][init_idx][attr_idx] = 1.0
-    return tensor
-
-
 class InitAttrFeaturizer(Featurizer):
 
     def __init__(self, init_weight=1.0):
@@ -45,13 +36,11 @@ class InitAttrFeaturizer(Featurizer):
                 raise ValueError("The size of init_weight for InitAttrFeaturizer %d does not match the number of attributes %d." %  (self.init_weight.shape[0], len(self.all_attrs)))
 
     def create_tensor(self):
-        query = 'SELECT _vid_, attribute, init_index FROM %s ORDER BY _vid_' % AuxTables.cell_domain.name
-        results = self.ds.engine.execute_query(query)
-        map_input = []
-        for res in results:
-            map_input.append((res[0], self.attr_to_idx[res[1]], res[2]))
-        tensors = self._apply_func(partial(gen_feat_tensor, classes=self.classes, total_attrs=self.total_attrs), map_input)
-        combined = torch.cat(tensors)
+        res = self.ds.get_aux_columns(AuxTables.cell_domain, ['_vid_', 'attribute', 'init_index'], order_by='_vid_',
+                                      dtypes={'_vid_': np.int64, 'init_index': np.int64}, tag=self.name)
+        attr_idxs = pd.Series(res['attribute']).map(self.attr_to_idx).values.astype(np.int64)
+        combined = -1 * torch.ones(len(res['_vid_']), self.classes, self.total_attrs)
+        combined[torch.arange(len(res['_vid_'])), torch.from_numpy(res['init_index']), torch.from_numpy(attr_idxs)] = 1.0
         return combined
 
     def feature_names(self):
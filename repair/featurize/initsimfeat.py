@@ -1,5 +1,6 @@
 from functools import partial
 
+import numpy as np
 import torch
 import Levenshtein
 
@@ -53,12 +54,14 @@ class InitSimFeaturizer(Featurizer):
                 raise ValueError("The size of init_weight for InitSimFeaturizer %d does not match the number of attributes %d." % (self.init_weight.shape[0], len(self.all_attrs)))
 
     def create_tensor(self):
-        query = 'SELECT _vid_, attribute, init_value, domain FROM %s ORDER BY _vid_' % AuxTables.cell_domain.name
-        results = self.ds.engine.execute_query(query)
-        map_input = []
-        for res in results:
-            map_input.append((res[0], self.attr_to_idx[res[1]], res[2], res[3]))
-        tensors = self._apply_func(partial(gen_feat_tensor, classes=self.classes, total_attrs=self.total_attrs), map_input)
+        func = partial(gen_feat_tensor, classes=self.classes, total_attrs=self.total_attrs)
+        tensors = []
+        # Stream cell_domain in chunks of columns.
+        for chunk in self.ds.iter_aux_columns(AuxTables.cell_domain, ['_vid_', 'attribute', 'init_value', 'domain'],
+                                              order_by='_vid_', dtypes={'_vid_': np.int64}, tag=self.name):
+            map_input = list(zip(chunk['_vid_'], [self.attr_to_idx[attr] for attr in chunk['attribute']],
+                                 chunk['init_value'], chunk['domain']))
+            tensors.extend(self._apply_func(func, map_input))
         combined = torch.cat(tensors)
         return combined
 
@@ -1,3 +1,4 @@
+import numpy as np
 import torch
 from gensim.models import FastText
 
@@ -33,9 +34,10 @@ class LangModelFeaturizer(Featurizer):
         return tensor
 
     def create_tensor(self):
-        query = 'SELECT _vid_, attribute, domain FROM %s ORDER BY _vid_' % AuxTables.cell_domain.name
-        results = self.ds.engine.execute_query(query)
-        tensors = [self.gen_feat_tensor(res, self.classes) for res in results]
+        res = self.ds.get_aux_columns(AuxTables.cell_domain, ['_vid_', 'attribute', 'domain'], order_by='_vid_',
+                                      dtypes={'_vid_': np.int64}, tag=self.name)
+        tensors = [self.gen_feat_tensor(row, self.classes)
+                   for row in zip(res['_vid_'], res['attribute'], res['domain'])]
         combined = torch.cat(tensors)
         return combined
 
@@ -1,12 +1,13 @@
 import logging
 
+import numpy as np
 import pandas as pd
 import torch
 from tqdm import tqdm
 
 from .featurizer import Featurizer
 from dataset import AuxTables
-from utils import NULL_REPR, NA_COOCCUR_FV
+from utils import NULL_REPR, NULL_CODE
 
 
 class OccurAttrFeaturizer(Featurizer):
@@ -16,14 +17,14 @@ class OccurAttrFeaturizer(Featurizer):
             raise Exception('Featurizer {} is not properly setup.'.format(self.name))
         self.all_attrs = self.ds.get_attributes()
         self.attrs_number = len(self.ds.attr_to_idx)
-        self.raw_data_dict = {}
+        self.encoded = None
         self.total = None
         self.single_stats = None
         self.pair_stats = None
         self.setup_stats()
 
     def setup_stats(self):
-        self.raw_data_dict = self.ds.raw_data.df.set_index('_tid_').to_dict('index')
+        self.encoded = self.ds.get_encoded_data()
         total, single_stats, pair_stats = self.ds.get_statistics()
         self.total = float(total)
         self.single_stats = single_stats
@@ -39,7 +40,7 @@ class OccurAttrFeaturizer(Featurizer):
         for row in tqdm(list(records)):
             # Get tuple from raw_dataset.
             tid = row['_tid_']
-            tuple = self.raw_data_dict[tid]
+            tuple = self.encoded.row(tid)
             feat_tensor = self.gen_feat_tensor(row, tuple)
             tensors.append(feat_tensor)
         combined = torch.cat(tensors)
@@ -49,29 +50,20 @@ class OccurAttrFeaturizer(Featurizer):
         tensor = torch.zeros(1, self.classes, self.attrs_number * self.attrs_number)
         rv_attr = row['attribute']
         domain = row['domain'].split('|||')
-        rv_domain_idx = {val: idx for idx, val in enumerate(domain)}
         # We should not have any NULLs in our domain.
-        assert NULL_REPR not in rv_domain_idx
+        assert NULL_REPR not in domain
+        rv_dict = self.encoded.dicts[rv_attr]
+        rv_codes = np.array([rv_dict.code(rv_val, NULL_CODE) for rv_val in domain], dtype=np.int32)
         rv_attr_idx = self.ds.attr_to_idx[rv_attr]
         for attr in self.all_attrs:
-            val = tuple[attr]
-
             # Ignore co-occurrences of same attribute or with null values.
-            # It's possible a value is not in pair_stats if it only co-occurred
-            # with NULL values.
-            if attr == rv_attr \
-                    or val == NULL_REPR \
-                    or val not in self.pair_stats[attr][rv_attr]:
+            if attr == rv_attr or tuple.code(attr) == NULL_CODE:
                 continue
             attr_idx = self.ds.attr_to_idx[attr]
-            count1 = float(self.single_stats[attr][val])
-            all_vals = self.pair_stats[attr][rv_attr][val]
-            for rv_val in domain:
-                count2 = float(all_vals.get(rv_val, 0.0))
-                prob = count2 / count1
-                if rv_val in rv_domain_idx:
-                    index = rv_attr_idx * self.attrs_number + attr_idx
-                    tensor[0][rv_domain_idx[rv_val]][index] = prob
+            count1 = float(self.single_stats[attr][tuple[attr]])
+            count2 = self.pair_stats.counts(attr, rv_attr, tuple.code(attr), rv_codes)
+            index = rv_attr_idx * self.attrs_number + attr_idx
+            tensor[0, :len(domain), index] = torch.from_numpy(count2 / count1)
         return tensor
 
     def feature_names(self):
@@ -0,0 +1,76 @@
+import os
+import time
+
+import numpy as np
+
+from dataset.cache import DiskCache, QueryResultCache
+
+
+def test_disk_cache_store_load_invalidate(tmpdir):
+    cache = DiskCache(str(tmpdir), max_bytes=1 << 20)
+    key = DiskCache.make_key('stats', 'abc')
+    assert key != DiskCache.make_key('stats', 'abd')
+    assert cache.load(key) is None
+
+    cache.store(key, {'a': np.arange(5), 'b': np.array([1.5])})
+    arrays = cache.load(key)
+    assert arrays['a'].tolist() == [0, 1, 2, 3, 4]
+    assert arrays['b'].tolist() == [1.5]
+
+    cache.invalidate(key)
+    assert cache.load(key) is None
+
+
+def test_disk_cache_evicts_least_recently_used(tmpdir):
+    cache = DiskCache(str(tmpdir), max_bytes=1 << 30)
+    rng = np.random.RandomState(0)
+    keys = [DiskCache.make_key('entry', idx) for idx in range(3)]
+    for idx, key in enumerate(keys):
+        cache.store(key, {'x': rng.randint(0, 1 << 30, size=1000)})
+        # Distinct mtimes regardless of the file system resolution.
+        os.utime(cache._path(key), (time.time() - 100 + idx, time.time() - 100 + idx))
+    # Use the oldest entry so the second one becomes the least recently used.
+    assert cache.load(keys[0]) is not None
+
+    cache.max_bytes = cache.size() - 1
+    cache.evict()
+    assert cache.load(keys[1]) is None
+    assert cache.load(keys[0]) is not None
+    assert cache.load(keys[2]) is not None
+
+
+def test_query_result_cache_keys_on_table_versions(tmpdir):
+    cache = QueryResultCache(DiskCache(str(tmpdir), max_bytes=1 << 20))
+    query = 'SELECT t1._tid_ FROM "hospital" as t1 WHERE t1."City" = \'x\''
+    # No versioned table referenced / not a SELECT: not cacheable.
+    assert cache.key(query) is None
+    cache.set_version('hospital', 'v1')
+    assert cache.key('DELETE FROM "hospital"') is None
+
+    key = cache.key(query)
+    assert key == cache.key('  SELECT t1._tid_\n FROM "hospital" as t1   WHERE t1."City" = \'x\';')
+    assert cache.load(key) is None
+    cache.store(key, [(1, 'a', None), (2, 'b', 0.5)])
+    assert cache.load(key) == [(1, 'a', None), (2, 'b', 0.5)]
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+    # Bare (unquoted) table names are matched case-insensitively.
+    cache.set_version('cell_domain', 'v1')
+    assert [table for table, _ in cache.referenced_tables('SELECT _vid_ FROM CELL_DOMAIN')] == ['cell_domain']
+
+    # Tables created from the same query over the same tables get the same version.
+    assert cache.query_version(query) == cache.query_version(query)
+    cache.set_version('hospital', 'v2')
+    assert cache.key(query) != key
+    cache.set_version('hospital', None)
+    assert cache.derived_version('hospital', 'append') != cache.derived_version('hospital', 'drop')
+
+
+def test_query_result_cache_keeps_whitespace_in_literals(tmpdir):
+    cache = QueryResultCache(DiskCache(str(tmpdir), max_bytes=1 << 20))
+    cache.set_version('hospital', 'v1')
+    query = 'SELECT t1._tid_ FROM "hospital" as t1 WHERE t1."City" = \'{}\''
+    assert cache.key(query.format('a  b')) != cache.key(query.format('a b'))
+    assert cache.key(query.format('a  b')) == cache.key('SELECT  t1._tid_\n' + query.format('a  b')[16:])
+    # Quoted identifiers and escaped quotes in literals are kept as well.
+    assert cache.normalize('SELECT  "a  b" ,  \'it\'\'s  x\'  ;') == 'SELECT "a  b" , \'it\'\'s  x\''
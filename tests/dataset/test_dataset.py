@@ -0,0 +1,35 @@
+import logging
+import os
+
+import numpy as np
+
+import holoclean
+
+TESTDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'testdata')
+
+
+def _session():
+    logging.getLogger().setLevel(logging.ERROR)
+    return holoclean.HoloClean(engine='memory', threads=1, verbose=False).session
+
+
+def test_streamed_load_matches_full_load():
+    fpath = os.path.join(TESTDATA, 'hospital_100.csv')
+    full = _session()
+    full.load_data('hospital', fpath)
+    streamed = _session()
+    streamed.load_data('hospital', fpath, chunksize=30)
+
+    # Only the single-attribute statistics are kept while streaming: the
+    # encoded data is read back from the stored table on first use.
+    ds = streamed.ds
+    assert ds.encoded is None
+    assert ds.get_attributes() == full.ds.get_attributes()
+    encoded, expected = ds.get_encoded_data(), full.ds.get_encoded_data()
+    assert np.array_equal(encoded.tids, expected.tids)
+    for attr in expected.attrs:
+        assert encoded.decode(attr, encoded.column(attr)).tolist() == \
+            expected.decode(attr, expected.column(attr)).tolist()
+    total, single_stats, _ = ds.get_statistics()
+    assert total == 100
+    assert single_stats == full.ds.get_statistics()[1]
@@ -0,0 +1,268 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import pytest
+
+from dataset.dbengine import ConnectionPool, DBengine, _order_join, _run_pooled, _to_copy_frame
+from dcparser.constraint import DenialConstraint
+from repair.featurize import ConstraintFeaturizer
+
+
+@pytest.fixture
+def engine():
+    try:
+        engine = DBengine('holocleanuser', 'abcd1234', 'holo', pool_size=2, timeout=100)
+        engine.execute_query('SELECT 1')
+    except Exception:
+        pytest.skip('Postgres is not available')
+    yield engine
+    engine.close()
+
+
+def test_execute_queries_reuses_connections(engine):
+    results = engine.execute_queries(['SELECT {}'.format(i) for i in range(10)])
+    assert [res[0][0] for res in results] == list(range(10))
+    stats = engine.pool_stats()
+    assert stats['acquisitions'] == 10
+    assert stats['open'] <= 2
+    assert stats['in_use'] == 0
+
+
+def test_execute_queries_timeouts(engine):
+    # The preset timeout (100ms) applies to queries with backups...
+    results = engine.execute_queries_w_backup([('SELECT pg_sleep(1), 1', 'SELECT 2'),
+                                               ('SELECT 3', None),
+                                               ('SELECT pg_sleep(1), 4', None)])
+    assert results == [[(2,)], [(3,)], []]
+    # ...but not to plain queries unless given.
+    assert engine.execute_queries(['SELECT pg_sleep(0.2), 5'])[0][0][1] == 5
+    with pytest.raises(psycopg2.extensions.QueryCanceledError):
+        engine.execute_queries(['SELECT pg_sleep(1)'], timeout=50)
+    assert engine.pool_stats()['in_use'] == 0
+
+
+def test_iter_queries_yields_in_completion_order(engine):
+    queries = ['SELECT pg_sleep(0.5), 0', 'SELECT 1', 'SELECT 2']
+    results = list(engine.iter_queries(queries))
+    assert sorted(idx for idx, _ in results) == [0, 1, 2]
+    # The slow query does not hold back the others.
+    assert results[-1][0] == 0
+    assert results[-1][1][0][1] == 0
+    assert list(engine.iter_queries([('SELECT pg_sleep(1), 1', 'SELECT 2')], backup=True)) == [(0, [(2,)])]
+
+
+def test_fetch_columns(engine):
+    query = "SELECT i AS id, (i * 0.5)::float AS half, CASE WHEN i = 2 THEN NULL ELSE '0' || i END AS val " \
+            "FROM generate_series(0, 4) AS i"
+    res = engine.fetch_columns(query, dtypes={'id': np.int64, 'half': np.float64})
+    assert res['id'].dtype == np.int64 and res['id'].tolist() == [0, 1, 2, 3, 4]
+    assert res['half'].tolist() == [0.0, 0.5, 1.0, 1.5, 2.0]
+    # Text columns keep their values as strings.
+    assert res['val'][[0, 1, 3, 4]].tolist() == ['00', '01', '03', '04']
+    assert np.isnan(res['val'][2])
+
+    chunks = list(engine.iter_columns(query, chunksize=2, dtypes={'id': np.int64}))
+    assert [len(chunk['id']) for chunk in chunks] == [2, 2, 1]
+    assert np.concatenate([chunk['id'] for chunk in chunks]).tolist() == [0, 1, 2, 3, 4]
+    assert chunks[0]['val'].tolist() == ['00', '01']
+
+
+def test_query_log_report(engine):
+    engine.query_log.clear()
+    engine.execute_queries(['SELECT generate_series(1, 3)'], tag='small')
+    engine.execute_queries_w_backup([('SELECT pg_sleep(1), 1', 'SELECT 2')], tag='slow')
+    report = engine.query_log.report()
+    assert report['queries'] == 3
+    assert report['timeouts'] == 1 and report['fallbacks'] == 1
+    stats = {tag['tag']: tag for tag in report['by_tag']}
+    assert stats['small']['rows'] == 3
+    assert stats['slow']['queries'] == 2
+    # The timed out query is the slowest.
+    assert report['slowest'][0]['timed_out']
+    assert report['slowest_by_tag']['slow'][0]['query'] == 'SELECT pg_sleep(1), 1'
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        time.sleep(0.01)
+        if query == 'broken':
+            self.conn.closed = 1
+            raise psycopg2.OperationalError('server closed the connection')
+        if query == 'bad':
+            raise psycopg2.ProgrammingError('syntax error')
+        self.rows = [(query,)]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class FakePool(ConnectionPool):
+    def __init__(self, max_size):
+        super().__init__('', max_size, timeout=0)
+        self.opened = []
+
+    def _connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+
+@pytest.mark.parametrize('query', ['broken', 'bad'])
+def test_connection_pool_failing_queries(query):
+    pool = FakePool(max_size=2)
+    errors = []
+
+    def run():
+        for _ in range(3):
+            try:
+                _run_pooled(pool, query)
+            except psycopg2.Error as e:
+                errors.append(e)
+
+    # More threads than connections: a discarded connection must let a
+    # waiting thread open a replacement.
+    threads = [threading.Thread(target=run, daemon=True) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(errors) == 12
+    assert _run_pooled(pool, 'ok') == [('ok',)]
+    stats = pool.stats()
+    assert stats['in_use'] == 0 and stats['open'] <= 2 and stats['max_in_use'] <= 2
+    if query == 'broken':
+        # Broken connections are closed and replaced.
+        assert len(pool.opened) > 2
+        assert stats['open'] == sum(1 for conn in pool.opened if not conn.closed)
+    else:
+        # Connections are rolled back and reused after a bad query.
+        assert len(pool.opened) <= 2
+        assert sum(conn.rollbacks for conn in pool.opened) == 12
+    pool.close()
+    assert pool.stats()['open'] == 0
+
+
+class FakeCopyConnection:
+    """
+    FakeCopyConnection writes the COPY output of 200000 rows (_tid_, val)
+    in writes of 1000 rows.
+    """
+    rows = 200000
+
+    def __init__(self):
+        self.written = 0
+        self.invalidated = False
+
+    def cursor(self):
+        return self
+
+    def copy_expert(self, sql, file):
+        file.write(b'_tid_,val\n')
+        for start in range(0, self.rows, 1000):
+            file.write(''.join('{},"v {}"\n'.format(i, i) if i % 7 else '{},\\N\n'.format(i)
+                               for i in range(start, start + 1000)).encode('utf-8'))
+            self.written = start + 1000
+
+    def commit(self):
+        pass
+
+    def invalidate(self):
+        self.invalidated = True
+
+    def close(self):
+        pass
+
+
+class FakeSQLEngine:
+    def __init__(self):
+        self.conn = FakeCopyConnection()
+
+    def raw_connection(self):
+        return self.conn
+
+
+def test_iter_columns_streams_copy_output():
+    engine = DBengine('user', 'pwd', 'db')
+    engine.engine = FakeSQLEngine()
+    chunks = engine.iter_columns('SELECT _tid_, val FROM t', chunksize=10000, dtypes={'_tid_': np.int64})
+    first = next(chunks)
+    # The first chunk is parsed while the COPY is still writing.
+    assert engine.engine.conn.written < FakeCopyConnection.rows
+    chunks = [first] + list(chunks)
+    assert all(len(chunk['_tid_']) == 10000 for chunk in chunks)
+    tids = np.concatenate([chunk['_tid_'] for chunk in chunks])
+    assert tids.dtype == np.int64 and tids.tolist() == list(range(FakeCopyConnection.rows))
+    assert chunks[0]['val'][1] == 'v 1' and np.isnan(chunks[0]['val'][7])
+    assert not engine.engine.conn.invalidated
+    assert engine.query_log.entries()[-1]['rows'] == FakeCopyConnection.rows
+
+    res = engine.fetch_columns('SELECT _tid_, val FROM t', dtypes={'_tid_': np.int64})
+    assert res['_tid_'].tolist() == list(range(FakeCopyConnection.rows))
+
+    # Stopping early aborts the COPY and drops its connection.
+    engine.engine = FakeSQLEngine()
+    chunks = engine.iter_columns('SELECT _tid_, val FROM t', chunksize=1000)
+    next(chunks)
+    chunks.close()
+    assert engine.engine.conn.invalidated
+
+
+def test_order_join_needs_order_predicate_between_tuples():
+    schema = ['city', 'zip', 'rank']
+    featurizer = ConstraintFeaturizer()
+    featurizer.constraints = [DenialConstraint(dc, schema) for dc in
+                              ['t1&t2&EQ(t1.city,\'a\')&IQ(t1.zip,t2.zip)',
+                               't1&t2&LT(t1.rank,t2.rank)&EQ(t1.city,\'a\')',
+                               't1&t2&EQ(t1.zip,t2.zip)&GT(t1.rank,\'3\')']]
+    relaxed = featurizer.generate_relaxed_predicates()
+    routed = [idx for idx, relaxation in enumerate(relaxed) if _order_join(*relaxation)]
+    # No equality between t1 and t2 is not enough (<> only), nor is an
+    # order predicate with a constant: only the relaxations of the second
+    # constraint compare t1 and t2 with <.
+    assert [relaxed[idx][0] for idx in routed] == [featurizer.constraints[1]] * 3
+
+
+def test_copy_frame_quotes_array_elements():
+    values = ['a,b', 'say "hi"', '{x}', 'back\\slash', ' pad ', 'NULL', None]
+    df = pd.DataFrame({'_vid_': [0, 1, 2], 'distribution': [None, values, ['0.1']]})
+    copy = _to_copy_frame(df)
+    # The column is detected from its first non-null value.
+    assert copy['distribution'].isnull()[0]
+    assert copy['distribution'][1:].tolist() == [
+        '{"a,b","say \\"hi\\"","{x}","back\\\\slash"," pad ","NULL",NULL}', '{"0.1"}']
+    assert df['distribution'][1] == values
+
+
+def test_bulk_load_array_literals(engine):
+    values = ['a,b', 'say "hi"', '{x}', 'back\\slash', ' pad ', 'NULL']
+    engine.bulk_load_df('t_arrays', pd.DataFrame({'_vid_': [0], 'distribution': [values]}))
+    res = engine.execute_query('SELECT distribution::text[] FROM t_arrays')
+    assert res[0][0] == values
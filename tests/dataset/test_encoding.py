@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from dataset.encoding import EncodedTable
+from utils import NULL_REPR, NULL_CODE
+
+
+def test_encoded_table_roundtrip():
+    df = pd.DataFrame({'_tid_': [0, 1, 2, 3],
+                       'city': ['b', 'a', NULL_REPR, 'b'],
+                       'zip': ['1', '2', '2', NULL_REPR]})
+    encoded = EncodedTable.from_df(df, ['city', 'zip'])
+
+    assert encoded.codes.dtype == np.int32
+    assert encoded.codes.shape == (4, 2)
+    # NULL is always code 0 and the other values are coded in sorted order.
+    assert encoded.column('city').tolist() == [2, 1, NULL_CODE, 2]
+    assert encoded.column('zip').tolist() == [1, 2, 2, NULL_CODE]
+    assert encoded.decode('city', encoded.column('city')).tolist() == df['city'].tolist()
+
+    row = encoded.row(2)
+    assert row['_tid_'] == 2
+    assert row['city'] == NULL_REPR
+    assert row.code('zip') == 2
+
+
+def test_encoded_table_append_new_values():
+    df = pd.DataFrame({'_tid_': [0, 1], 'city': ['b', 'a']})
+    encoded = EncodedTable.from_df(df, ['city'])
+    rows = encoded.append(pd.DataFrame({'_tid_': [5], 'city': ['c']}))
+
+    assert rows.tolist() == [2]
+    # New values get the next free code; existing codes do not change.
+    assert encoded.column('city').tolist() == [2, 1, 3]
+    assert encoded.row(5)['city'] == 'c'
+    assert encoded.encode('city', 'missing') is None
+
+
+def test_encoded_table_rows_with():
+    df = pd.DataFrame({'_tid_': [0, 1, 2, 3], 'city': ['a', 'b', 'a', 'c']})
+    encoded = EncodedTable.from_df(df, ['city'])
+    a, c = encoded.encode('city', 'a'), encoded.encode('city', 'c')
+    assert encoded.rows_with('city', [a]).tolist() == [0, 2]
+
+    # Appended rows are found before the index is rebuilt.
+    encoded.append(pd.DataFrame({'_tid_': [4, 5], 'city': ['c', 'd']}))
+    d = encoded.encode('city', 'd')
+    assert encoded.rows_with('city', [c, d]).tolist() == [3, 4, 5]
+    assert encoded.rows_with('city', []).tolist() == []
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from dataset.memengine import MemoryEngine
+from dataset.table import Table, Source
+
+
+def test_store_append_and_read_tables():
+    engine = MemoryEngine()
+    df = pd.DataFrame({'_tid_': [0, 1], 'city': ['a', 'b'], 'empty': ['x', 'y']})
+    table = Table('raw', Source.DF, df=df)
+    table.store_to_db(engine)
+    # Indexing the in-memory frame does not change the stored table.
+    table.create_df_index(['_tid_'])
+    table.create_db_index(engine, ['city'])
+    assert list(engine.get_table('raw').columns) == ['_tid_', 'city', 'empty']
+
+    more = pd.DataFrame({'city': ['c'], 'empty': ['z'], '_tid_': [2]})
+    Table('raw', Source.DF, df=more).store_to_db(engine, if_exists='append')
+    engine.drop_columns('raw', ['empty'])
+    stored = Table('raw', Source.DB, db_engine=engine, lazy=True)
+    assert not stored.is_loaded()
+    assert stored.row_count() == 3
+    assert stored.get_columns() == ['_tid_', 'city']
+    assert stored.df.to_dict('list') == {'_tid_': [0, 1, 2], 'city': ['a', 'b', 'c']}
+
+    with pytest.raises(Exception):
+        Table('derived', Source.SQL, table_query='SELECT 1', db_engine=engine)
+
+
+def test_select_delete_and_append_pos_values():
+    engine = MemoryEngine()
+    cell_domain = pd.DataFrame({'_vid_': [0, 1, 2], '_cid_': [10, 11, 12], '_tid_': [0, 0, 1],
+                                'attribute': ['a', 'b', 'a'], 'domain': ['x|||y', 'z', 'x']})
+    engine.bulk_load_df('cell_domain', cell_domain)
+    assert engine.create_pos_values('pos_values', 'cell_domain') == 4
+
+    rows = engine.select_rows('cell_domain', ['_vid_', '_cid_'], {'_tid_': [0], '_cid_': [11, 12]},
+                              dtypes={'_vid_': 'int64', '_cid_': 'int64'})
+    assert rows['_vid_'].tolist() == [1] and rows['_cid_'].tolist() == [11]
+
+    engine.delete_rows('pos_values', {'_vid_': [0]})
+    assert engine.read_table('pos_values')['_vid_'].tolist() == [1, 2]
+    engine.bulk_load_df('cell_domain', cell_domain.assign(domain=['y|||w', 'z', 'x']))
+    assert engine.create_pos_values('pos_values', 'cell_domain', vids=[0]) == 2
+    pos_values = engine.read_table('pos_values')
+    assert pos_values['rv_val'].tolist() == ['z', 'x', 'y', 'w']
+    assert pos_values['val_id'].tolist() == [1, 1, 1, 2]
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from dataset.cache import DiskCache
+from dataset.dbengine import DBengine
+from dataset.querylog import QueryLog
+from dataset.scheduler import QueryScheduler
+
+
+class FakeEngine:
+    """
+    FakeEngine returns the planner costs of :param costs: (dict
+    { query -> cost }) for the EXPLAIN queries of QueryScheduler.
+    """
+    def __init__(self, costs, timeout=1000, query_cost_budget=None):
+        self.costs = costs
+        self.timeout = timeout
+        self.query_cost_budget = query_cost_budget
+        self.query_log = QueryLog(explain=False)
+
+    def execute_queries(self, queries):
+        prefix = 'EXPLAIN (FORMAT JSON) '
+        return [[[[{'Plan': {'Total Cost': self.costs[query[len(prefix):]]}}]]] for query in queries]
+
+
+@pytest.fixture
+def engine():
+    try:
+        engine = DBengine('holocleanuser', 'abcd1234', 'holo', pool_size=2, timeout=1000)
+        engine.execute_query('SELECT 1')
+    except Exception:
+        pytest.skip('Postgres is not available')
+    yield engine
+    engine.close()
+
+
+def test_scheduler_uses_recorded_times(engine, tmpdir):
+    queries = [('SELECT 1 AS fast', 'SELECT 1'),
+               ('SELECT 2 AS slow', 'SELECT 2'),
+               ('SELECT 3 AS timeout', 'SELECT 3'),
+               ('SELECT 4 AS no_backup', None)]
+    engine.query_log.record(queries[0][0], 0.1)
+    engine.query_log.record(queries[1][0], 0.5)
+    engine.query_log.record(queries[2][0], 1.0, timed_out=True)
+    engine.query_log.record(queries[3][0], 1.0, timed_out=True)
+    cache = DiskCache(str(tmpdir), 1024 * 1024)
+    scheduler = QueryScheduler(engine, cache, 'data')
+    order, scheduled = scheduler.plan(queries)
+    # The query without a backup has to run anyway and is the slowest.
+    assert order[0] == 3 and scheduled[0] == queries[3]
+    assert order.index(1) < order.index(0)
+    assert scheduled[order.index(2)] == (None, 'SELECT 3')
+    assert scheduled[order.index(0)] == queries[0]
+    scheduler.record(queries)
+
+    # A later session on the same data reuses the recorded times.
+    engine.query_log.clear()
+    order, scheduled = QueryScheduler(engine, cache, 'data').plan(queries)
+    assert (None, 'SELECT 3') in scheduled
+    order, scheduled = QueryScheduler(engine, cache, 'other data').plan(queries)
+    assert (None, 'SELECT 3') not in scheduled
+
+
+def test_scheduler_orders_by_cost_until_calibrated():
+    queries = [('SELECT 1', 'SELECT 1 backup'), ('SELECT 2', None), ('SELECT 3', 'SELECT 3 backup')]
+    engine = FakeEngine({'SELECT 1': 10.0, 'SELECT 1 backup': 1.0, 'SELECT 2': 50.0,
+                         'SELECT 3': 5000.0, 'SELECT 3 backup': 20.0}, query_cost_budget=1000.0)
+    order, scheduled = QueryScheduler(engine).plan(queries)
+    # The backup of the query over the cost budget runs up front, ordered by
+    # its own cost.
+    assert order == [1, 2, 0]
+    assert scheduled == [queries[1], (None, 'SELECT 3 backup'), queries[0]]
+
+
+def test_scheduler_stores_one_cost_model(tmpdir):
+    queries = [('SELECT 1', 'SELECT 1 backup'), ('SELECT 2', 'SELECT 2 backup')]
+    engine = FakeEngine({'SELECT 1': 10.0, 'SELECT 1 backup': 1.0, 'SELECT 2': 20.0, 'SELECT 2 backup': 2.0})
+    engine.query_log.record('SELECT 1', 0.1)
+    engine.query_log.record('SELECT 2', 1.0, timed_out=True)
+    cache = DiskCache(str(tmpdir), 1024 * 1024)
+    QueryScheduler(engine, cache, 'data').record(queries)
+    assert len([name for name in os.listdir(str(tmpdir)) if name.endswith('.npz')]) == 1
+
+    engine.query_log.clear()
+    order, scheduled = QueryScheduler(engine, cache, 'data').plan(queries)
+    assert scheduled[order.index(1)] == (None, 'SELECT 2 backup')
+    assert scheduled[order.index(0)] == queries[0]
+    order, scheduled = QueryScheduler(engine, cache, 'other data').plan(queries)
+    assert (None, 'SELECT 2 backup') not in scheduled
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+from dataset.encoding import EncodedTable
+from dataset.stats import EntropyStats, PairStats, compute_pair_matrices, cooccur_matrix, pair_matrix
+from utils import NULL_REPR, NULL_CODE
+
+
+def test_pair_stats_counts_and_transpose():
+    df = pd.DataFrame({'_tid_': [0, 1, 2, 3, 4],
+                       'city': ['a', 'a', 'b', NULL_REPR, 'b'],
+                       'zip': ['1', '1', '2', '2', NULL_REPR]})
+    encoded = EncodedTable.from_df(df, ['city', 'zip'])
+    city, zip_ = encoded.column('city'), encoded.column('zip')
+    stats = PairStats(encoded)
+    stats.set_matrix('city', 'zip', cooccur_matrix(city, zip_, (len(encoded.dicts['city']),
+                                                                len(encoded.dicts['zip']))))
+
+    assert stats.get('city', 'zip', 'a', '1') == 2
+    assert stats.get('zip', 'city', '1', 'a') == 2
+    assert stats.get('city', 'zip', 'a', '2') == 0
+    assert stats.get('city', 'zip', 'missing', '2') == 0
+    # NULLs are kept in the matrix but never counted by lookups.
+    assert stats.csr('city', 'zip')[NULL_CODE].sum() == 1
+    assert stats.get('zip', 'city', '2', NULL_REPR) == 0
+
+    b = encoded.encode('city', 'b')
+    codes = np.array([NULL_CODE, encoded.encode('zip', '1'), encoded.encode('zip', '2')])
+    assert stats.counts('city', 'zip', b, codes).tolist() == [0, 0, 1]
+    assert stats.counts('zip', 'city', encoded.encode('zip', '2'), [b]).tolist() == [1]
+    codes2, counts = stats.row('zip', 'city', encoded.encode('zip', '2'))
+    assert encoded.decode('city', codes2).tolist() == ['b'] and counts.tolist() == [1]
+
+
+def test_compute_pair_matrices_parallel_matches_serial():
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame({'_tid_': np.arange(200),
+                       'a': rng.choice(['x', 'y', NULL_REPR], 200),
+                       'b': rng.choice(['1', '2', '3'], 200),
+                       'c': rng.choice(['p', 'q'], 200)})
+    encoded = EncodedTable.from_df(df, ['a', 'b', 'c'])
+    pairs = [('a', 'b'), ('a', 'c'), ('b', 'c')]
+    serial = compute_pair_matrices(encoded, pairs, processes=1)
+    parallel = compute_pair_matrices(encoded, pairs, processes=2)
+    for pair, m1, m2 in zip(pairs, serial, parallel):
+        assert (m1 != m2).nnz == 0
+        assert (m1 != pair_matrix(encoded, *pair)).nnz == 0
+        assert m1.sum() == 200
+
+    # Pairs that were not computed up front are computed on first lookup.
+    stats = PairStats(encoded)
+    stats.set_matrix('a', 'b', serial[0])
+    assert not stats.has_pair('b', 'c')
+    assert stats.get('c', 'b', 'p', '1') == int(((df['c'] == 'p') & (df['b'] == '1')).sum())
+    assert stats.has_pair('b', 'c')
+
+
+def test_pair_stats_array_roundtrip():
+    df = pd.DataFrame({'_tid_': [0, 1, 2], 'a': ['x', 'y', 'x'], 'b': ['1', '1', NULL_REPR]})
+    encoded = EncodedTable.from_df(df, ['a', 'b'])
+    stats = PairStats(encoded)
+    stats.set_matrix('b', 'a', pair_matrix(encoded, 'b', 'a'))
+
+    loaded = PairStats.from_arrays(encoded, stats.to_arrays())
+    assert loaded.pairs() == [('a', 'b')]
+    assert (loaded.csr('a', 'b') != stats.csr('a', 'b')).nnz == 0
+    assert loaded.get('b', 'a', '1', 'x') == 1
+
+
+def test_pair_stats_update_with_new_rows():
+    df = pd.DataFrame({'_tid_': [0, 1, 2], 'a': ['x', 'y', 'x'], 'b': ['1', '1', '2']})
+    delta = pd.DataFrame({'_tid_': [3, 4], 'a': ['z', 'x'], 'b': ['1', '3']})
+    encoded = EncodedTable.from_df(df, ['a', 'b'])
+    stats = PairStats(encoded)
+    stats.set_matrix('a', 'b', pair_matrix(encoded, 'a', 'b'))
+
+    rows = encoded.append(delta)
+    stats.update(encoded.codes[rows])
+    assert (stats.csr('a', 'b') != pair_matrix(encoded, 'a', 'b')).nnz == 0
+    assert stats.get('b', 'a', '1', 'z') == 1
+    assert stats.get('a', 'b', 'x', '3') == 1
+    assert stats.get('a', 'b', 'x', '1') == 1
+
+
+def test_pair_stats_caches_transpose():
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame({'_tid_': np.arange(100),
+                       'a': rng.choice(['x', 'y', 'z', NULL_REPR], 100),
+                       'b': rng.choice(['1', '2', '3'], 100)})
+    encoded = EncodedTable.from_df(df, ['a', 'b'])
+    stats = PairStats(encoded)
+    stats.set_matrix('a', 'b', pair_matrix(encoded, 'a', 'b'))
+
+    transpose = stats.csr('b', 'a')
+    assert stats.csr('b', 'a') is transpose
+    assert (transpose != pair_matrix(encoded, 'b', 'a')).nnz == 0
+    codes_a = np.arange(len(encoded.dicts['a']))
+    for code_b in range(1, len(encoded.dicts['b'])):
+        expected = [stats.count('a', 'b', code_a, code_b) for code_a in codes_a]
+        assert stats.counts('b', 'a', code_b, codes_a).tolist() == expected
+
+    # Updates replace the cached transpose.
+    rows = encoded.append(pd.DataFrame({'_tid_': [100], 'a': ['w'], 'b': ['1']}))
+    stats.update(encoded.codes[rows])
+    assert (stats.csr('b', 'a') != pair_matrix(encoded, 'b', 'a')).nnz == 0
+    assert stats.get('b', 'a', '1', 'w') == 1
+
+
+def test_pair_stats_lookups_include_pending_updates():
+    rng = np.random.RandomState(1)
+    df = pd.DataFrame({'_tid_': np.arange(200),
+                       'a': rng.choice(['x', 'y', 'z', NULL_REPR], 200),
+                       'b': rng.choice(['1', '2', '3', '4', '5'], 200)})
+    encoded = EncodedTable.from_df(df, ['a', 'b'])
+    stats = PairStats(encoded)
+    stats.set_matrix('a', 'b', pair_matrix(encoded, 'a', 'b'))
+
+    # A few new tuples stay pending instead of being merged into the matrix.
+    rows = encoded.append(pd.DataFrame({'_tid_': [200, 201], 'a': ['w', 'x'], 'b': ['1', '6']}))
+    stats.update(encoded.codes[rows])
+    assert stats._pending
+    expected = pair_matrix(encoded, 'a', 'b').toarray()
+    codes_b = np.arange(len(encoded.dicts['b']))
+    for code_a in range(1, len(encoded.dicts['a'])):
+        assert stats.counts('a', 'b', code_a, codes_b).tolist() == expected[code_a].tolist()
+        codes, counts = stats.row('a', 'b', code_a)
+        assert expected[code_a][codes].tolist() == counts.tolist()
+        assert np.count_nonzero(expected[code_a][1:]) == len(codes)
+    assert stats.get('b', 'a', '6', 'x') == 1 and stats.get('a', 'b', 'w', '1') == 1
+    codes_a = np.repeat(np.arange(len(encoded.dicts['a'])), len(codes_b))
+    assert stats.entry_counts('a', 'b', codes_a, np.tile(codes_b, len(encoded.dicts['a']))).tolist() == \
+        expected.ravel().tolist()
+    assert stats._pending
+
+    # Full matrices merge the pending tuples.
+    assert (stats.csr('b', 'a') != pair_matrix(encoded, 'b', 'a')).nnz == 0
+    assert not stats._pending
+
+
+def test_entropy_stats_update_matches_rebuild():
+    rng = np.random.RandomState(2)
+    df = pd.DataFrame({'_tid_': np.arange(300),
+                       'a': rng.choice(['x', 'y', NULL_REPR], 300),
+                       'b': rng.choice(['1', '2', '3'], 300),
+                       'c': rng.choice(['p'], 300)})
+    encoded = EncodedTable.from_df(df, ['a', 'b', 'c'])
+    stats = PairStats(encoded)
+    for attr1, attr2 in [('a', 'b'), ('a', 'c'), ('b', 'c')]:
+        stats.set_matrix(attr1, attr2, pair_matrix(encoded, attr1, attr2))
+    entropy = EntropyStats.from_arrays(encoded, EntropyStats(encoded).to_arrays())
+
+    rows = encoded.append(pd.DataFrame({'_tid_': [300, 301, 302], 'a': ['x', 'w', 'y'],
+                                        'b': ['4', '1', '2'], 'c': ['p', 'q', 'p']}))
+    stats.update(encoded.codes[rows])
+    entropy.update(encoded.codes[rows], stats)
+    corr = entropy.correlations()
+    expected = EntropyStats(encoded).correlations()
+    for x in expected:
+        for y in expected[x]:
+            assert abs(corr[x][y] - expected[x][y]) < 1e-9
+    assert corr['a']['a'] == 1.0
+    assert 0.0 < corr['c']['b'] < 1.0
+    # H(a|b) normalized by the log of the 4 values of a.
+    a, b = encoded.column('a'), encoded.column('b')
+    h_ab = 0.0
+    for code_b in np.unique(b):
+        _, counts = np.unique(a[b == code_b], return_counts=True)
+        p = counts / float(counts.sum())
+        h_ab -= (b == code_b).mean() * np.sum(p * np.log(p))
+    assert abs(corr['a']['b'] - (1.0 - h_ab / np.log(4))) < 1e-9
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset.encoding import EncodedTable
+from dataset.table import Table, Source, source_from_path
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+feather = pytest.importorskip('pyarrow.feather')
+
+
+def test_columnar_sources_match_csv(tmpdir):
+    raw = pd.DataFrame({'city': [' Boston', 'boston', 'NYC', None],
+                        'zip': ['1', '2', None, 'n/a'],
+                        'empty': [None, None, None, None]})
+    csv_path = str(tmpdir.join('data.csv'))
+    raw.to_csv(csv_path, index=False)
+    table = pa.Table.from_pandas(raw, preserve_index=False)
+    pq_path = str(tmpdir.join('data.parquet'))
+    arrow_path = str(tmpdir.join('data.arrow'))
+    pq.write_table(table, pq_path, row_group_size=2)
+    feather.write_feather(table, arrow_path)
+    assert source_from_path(pq_path) == Source.PARQUET
+    assert source_from_path(arrow_path) == Source.ARROW
+
+    expected = Table('data', Source.FILE, fpath=csv_path, na_values='n/a').df
+    for fpath, src in [(pq_path, Source.PARQUET), (arrow_path, Source.ARROW)]:
+        df = Table('data', src, fpath=fpath, na_values='n/a').df
+        # Null columns are dropped and values normalized like the CSV path.
+        assert list(df.columns) == ['city', 'zip']
+        assert isinstance(df['city'].dtype, pd.CategoricalDtype)
+        assert list(df['city'].cat.categories) == ['boston', 'nyc']
+        for attr in df.columns:
+            assert df[attr].astype(object).fillna('_nan_').tolist() == expected[attr].fillna('_nan_').tolist()
+
+    df = Table('data', Source.PARQUET, fpath=pq_path, columns=['zip']).df
+    assert list(df.columns) == ['zip']
+
+
+def test_encoded_table_from_categorical():
+    df = pd.DataFrame({'_tid_': [0, 1, 2], 'city': pd.Categorical(['b', 'a', 'b'], categories=['b', 'a'])})
+    encoded = EncodedTable.from_df(df, ['city'])
+    # Same codes as encoding the strings: sorted values.
+    assert encoded.column('city').tolist() == [2, 1, 2]
+    assert encoded.codes.dtype == np.int32
+
+
+def test_columnar_sources_use_the_csv_null_values(tmpdir):
+    raw = pd.DataFrame({'city': ['', 'NA', 'boston', None, 'null'],
+                        'zip': ['1', 'N/A', '2', '3', 'x']})
+    csv_path = str(tmpdir.join('data.csv'))
+    raw.to_csv(csv_path, index=False)
+    pq_path = str(tmpdir.join('data.parquet'))
+    pq.write_table(pa.Table.from_pandas(raw, preserve_index=False), pq_path)
+
+    expected = Table('data', Source.FILE, fpath=csv_path).df
+    df = Table('data', Source.PARQUET, fpath=pq_path).df
+    assert list(df['city'].cat.categories) == ['boston']
+    for attr in ['city', 'zip']:
+        assert df[attr].astype(object).fillna('_nan_').tolist() == expected[attr].fillna('_nan_').tolist()
+    # na_values are NULL in addition to the defaults.
+    df = Table('data', Source.PARQUET, fpath=pq_path, na_values='x').df
+    assert df['zip'].isnull().tolist() == [False, True, False, False, True]
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from dcparser import Parser
+from dcparser.constraint import DenialConstraint
+from dcparser.evaluator import ConstraintEvaluator
+from repair.featurize import ConstraintFeaturizer
+
+SCHEMA = ['city', 'zip', 'rank']
+DCS = ['t1&t2&EQ(t1.city,t2.city)&IQ(t1.zip,t2.zip)',
+       't1&t2&EQ(t2.city,t1.city)&IQ(t2.zip,t1.zip)',
+       't1&t2&EQ(t1.city,t2.city)&IQ(t1.zip,t2.zip)&LT(t1.rank,t2.rank)',
+       't1&t2&GT(t2.rank,t1.rank)&EQ(t1.zip,t2.zip)',
+       't1&t2&LT(t2.rank,t1.rank)&EQ(t2.zip,t1.zip)',
+       't1&EQ(t1.city,\'a\')',
+       't1&t2&EQ(t1.city,\'a\')&EQ(t1.zip,t2.zip)']
+
+
+def parser_of(dcs):
+    parser = Parser({}, None)
+    parser.dc_strings = dcs
+    parser.dcs = [DenialConstraint(dc, SCHEMA) for dc in dcs]
+    return parser
+
+
+def test_find_redundant_dcs():
+    duplicates, implied = parser_of(DCS).find_redundant_dcs()
+    assert duplicates == {1: 0}
+    # DC 4 is DC 3 with t1 and t2 swapped: only the later one is implied.
+    assert implied == {2: 0, 4: 3, 6: 5}
+    firsts, group_of = Parser.group_constraints(parser_of(DCS).dcs)
+    assert firsts == [0, 2, 3, 4, 5, 6] and group_of[:3] == [0, 0, 2]
+
+
+def test_grouped_relaxations_count_the_same_violations():
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame({'_tid_': np.arange(30),
+                       'city': rng.choice(['a', 'b'], 30).astype(object),
+                       'zip': rng.choice(['1', '2', '3'], 30).astype(object),
+                       'rank': rng.choice(['1', '2', '3', '4'], 30).astype(object)})
+    pos_values = pd.DataFrame({'_vid_': np.arange(30 * 3), '_tid_': np.repeat(np.arange(30), 3),
+                               'attribute': np.tile(SCHEMA, 30), 'rv_val': df[SCHEMA].values.reshape(-1),
+                               'val_id': 1})
+    featurizer = ConstraintFeaturizer()
+    featurizer.constraints = parser_of(DCS).dcs
+    relaxed = featurizer.generate_relaxed_predicates()
+    firsts, group_of = Parser.group_relaxations(relaxed)
+    assert len(firsts) < len(relaxed)
+    evaluator = ConstraintEvaluator(df)
+    counts = [sorted(zip(*[arr.tolist() for arr in evaluator.relaxed_violations(*args, pos_values)]))
+              for args in relaxed]
+    for idx, first in enumerate(group_of):
+        assert counts[idx] == counts[first]
@@ -0,0 +1,56 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from dcparser.constraint import DenialConstraint
+from dcparser.evaluator import ConstraintEvaluator, op_funcs, parse_operand
+
+DF = pd.DataFrame({'_tid_': [10, 11, 12, 13, 14],
+                   'city': ['a', 'a', 'b', 'b', 'a'],
+                   'zip': ['1', '2', '3', '3', '1'],
+                   'rank': ['5', '3', '4', '1', '2']})
+SCHEMA = ['city', 'zip', 'rank']
+
+
+def holds(pred, rows):
+    vals = []
+    for comp in pred.components:
+        name, attr = parse_operand(comp)
+        vals.append(attr if name is None else DF.iloc[rows[name]][attr])
+    return op_funcs[pred.operation](vals[0], vals[1])
+
+
+def test_violations_match_nested_loops():
+    for dc in ['t1&t2&EQ(t1.city,t2.city)&IQ(t1.zip,t2.zip)',
+               't1&t2&LT(t1.rank,t2.rank)&EQ(t1.zip,t2.zip)',
+               't1&t2&GT(t1.rank,t2.rank)&EQ(t2.city,\'b\')',
+               't1&EQ(t1.city,\'a\')&IQ(t1.zip,\'1\')']:
+        c = DenialConstraint(dc, SCHEMA)
+        expected = set()
+        for i, j in itertools.product(range(len(DF)), repeat=2):
+            if all(holds(pred, {'t1': i, 't2': j}) for pred in c.predicates):
+                expected.add(DF['_tid_'][i])
+        # Tiny chunks to go through the chunked joins.
+        evaluator = ConstraintEvaluator(DF, max_pairs=2)
+        assert evaluator.violations(c).tolist() == sorted(expected)
+
+
+def test_relaxed_violations_count_pairs():
+    c = DenialConstraint('t1&t2&EQ(t1.city,t2.city)&IQ(t1.zip,t2.zip)', SCHEMA)
+    pos_values = pd.DataFrame({'_vid_': [0, 0, 1, 1],
+                               '_tid_': [10, 10, 12, 12],
+                               'attribute': ['zip', 'zip', 'zip', 'zip'],
+                               'rv_val': ['1', '2', '3', '1'],
+                               'val_id': [1, 2, 1, 2]})
+    evaluator = ConstraintEvaluator(DF, max_pairs=3)
+    # Relax IQ(t1.zip,t2.zip): # of other tuples of the same city whose zip
+    # differs from the domain value.
+    vids, val_ids, violations = evaluator.relaxed_violations(c, 1, 't1', 'zip', '<>', ['t2', 'zip'], pos_values)
+    assert sorted(zip(vids.tolist(), val_ids.tolist(), violations.tolist())) == [(0, 1, 1), (0, 2, 1), (1, 2, 1)]
+    # Relax EQ(t1.city,t2.city) for the city cells.
+    pos_values['attribute'] = 'city'
+    pos_values['rv_val'] = ['a', 'b', 'b', 'a']
+    vids, val_ids, violations = evaluator.relaxed_violations(c, 0, 't1', 'city', '=', ['t2', 'city'], pos_values)
+    assert sorted(zip(vids.tolist(), val_ids.tolist(), violations.tolist())) == [(0, 1, 1), (0, 2, 2), (1, 2, 3)]
+    assert np.issubdtype(violations.dtype, np.integer)
@@ -0,0 +1,72 @@
+import itertools
+import operator
+
+import numpy as np
+import pandas as pd
+
+from dcparser.constraint import DenialConstraint
+from dcparser.evaluator import ConstraintEvaluator
+from dcparser.iejoin import range_counts
+
+OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '=': operator.eq, '<>': operator.ne}
+SCHEMA = ['city', 'rank', 'score']
+
+
+def test_range_counts_match_nested_loops():
+    rng = np.random.RandomState(0)
+    for num_conditions, (op1, op2) in itertools.product([0, 1, 2], itertools.product(OPS, repeat=2)):
+        num_queries, num_points = rng.randint(1, 40), rng.randint(0, 40)
+        conditions = [(rng.randint(0, 6, num_queries), rng.randint(0, 6, num_points), op)
+                      for op in [op1, op2][:num_conditions]]
+        expected = [sum(all(OPS[op](qvals[i], pvals[j]) for qvals, pvals, op in conditions)
+                        for j in range(num_points))
+                    for i in range(num_queries)]
+        assert range_counts(conditions, num_queries, num_points).tolist() == expected
+
+
+def random_df(num_rows):
+    rng = np.random.RandomState(1)
+    return pd.DataFrame({'_tid_': np.arange(num_rows),
+                         'city': rng.choice(['a', 'b', 'c'], num_rows).astype(object),
+                         'rank': rng.choice(['1', '2', '3', '4'], num_rows).astype(object),
+                         'score': rng.choice(['10', '20', '30', '5'], num_rows).astype(object)})
+
+
+def test_range_join_matches_pair_join(monkeypatch):
+    df = random_df(40)
+    evaluator = ConstraintEvaluator(df)
+    pos_values = pd.DataFrame({'_vid_': np.repeat(np.arange(10), 2),
+                               '_tid_': np.repeat(np.arange(0, 40, 4), 2),
+                               'attribute': 'rank',
+                               'rv_val': ['1', '3'] * 10,
+                               'val_id': [1, 2] * 10})
+    constraints = ['t1&t2&LT(t1.rank,t2.rank)&GT(t1.score,t2.score)',
+                   't1&t2&LTE(t2.rank,t1.rank)&IQ(t1.city,t2.city)',
+                   't1&t2&GTE(t1.rank,t2.rank)&EQ(t2.city,\'a\')',
+                   't1&t2&LT(t1.rank,t2.score)&EQ(t1.rank,\'2\')']
+    results = []
+    for dc in constraints:
+        c = DenialConstraint(dc, SCHEMA)
+        for idx, pred in enumerate(c.predicates):
+            rank_comps = [comp for comp in pred.components if isinstance(comp, list) and comp[1] == 'rank']
+            if not rank_comps:
+                continue
+            join_rel = rank_comps[0][0]
+            rv_val = pred.components[1] if pred.components[0] is rank_comps[0] else pred.components[0]
+            op = pred.operation if pred.components[0] is rank_comps[0] else \
+                {'<': '>', '>': '<', '<=': '>=', '>=': '<='}.get(pred.operation, pred.operation)
+            results.append((c, idx, join_rel, op, rv_val))
+
+    def run_all():
+        out = []
+        for c, idx, join_rel, op, rv_val in results:
+            out.append(evaluator.violations(c).tolist())
+            vids, val_ids, violations = evaluator.relaxed_violations(c, idx, join_rel, 'rank', op, rv_val, pos_values)
+            out.append(sorted(zip(vids.tolist(), val_ids.tolist(), violations.tolist())))
+        return out
+
+    ranged = run_all()
+    # The same results by joining all pairs.
+    monkeypatch.setattr(ConstraintEvaluator, '_range_join', lambda self, predicates, extra=0: False)
+    assert run_all() == ranged
+    assert any(ranged)
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset.encoding import EncodedTable
+from dataset.table import normalize_df
+from dcparser.constraint import DenialConstraint
+from dcparser.evaluator import ConstraintEvaluator
+from dcparser.ir import CONSTANT, EQUALITY, INEQUALITY
+from utils import NULL_REPR
+
+TESTDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'testdata')
+
+# The constraints files of testdata and the data they are defined on.
+SUITES = [('hospital_constraints.txt', 'hospital.csv'),
+          ('adult_constraints.txt', 'Adult500.csv'),
+          ('met_constraints.txt', 'met_1000.csv')]
+
+
+def load_suite(dcs_file, data_file):
+    df = pd.read_csv(os.path.join(TESTDATA, data_file), dtype=str, encoding='utf-8')
+    df = normalize_df(df, []).fillna(NULL_REPR)
+    attrs = list(df.columns)
+    df['_tid_'] = np.arange(len(df))
+    with open(os.path.join(TESTDATA, dcs_file)) as f:
+        dcs = [DenialConstraint(line.rstrip(), attrs) for line in f
+               if line.rstrip() and not line.startswith('#')]
+    return df, EncodedTable.from_df(df, attrs), dcs
+
+
+def test_compile_predicates():
+    c = DenialConstraint('t1&t2&EQ(t1.city,t2.zip)&LT(t2.rank,t1.rank)&IQ(t1.zip,\'1\')',
+                         ['city', 'zip', 'rank'])
+    equality, inequality, constant = c.ir.predicates
+    assert c.ir.arity == 2
+    assert (equality.kind, equality.left.attr_idx, equality.right.tuple_idx) == (EQUALITY, 0, 1)
+    assert inequality.kind == INEQUALITY and inequality.cross_tuple
+    left, op, right = inequality.operand_of(0)
+    assert (left.tuple_idx, left.attr, op, right.tuple_idx) == (0, 'rank', '>', 1)
+    assert constant.kind == CONSTANT and constant.right.const == '1' and not constant.cross_tuple
+    assert c.ir.equalities == [equality] and c.ir.inequalities == [inequality]
+    assert c.ir.single(0) == [constant] and c.ir.single(1) == []
+
+
+@pytest.mark.parametrize('dcs_file, data_file', SUITES)
+def test_encoded_evaluation_matches_values(dcs_file, data_file):
+    df, encoded, dcs = load_suite(dcs_file, data_file)
+    evaluator = ConstraintEvaluator(df)
+    encoded_evaluator = ConstraintEvaluator(df, encoded=encoded)
+    for c in dcs:
+        assert len(c.ir.predicates) == len(c.predicates)
+        assert encoded_evaluator.violations(c).tolist() == evaluator.violations(c).tolist(), c.cnf_form
+        if c.ir.arity == 1:
+            continue
+        single, _ = evaluator.split_predicates(c.predicates)
+        all_rows = np.arange(len(df))
+        rows1 = evaluator.filter_rows(single['t1'], all_rows)
+        rows2 = evaluator.filter_rows(single['t2'], all_rows)
+        assert encoded_evaluator.filter_rows(single['t1'], all_rows).tolist() == rows1.tolist()
+        # Same block iff the values of all equality predicates are equal.
+        blocks1, blocks2 = encoded_evaluator.encoded.equality_keys(c.ir.equalities, rows1, rows2)
+        values = [tuple(df[pred.operand_of(idx)[0].attr].values[rows])
+                  for pred in c.ir.equalities for idx, rows in [(0, rows1), (1, rows2)]]
+        keys = list(zip(*values[0::2])) + list(zip(*values[1::2]))
+        pairs = set(zip(keys, np.concatenate([blocks1, blocks2]).tolist()))
+        assert len(pairs) == len(set(key for key, _ in pairs)) == len(set(block for _, block in pairs))
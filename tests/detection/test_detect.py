@@ -0,0 +1,78 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from dataset.memengine import MemoryEngine
+from detect import DetectEngine, Detector
+
+
+class FakeDataset:
+    attr_to_idx = {'city': 0, 'zip': 1, 'state': 2}
+    attr_count = 3
+
+    def __init__(self):
+        self.engine = MemoryEngine(max_workers=4)
+
+    def get_raw_data(self):
+        return None
+
+    def get_encoded_data(self):
+        return None
+
+    def get_cell_id(self, tuple_id, attr_name):
+        return tuple_id * self.attr_count + self.attr_to_idx[attr_name]
+
+
+class FixedDetector(Detector):
+    def __init__(self, name, cells):
+        super(FixedDetector, self).__init__(name)
+        self.cells = cells
+
+    def setup(self, dataset, env):
+        self.ds = dataset
+
+    def detect_noisy_cells(self):
+        self.thread = threading.current_thread()
+        return pd.DataFrame(self.cells, columns=['_tid_', 'attribute'])
+
+
+class ProcessDetector(FixedDetector):
+    def uses_processes(self):
+        return True
+
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_detect_errors_combines_detectors(monkeypatch, threads):
+    ds = FakeDataset()
+    engine = DetectEngine({'threads': threads}, ds)
+    stored = []
+    monkeypatch.setattr(engine, 'store_detected_errors', stored.append)
+    detectors = [FixedDetector('a', [(3, 'zip'), (0, 'state'), (3, 'zip')]),
+                 FixedDetector('b', [(0, 'state'), (1, 'city')]),
+                 FixedDetector('c', [])]
+    engine.detect_errors(detectors)
+
+    errors_df = stored[0]
+    cells = sorted(set([(3, 'zip'), (0, 'state'), (1, 'city')]), key=lambda cell: ds.get_cell_id(*cell))
+    assert list(zip(errors_df['_tid_'], errors_df['attribute'])) == cells
+    assert errors_df['_cid_'].tolist() == [ds.get_cell_id(*cell) for cell in cells]
+    assert {name: stats['cells'] for name, stats in engine.detector_stats.items()} == {'a': 3, 'b': 2, 'c': 0}
+
+
+def test_detect_errors_unknown_attribute(monkeypatch):
+    engine = DetectEngine({'threads': 1}, FakeDataset())
+    monkeypatch.setattr(engine, 'store_detected_errors', lambda errors_df: None)
+    with pytest.raises(Exception, match='unknown attributes'):
+        engine.detect_errors([FixedDetector('a', [(0, 'country')])])
+
+
+def test_detect_errors_runs_process_detectors_on_main_thread(monkeypatch):
+    engine = DetectEngine({'threads': 4}, FakeDataset())
+    monkeypatch.setattr(engine, 'store_detected_errors', lambda errors_df: None)
+    detectors = [FixedDetector('a', [(0, 'zip')]), ProcessDetector('b', [(1, 'zip')]),
+                 FixedDetector('c', [(2, 'zip')])]
+    engine.detect_errors(detectors)
+    assert detectors[1].thread is threading.main_thread()
+    assert detectors[0].thread is not threading.main_thread()
+    assert engine.detector_stats['b']['cells'] == 1
@@ -34,3 +34,14 @@ def test_errors_loader_invalid_csv_file():
         errors_loader_detector = ErrorsLoaderDetector(fpath=tmp_file.name)
 
     assert 'The loaded errors table does not match the expected schema' in str(invalid_file_error.value)
+
+
+def test_errors_loader_parquet_file(tmpdir):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    fpath = str(tmpdir.join('errors.parquet'))
+    pq.write_table(pa.table({'_tid_': [1, 1, 2], 'attribute': ['attr1', 'attr2', 'attr1']}), fpath)
+    errors_df = ErrorsLoaderDetector(fpath=fpath).detect_noisy_cells()
+
+    assert errors_df.columns.tolist() == ['_tid_', 'attribute']
+    assert errors_df['_tid_'].tolist() == [1, 1, 2]
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from dataset.encoding import EncodedTable
+from dcparser.constraint import DenialConstraint
+from dcparser.evaluator import ConstraintEvaluator
+from detect.hashpartition import partitioned_violations
+
+SCHEMA = ['city', 'zip', 'state', 'rank']
+
+
+def random_df(num_rows, seed=0):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({'_tid_': np.arange(num_rows) + 100,
+                         'city': rng.choice(['a', 'b', 'c', 'd'], num_rows).astype(object),
+                         'zip': rng.choice(['1', '2', '3', 'a'], num_rows).astype(object),
+                         'state': rng.choice(['x', 'y', '_nan_'], num_rows).astype(object),
+                         'rank': rng.choice(['1', '2', '3', '4', '5'], num_rows).astype(object)})
+
+
+def test_partitioned_violations_match_evaluator():
+    df = random_df(60)
+    encoded = EncodedTable.from_df(df, SCHEMA)
+    evaluator = ConstraintEvaluator(df)
+    encoded_evaluator = ConstraintEvaluator(df, encoded=encoded)
+    for dc in ['t1&t2&EQ(t1.city,t2.city)&IQ(t1.zip,t2.zip)',
+               't1&t2&EQ(t1.city,t2.city)&EQ(t1.state,t2.state)&IQ(t1.zip,t2.zip)',
+               't1&t2&EQ(t1.zip,t2.city)&LT(t1.rank,t2.rank)',
+               't1&t2&EQ(t2.state,t1.state)&EQ(t1.city,\'a\')&GTE(t1.rank,t2.rank)&IQ(t2.zip,\'1\')',
+               't1&t2&EQ(t1.city,t2.city)']:
+        c = DenialConstraint(dc, SCHEMA)
+        expected = evaluator.violations(c).tolist()
+        assert partitioned_violations(encoded_evaluator, c).tolist() == expected
+        # Tiny tasks so that groups are batched and large groups are split.
+        assert partitioned_violations(encoded_evaluator, c, max_pairs=7).tolist() == expected
+        assert partitioned_violations(encoded_evaluator, c, processes=2, max_pairs=50).tolist() == expected
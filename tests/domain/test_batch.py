@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from dataset.encoding import EncodedTable
+from domain.batch import ContextCache, batch_domains, candidate_table
+from utils import NULL_REPR
+
+ATTRS = ['city', 'zip', 'state']
+
+
+def make_table():
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame({'_tid_': np.arange(50),
+                       'city': rng.choice(['a', 'b', 'c', NULL_REPR], 50).astype(object),
+                       'zip': rng.choice(['10', '9', '2', NULL_REPR], 50).astype(object),
+                       'state': rng.choice(['x', 'y', 'z', 'w', NULL_REPR], 50).astype(object)})
+    encoded = EncodedTable.from_df(df, ATTRS)
+    # Pruned candidates of 'state' { cond value -> [values of state] }.
+    candidates = {'city': {'a': ['y', 'x'], 'b': ['w'], 'c': []},
+                  'zip': {'10': ['z', 'x'], '2': ['y']}}
+    tables = {cond_attr: candidate_table(encoded, cands, cond_attr, 'state')
+              for cond_attr, cands in candidates.items()}
+    return df, encoded, candidates, tables
+
+
+def test_batch_domains_match_row_loop():
+    df, encoded, candidates, tables = make_table()
+    rows = np.array([0, 3, 4, 7, 8, 20, 21, 33, 49])
+    domains, sizes, init_idxs = batch_domains(encoded, 'state', tables, rows, chunk_rows=4)
+
+    for idx, row in enumerate(rows):
+        domain = set()
+        for cond_attr, cands in candidates.items():
+            domain.update(cands.get(df[cond_attr][row], []))
+        init_value = df['state'][row]
+        if init_value != NULL_REPR:
+            domain.add(init_value)
+        domain = sorted(domain)
+        assert domains[idx] == '|||'.join(domain)
+        assert sizes[idx] == len(domain)
+        assert init_idxs[idx] == (domain.index(init_value) if init_value != NULL_REPR else -1)
+
+
+def test_batch_domains_with_context_cache():
+    _, encoded, _, tables = make_table()
+    rows = np.arange(50)
+    expected = batch_domains(encoded, 'state', tables, rows)
+    cache = ContextCache(max_size=100)
+    domains, sizes, init_idxs = batch_domains(encoded, 'state', tables, rows, chunk_rows=7, cache=cache)
+    assert domains == expected[0]
+    np.testing.assert_array_equal(sizes, expected[1])
+    np.testing.assert_array_equal(init_idxs, expected[2])
+    # Candidates are computed once per distinct (city, zip) context.
+    contexts = set(zip(encoded.column('city').tolist(), encoded.column('zip').tolist()))
+    stats = cache.stats()
+    assert stats['misses'] == len(contexts) and stats['size'] == len(contexts)
+    assert stats['hits'] > 0
+    assert stats['hit_rate'] == float(stats['hits']) / (stats['hits'] + stats['misses'])
+
+
+def test_context_cache_evicts_least_recently_used():
+    cache = ContextCache(max_size=2)
+    cache.put(('a', 1), np.array([1]))
+    cache.put(('a', 2), np.array([2]))
+    assert cache.get(('a', 1)) is not None
+    cache.put(('a', 3), np.array([3]))
+    assert cache.get(('a', 2)) is None
+    assert cache.get(('a', 1)) is not None and cache.get(('a', 3)) is not None
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'evictions': 1, 'size': 2, 'hit_rate': 0.75}
+    disabled = ContextCache(max_size=0)
+    disabled.put(('a', 1), np.array([1]))
+    assert disabled.get(('a', 1)) is None and disabled.stats()['size'] == 0
@@ -0,0 +1,75 @@
+import logging
+import os
+import pickle
+
+import pandas as pd
+
+import holoclean
+from detect import NullDetector, ViolationDetector
+
+TESTDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'testdata')
+
+
+def test_sharded_domain_does_not_depend_on_workers():
+    logging.getLogger().setLevel(logging.ERROR)
+    hc = holoclean.HoloClean(engine='memory', domain_thresh_1=0.0, domain_thresh_2=0.0, weak_label_thresh=0.99,
+                             max_domain=10000, cor_strength=0.6, nb_cor_strength=0.8, threads=1,
+                             verbose=False).session
+    hc.load_data('hospital', os.path.join(TESTDATA, 'hospital_100.csv'))
+    hc.load_dcs(os.path.join(TESTDATA, 'hospital_constraints.txt'))
+    hc.ds.set_constraints(hc.get_dcs())
+    hc.detect_errors([NullDetector(), ViolationDetector()])
+    engine = hc.domain_engine
+    engine.compute_correlations()
+    engine.setup_attributes()
+
+    engine.shard_rows = 30
+    domains = []
+    for processes in [1, 3]:
+        engine.processes = processes
+        domains.append(engine.generate_domain())
+    pd.testing.assert_frame_equal(domains[0], domains[1])
+    assert domains[0]['_vid_'].tolist() == list(range(len(domains[0])))
+    # Same cells, in the same order, as a single shard.
+    engine.shard_rows = 1000
+    single = engine.generate_domain()
+    assert single['_cid_'].tolist() == domains[0]['_cid_'].tolist()
+    # The workers receive a pickled DomainGenerator, without the Dataset.
+    generator = pickle.loads(pickle.dumps(engine._generator(engine._posterior_estimator())))
+    assert generator.estimator.ds is None
+    pd.testing.assert_frame_equal(generator.shard_domain((0, 0, 30))[0], domains[0][domains[0]['_tid_'] < 30])
+
+
+def test_append_data_updates_domain_in_place(tmp_path):
+    logging.getLogger().setLevel(logging.ERROR)
+    hc = holoclean.HoloClean(engine='memory', domain_thresh_1=0.0, domain_thresh_2=0.0, weak_label_thresh=0.99,
+                             max_domain=10000, cor_strength=0.6, nb_cor_strength=0.8, threads=1,
+                             verbose=False).session
+    raw = pd.read_csv(os.path.join(TESTDATA, 'hospital_100.csv'), dtype=str)
+    raw.iloc[:80].to_csv(str(tmp_path / 'base.csv'), index=False)
+    raw.iloc[80:].to_csv(str(tmp_path / 'delta.csv'), index=False)
+    hc.load_data('hospital', str(tmp_path / 'base.csv'))
+    hc.load_dcs(os.path.join(TESTDATA, 'hospital_constraints.txt'))
+    hc.ds.set_constraints(hc.get_dcs())
+    hc.detect_errors([NullDetector(), ViolationDetector()])
+    hc.setup_domain()
+    engine = hc.domain_engine
+    before = hc.ds.engine.read_table('cell_domain')
+
+    hc.append_data(str(tmp_path / 'delta.csv'))
+    cell_domain = hc.ds.engine.read_table('cell_domain')
+    # The _vid_'s stay dense and the cells of the new tuples are added.
+    assert sorted(cell_domain['_vid_']) == list(range(len(cell_domain)))
+    assert cell_domain['_cid_'].is_unique and len(cell_domain) >= len(before)
+    assert cell_domain['_tid_'].max() >= 80
+    pos_values = hc.ds.engine.read_table('pos_values')
+    sizes = pos_values.groupby('_vid_').size()
+    assert sizes.to_dict() == cell_domain.set_index('_vid_')['domain_size'].to_dict()
+
+    # The updated correlations match the correlations of the whole data.
+    corr = engine.correlations
+    engine.compute_correlations()
+    expected = engine.correlations
+    for x in expected:
+        for y in expected[x]:
+            assert abs(corr[x][y] - expected[x][y]) < 1e-9
@@ -133,3 +133,52 @@ def test_hospital_without_init():
         assert report.total_repairs_grdt_correct == 22
     finally:
         delete_database(db_name)
+
+def test_hospital_in_memory():
+    # Same as test_hospital_with_init on the in-memory engine: no Postgres
+    # database is needed and the metrics must be the same.
+    hc = holoclean.HoloClean(
+        engine='memory',
+        domain_thresh_1=0.0,
+        domain_thresh_2=0.0,
+        weak_label_thresh=0.99,
+        max_domain=10000,
+        cor_strength=0.6,
+        nb_cor_strength=0.8,
+        epochs=10,
+        weight_decay=0.01,
+        learning_rate=0.001,
+        threads=1,
+        batch_size=1,
+        verbose=True,
+        timeout=3 * 60000,
+        feature_norm=False,
+        weight_norm=False,
+        print_fw=True
+    ).session
+
+    hc.load_data('hospital', '../testdata/hospital.csv')
+    hc.load_dcs('../testdata/hospital_constraints.txt')
+    hc.ds.set_constraints(hc.get_dcs())
+    hc.detect_errors([NullDetector(), ViolationDetector()])
+    hc.setup_domain()
+    featurizers = [
+        InitAttrFeaturizer(),
+        OccurAttrFeaturizer(),
+        FreqFeaturizer(),
+        ConstraintFeaturizer(),
+    ]
+    hc.repair_errors(featurizers)
+    report = hc.evaluate(fpath='../testdata/hospital_clean.csv',
+                         tid_col='tid',
+                         attr_col='attribute',
+                         val_col='correct_val')
+
+    assert report.correct_repairs == 232
+    assert report.total_repairs == 232
+    assert abs(report.precision - 1.) < TOL
+    assert abs(report.recall - 232. / 509) < TOL
+    assert abs(report.repair_recall - 232. / 435) < TOL
+    assert report.total_repairs_grdt_correct == 0
+    # Constraints are evaluated in memory and recorded like queries.
+    assert 'ConstraintFeaturizer' in [stats['tag'] for stats in hc.query_report()['by_tag']]
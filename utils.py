@@ -3,6 +3,9 @@
 # How we represent nulls in holoclean.
 NULL_REPR = '_nan_'
 
+# Code of NULL_REPR in the dictionary-encoded raw data (see dataset.encoding).
+NULL_CODE = 0
+
 # A feature value to represent co-occurrence with NULLs, which is not applicable.
 NA_COOCCUR_FV = 0
 